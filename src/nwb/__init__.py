@@ -5,26 +5,38 @@ Also provides a stimulus class to add stimulus information to the rCell dictiona
 The main classes are:
     - CellDB: A singleton class to find and load rCells.
     - StimCsv: A singleton class to read and parse stimulus information.
+    - ArrayCache: A singleton LRU cache of the repetition data of all rCells.
+    - Writer: A context manager writing an rCell file one repetition at a time.
 """
 
 from .src import dict, plot, unit
+from .src.cache import ArrayCache
 from .src.db import CellDB
-from .src.io import keys, load, load_dataset, save
+from .src.io import create_dataset, keys, load, load_dataset, save
+from .src.layout import ScaledArray
 from .src.rcell import RCell
 from .src.stimulus import StimCsv
 from .src.validation import ValidationError, Validator
+from .src.view import validate_file
+from .src.writer import Writer, update
 
 __all__ = [
     "dict",
     "unit",
     "plot",
     "CellDB",
+    "ArrayCache",
     "keys",
     "load",
     "save",
+    "update",
     "load_dataset",
+    "create_dataset",
+    "ScaledArray",
     "RCell",
     "StimCsv",
     "Validator",
     "ValidationError",
+    "validate_file",
+    "Writer",
 ]
@@ -0,0 +1,80 @@
+"""Benchmark compression codecs on a sample rCell and recommend a codec policy.
+
+The acquisition data is also measured with the contiguous layout, which is
+stored without compression and memory-mapped on read.
+"""
+
+import argparse
+from pathlib import Path
+
+from ..src.benchmark import benchmark, recommend
+from ..src.codec import CODECS
+from ..src.db import CellDB
+from ..src.layout import LAYOUTS
+
+
+def main():
+    """Run the benchmark and print the results and the recommended policy."""
+    args = parse_args()
+
+    path = Path(args.rcell)
+    if not path.is_file():
+        path = CellDB().get_path(args.rcell)
+
+    results = benchmark(
+        path, codecs=args.codecs, repeat=args.repeat, chunks=args.chunks
+    )
+
+    print(results.to_string(float_format="{:.4g}".format))
+
+    chunks, policy = recommend(results, tolerance=args.tolerance)
+    print("\nRecommended policy:")
+    print(f"  --chunks {chunks}")
+    for kind, codec in policy.items():
+        print(f"  --codec {kind}={codec}")
+
+    return
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "rcell",
+        help="Path or ID of the sample rCell",
+    )
+
+    parser.add_argument(
+        "--codecs",
+        help="Codecs to test (default: all)",
+        choices=list(CODECS),
+        nargs="+",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--chunks",
+        help="Chunk layout of the acquisition data, compared to contiguous",
+        choices=LAYOUTS,
+        default="auto",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        help="Number of repetitions, the best time is kept",
+        type=int,
+        default=3,
+    )
+
+    parser.add_argument(
+        "--tolerance",
+        help="Fraction of the best compression ratio a recommended codec must reach",
+        type=float,
+        default=0.9,
+    )
+
+    return parser.parse_args()
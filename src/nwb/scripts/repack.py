@@ -0,0 +1,356 @@
+"""Rewrite existing rCells with a new storage layout.
+
+Each file is copied to a temporary file next to it with the new layout,
+checked to load bit-exactly identical to the original, and then swapped
+in place atomically. Every finished file is appended to a journal with the
+layout settings, so an interrupted run resumes where it stopped. Files
+repacked with other settings are repacked again.
+
+At the end, the bytes saved and the read-speed gained are reported per machine.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import h5py
+from tqdm import tqdm
+
+from ..src.codec import CODECS, KINDS
+from ..src.db import CellDB
+from ..src.io import load, recurse_copy, same
+from ..src.layout import LAYOUTS
+
+
+def main():
+    """Repack rCells in parallel."""
+    args = parse_args()
+
+    files = list_files(args.paths, args.machine)
+
+    settings = {
+        "chunks": args.chunks,
+        "codecs": args.codec,
+        "scalar_attrs": args.scalar_attrs,
+    }
+    done = read_journal(args.journal, settings)
+    todo = [(machine, path) for machine, path in files if str(path) not in done]
+
+    print(f"{len(files) - len(todo)} rCells already repacked, {len(todo)} to go.")
+
+    end_line(args.journal)
+    with (
+        ProcessPoolExecutor(max_workers=args.workers) as executor,
+        open(args.journal, "a") as journal,
+    ):
+        futures = [
+            executor.submit(
+                repack, path, machine, args.chunks, args.codec, args.scalar_attrs
+            )
+            for machine, path in todo
+        ]
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            desc="Repacking rCells",
+            colour="blue",
+            dynamic_ncols=True,
+        ):
+            record = future.result() | {"settings": settings}
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+            if "error" in record:
+                print(f"Failed {record['path']}: {record['error']}")
+
+    report(args.journal, settings)
+
+    return
+
+
+def list_files(paths: list[Path], machine: str) -> list[tuple[str, Path]]:
+    """List the rCell files with their machine.
+
+    Args:
+        paths (list[Path]): Files or folders. If empty, the CellDB roots are used.
+        machine (str): Machine whose root to use when no paths are given.
+
+    Returns:
+        list[tuple[str, Path]]: (machine, path) of every rCell file.
+
+    """
+    roots = CellDB().path
+
+    if not paths:
+        machines = list(roots) if machine == "all" else [machine]
+        paths = [roots[m] for m in machines]
+
+    files = []
+    for path in paths:
+        path = path.resolve()
+        nwbs = [path] if path.is_file() else sorted(path.rglob("*.nwb"))
+        for file in nwbs:
+            owner = next(
+                (m for m, root in roots.items() if file.is_relative_to(root.resolve())),
+                "other",
+            )
+            files.append((owner, file))
+    return files
+
+
+def read_journal(journal: Path, settings: dict) -> set[str]:
+    """Get the paths of the rCells successfully repacked in previous runs.
+
+    Args:
+        journal (Path): The JSONL journal file.
+        settings (dict): The layout settings (chunks, codecs, scalar_attrs)
+            of this run, files repacked with other settings are not done.
+
+    Returns:
+        set[str]: The repacked paths.
+
+    """
+    return {
+        path
+        for path, rec in read_records(journal).items()
+        if "error" not in rec and rec.get("settings") == settings
+    }
+
+
+def read_records(journal: Path) -> dict[str, dict]:
+    """Get the last journal record of every rCell.
+
+    Only the last record of a file counts (failures can be retried, files
+    repacked again with other settings). Blank lines and a line cut short
+    by an interrupted run are skipped.
+
+    Args:
+        journal (Path): The JSONL journal file.
+
+    Returns:
+        dict[str, dict]: The last record of each path.
+
+    """
+    if not journal.is_file():
+        return {}
+
+    records = {}
+    with open(journal) as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[rec["path"]] = rec
+    return records
+
+
+def end_line(journal: Path):
+    """End the last line of the journal if an interrupted run cut it short.
+
+    Otherwise the first record appended would be lost with the cut line.
+
+    Args:
+        journal (Path): The JSONL journal file.
+
+    """
+    if not journal.is_file() or not journal.stat().st_size:
+        return
+
+    with open(journal, "rb+") as fp:
+        fp.seek(-1, os.SEEK_END)
+        if fp.read(1) != b"\n":
+            fp.write(b"\n")
+    return
+
+
+def repack(
+    path: Path,
+    machine: str,
+    chunks: str,
+    codecs: dict[str, str],
+    scalar_attrs: bool = False,
+) -> dict:
+    """Repack an rCell, verify it and replace the original file.
+
+    Args:
+        path (Path): Path to the rCell.
+        machine (str): The machine of the rCell (only reported).
+        chunks (str): The chunk layout of the acquisition data.
+        codecs (dict[str, str]): The codec name per dataset kind.
+        scalar_attrs (bool, optional): Store scalar metadata as attributes.
+            Defaults to False.
+
+    Returns:
+        dict: A journal record with sizes and read times before and after.
+
+    """
+    tmp_path = path.with_name(f"{path.name}.repack.tmp")
+    record = {"path": str(path), "machine": machine}
+
+    try:
+        with h5py.File(path, "r") as src, h5py.File(tmp_path, "w") as dst:
+            recurse_copy(
+                src, dst, chunks=chunks, codecs=codecs, scalar_attrs=scalar_attrs
+            )
+
+        if not same(load(path), load(tmp_path)):
+            raise ValueError("Repacked rCell does not load identically.")
+
+        record.update(
+            {
+                "bytes_before": path.stat().st_size,
+                "bytes_after": tmp_path.stat().st_size,
+                "read_before": read_time(path),
+                "read_after": read_time(tmp_path),
+            }
+        )
+
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+
+    except Exception as err:
+        tmp_path.unlink(missing_ok=True)
+        record["error"] = repr(err)
+
+    return record
+
+
+def read_time(path: Path) -> float:
+    """Time reading every sweep of every acquisition data matrix, one at a time.
+
+    Args:
+        path (Path): Path to the rCell.
+
+    Returns:
+        float: Time in seconds.
+
+    """
+    start = time.perf_counter()
+
+    with h5py.File(path, "r") as h5file:
+        timeseries = h5file.get("acquisition/timeseries", {})
+        for protocol in timeseries.values():
+            for rep in protocol.get("repetitions", {}).values():
+                data = rep.get("data")
+                if isinstance(data, h5py.Dataset) and data.ndim == 2:
+                    for sweep in range(data.shape[1]):
+                        data[:, sweep]
+
+    return time.perf_counter() - start
+
+
+def report(journal: Path, settings: dict):
+    """Print the bytes saved and the read-speed gained per machine.
+
+    Args:
+        journal (Path): The JSONL journal file.
+        settings (dict): The layout settings of the run to report.
+
+    """
+    totals = defaultdict(lambda: defaultdict(float))
+    failed = defaultdict(int)
+
+    records = [
+        rec for rec in read_records(journal).values() if rec.get("settings") == settings
+    ]
+
+    for rec in records:
+        if "error" in rec:
+            failed[rec["machine"]] += 1
+            continue
+        tot = totals[rec["machine"]]
+        tot["files"] += 1
+        for key in ["bytes_before", "bytes_after", "read_before", "read_after"]:
+            tot[key] += rec[key]
+
+    for machine, tot in totals.items():
+        saved = tot["bytes_before"] - tot["bytes_after"]
+        speedup = tot["read_before"] / max(tot["read_after"], 1e-9)
+        print(
+            f"{machine}: {tot['files']:.0f} rCells,"
+            + f" {saved / 1e6:.1f} MB saved"
+            + f" ({100 * saved / max(tot['bytes_before'], 1):.1f}%),"
+            + f" sweep reads {speedup:.2f}x faster,"
+            + f" {failed[machine]} failed"
+        )
+
+    return
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "paths",
+        help="rCell files or folders to repack (default: the CellDB roots)",
+        type=Path,
+        nargs="*",
+    )
+
+    parser.add_argument(
+        "--machine",
+        help="Machine whose CellDB root to repack when no paths are given",
+        choices=["all", "qpc", "igor", "syncropatch"],
+        default="all",
+    )
+
+    parser.add_argument(
+        "--chunks",
+        help="Chunk layout of the acquisition data",
+        choices=LAYOUTS,
+        default="auto",
+    )
+
+    parser.add_argument(
+        "--codec",
+        help="Codec of a dataset kind, as KIND=CODEC (see benchmark_codecs)."
+        + f" Kinds: {KINDS}. Codecs: {list(CODECS)}",
+        type=parse_codec,
+        action="append",
+        default=[],
+    )
+
+    parser.add_argument(
+        "--scalar-attrs",
+        help="Store scalar metadata as attributes of their group",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--workers",
+        help="Number of worker processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--journal",
+        help="JSONL file recording the repacked rCells, used to resume",
+        type=Path,
+        default=Path("repack.jsonl"),
+    )
+
+    args = parser.parse_args()
+    args.codec = dict(args.codec)
+
+    return args
+
+
+def parse_codec(arg: str) -> tuple[str, str]:
+    """Parse a KIND=CODEC command-line argument."""
+    kind, _, codec = arg.partition("=")
+    if kind not in KINDS or codec not in CODECS:
+        raise argparse.ArgumentTypeError(f"Invalid codec {arg}.")
+    return kind, codec
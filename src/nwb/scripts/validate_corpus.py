@@ -0,0 +1,154 @@
+"""Validate every rCell of the corpus in parallel, without modifying them.
+
+The files are checked in place (see nwb.validate_file): only their metadata
+is read. One record per rCell is streamed to a JSONL report, with its id,
+machine, path, whether it is valid, the error and the path of the invalid
+key, and the duration. The report can also be written as Parquet.
+
+After a schema change, validate everything:
+
+    validate_corpus --report validation.jsonl
+
+Nightly, only the rCells modified since the last run:
+
+    validate_corpus --changed-since 2026-10-17 --report nightly.jsonl
+
+The exit status is 1 if an rCell is not valid.
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from tqdm import tqdm
+
+from ..src.validation import ValidationError
+from ..src.view import validate_file
+from .repack import list_files
+
+
+def main() -> int:
+    """Validate rCells in parallel and report the results."""
+    args = parse_args()
+
+    files = list_files(args.paths, args.machine)
+    if args.changed_since is not None:
+        since = args.changed_since.timestamp()
+        files = [(m, path) for m, path in files if path.stat().st_mtime >= since]
+
+    print(f"Validating {len(files)} rCells.")
+
+    counts = Counter()
+    with (
+        ProcessPoolExecutor(max_workers=args.workers) as executor,
+        open(args.report, "w") as report,
+    ):
+        futures = [executor.submit(check, path, machine) for machine, path in files]
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            desc="Validating rCells",
+            colour="blue",
+            dynamic_ncols=True,
+        ):
+            record = future.result()
+            report.write(json.dumps(record) + "\n")
+            report.flush()
+            counts[(record["machine"], record["valid"])] += 1
+
+    if args.parquet is not None and counts:
+        pd.read_json(args.report, lines=True).to_parquet(args.parquet, index=False)
+
+    for machine in sorted({m for m, _ in counts}):
+        print(
+            f"{machine}: {counts[(machine, True)]} valid,"
+            + f" {counts[(machine, False)]} invalid"
+        )
+
+    return 1 if any(not valid for _, valid in counts) else 0
+
+
+def check(path: Path, machine: str) -> dict:
+    """Validate an rCell in place, without writing to it.
+
+    Runs in the worker processes.
+
+    Args:
+        path (Path): Path to the rCell.
+        machine (str): The machine of the rCell (only reported).
+
+    Returns:
+        dict: The report record of the rCell.
+
+    """
+    record = {"id": path.stem, "machine": machine, "path": str(path)}
+    start = time.perf_counter()
+
+    try:
+        validate_file(path, write=False)
+        record.update(valid=True, error=None, error_path=None)
+    except ValidationError as err:
+        record.update(valid=False, error=str(err), error_path=err.path)
+    except Exception as err:
+        # Unreadable file, or a value the validator cannot handle
+        record.update(valid=False, error=repr(err), error_path=None)
+
+    record["duration"] = time.perf_counter() - start
+    return record
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "paths",
+        help="rCell files or folders to validate (default: the CellDB roots)",
+        type=Path,
+        nargs="*",
+    )
+
+    parser.add_argument(
+        "--machine",
+        help="Machine whose CellDB root to validate when no paths are given",
+        choices=["all", "qpc", "igor", "syncropatch"],
+        default="all",
+    )
+
+    parser.add_argument(
+        "--changed-since",
+        help="Only validate the rCells modified since this date or time (ISO format)",
+        type=datetime.fromisoformat,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--workers",
+        help="Number of worker processes (default: number of CPUs)",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--report",
+        help="JSONL file of the results, one record per rCell",
+        type=Path,
+        default=Path("validation.jsonl"),
+    )
+
+    parser.add_argument(
+        "--parquet",
+        help="Also write the results to this Parquet file",
+        type=Path,
+        default=None,
+    )
+
+    return parser.parse_args()
@@ -0,0 +1,147 @@
+"""Benchmark of compression codecs on rCell datasets.
+
+The benchmark function measures write time, read time and compression ratio
+of every codec on the datasets of a sample rCell, per dataset kind. The
+acquisition data is also measured with the "contiguous" layout (stored
+without filters, memory-mapped on read). The recommend function picks a
+layout and a codec policy from the results, to be passed to nwb.save or the
+repack command.
+"""
+
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from .codec import CODECS, DEFAULT_POLICY, KINDS, dataset_kind
+from .layout import dataset_kwargs
+
+
+def benchmark(
+    path: str | Path,
+    codecs: list[str] | None = None,
+    repeat: int = 3,
+    chunks: str = "auto",
+) -> pd.DataFrame:
+    """Measure write time, read time and compression ratio of codecs on an rCell.
+
+    The datasets of the rCell are written to and read from an in-memory file,
+    so that the timings measure the filters and not the file system. The
+    acquisition data is measured with the chunks layout and every codec, and
+    with the "contiguous" layout (no codec).
+
+    Args:
+        path (str | Path): Path to a sample rCell.
+        codecs (list[str], optional): Codec names to test. Defaults to all.
+        repeat (int, optional): Number of repetitions (the best time is kept).
+            Defaults to 3.
+        chunks (str, optional): Chunk layout of the acquisition data,
+            compared to "contiguous". Defaults to "auto".
+
+    Returns:
+        pd.DataFrame: Index (kind, layout, codec), columns write_s, read_s,
+            stored_bytes, raw_bytes and ratio (raw/stored).
+
+    """
+    codecs = list(CODECS) if codecs is None else codecs
+
+    samples: dict[str, list[np.ndarray]] = {kind: [] for kind in KINDS}
+
+    def collect(name: str, obj):
+        if isinstance(obj, h5py.Dataset):
+            data = obj[()]
+            kind = dataset_kind(name.rsplit("/", 1)[-1], data)
+            if kind is not None:
+                samples[kind].append(data)
+
+    with h5py.File(path, "r") as h5file:
+        h5file.visititems(collect)
+
+    # (layout, codec) pairs, filters need chunks: contiguous data has no codec
+    candidates = {
+        "data": [(chunks, name) for name in codecs if chunks != "contiguous"]
+        + [("contiguous", "none")],
+        "array": [(chunks, name) for name in codecs],
+    }
+
+    rows = []
+    for kind, arrays in samples.items():
+        if not arrays:
+            continue
+
+        for layout, name in candidates[kind]:
+            key = "data" if kind == "data" else "array"
+            write_s = read_s = np.inf
+
+            for _ in range(repeat):
+                # In-memory file, never written to disk
+                with h5py.File(
+                    f"{uuid4()}.h5", "w", driver="core", backing_store=False
+                ) as h5file:
+                    start = time.perf_counter()
+                    for i, data in enumerate(arrays):
+                        kwargs = dataset_kwargs(key, data, layout, {kind: name})
+                        h5file.create_dataset(str(i), **kwargs)
+                    h5file.flush()
+                    write_s = min(write_s, time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    for i in range(len(arrays)):
+                        h5file[str(i)][()]
+                    read_s = min(read_s, time.perf_counter() - start)
+
+                    stored = sum(
+                        h5file[str(i)].id.get_storage_size() for i in range(len(arrays))
+                    )
+
+            raw = sum(data.nbytes for data in arrays)
+            rows.append(
+                {
+                    "kind": kind,
+                    "layout": layout,
+                    "codec": name,
+                    "write_s": write_s,
+                    "read_s": read_s,
+                    "stored_bytes": stored,
+                    "raw_bytes": raw,
+                    "ratio": raw / max(stored, 1),
+                }
+            )
+
+    return pd.DataFrame(rows).set_index(["kind", "layout", "codec"])
+
+
+def recommend(
+    results: pd.DataFrame, tolerance: float = 0.9
+) -> tuple[str, dict[str, str]]:
+    """Recommend a layout and a codec policy from benchmark results.
+
+    For each dataset kind, the fastest layout and codec (write + read time)
+    is chosen among those reaching at least `tolerance` times the best
+    compression ratio. The layout is the one of the acquisition data.
+
+    Args:
+        results (pd.DataFrame): Output of the benchmark function.
+        tolerance (float, optional): Fraction of the best ratio to accept.
+            Defaults to 0.9.
+
+    Returns:
+        tuple[str, dict[str, str]]: The chunk layout of the acquisition data,
+            and the codec name per dataset kind.
+
+    """
+    chunks = "auto"
+    policy = DEFAULT_POLICY.copy()
+
+    for kind, df in results.groupby(level="kind"):
+        df = df.droplevel("kind")
+        good = df[df["ratio"] >= tolerance * df["ratio"].max()]
+        layout, codec = (good["write_s"] + good["read_s"]).idxmin()
+        policy[str(kind)] = str(codec)
+        if kind == "data":
+            chunks = str(layout)
+
+    return chunks, policy
@@ -0,0 +1,149 @@
+"""Process-wide cache of decoded repetition arrays.
+
+A Repetition keeps its data only while the object is in use (see
+AcquisitionPart), and each RCell instance has its own repetitions: the same
+rCell loaded again (e.g. by CellDB.load in a loop) would be read and decoded
+again. The ArrayCache shares the decoded data matrices across all RCell
+instances of the process, and bounds their total memory with a byte budget,
+dropping the least recently used arrays first:
+
+    from nwb.src.cache import ArrayCache
+
+    cache = ArrayCache()
+    cache.resize(4 * 1024**3)  # 4 GiB
+    ...
+    print(cache.info())
+
+Keys include the modification time of the file, so a rewritten rCell is
+read again. Memory-mapped arrays are not cached: they cost no memory and
+no decompression.
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import RLock
+
+import numpy as np
+
+from .utils import singleton
+
+DEFAULT_MAX_BYTES = 1024**3
+
+
+@singleton
+class ArrayCache:
+    """A singleton LRU cache of NumPy arrays with a byte budget.
+
+    Cached arrays are read-only, as they are shared by all their users.
+
+    Attributes:
+        max_bytes (int): The byte budget of the cache.
+        nbytes (int): The bytes used by the cached arrays.
+        hits (int): The number of lookups found in the cache.
+        misses (int): The number of lookups that had to load the array.
+
+    Methods:
+        get: Get an array from the cache, loading it on a miss.
+        resize: Change the byte budget.
+        clear: Empty the cache and reset the counters.
+        info: Get the counters and usage of the cache.
+
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Initialize the cache.
+
+        Args:
+            max_bytes (int, optional): The byte budget. Defaults to 1 GiB.
+
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._lock = RLock()
+        return
+
+    def __len__(self) -> int:
+        """Return the number of cached arrays."""
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether an array is cached for the key."""
+        return key in self._items
+
+    def get(self, key: Hashable, load: Callable[[], np.ndarray]) -> np.ndarray:
+        """Get an array from the cache, loading it on a miss.
+
+        Args:
+            key (Hashable): The key of the array.
+            load (Callable[[], np.ndarray]): Function loading the array.
+
+        Returns:
+            np.ndarray: The (read-only) array.
+
+        """
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+            self.misses += 1
+
+        # Load outside the lock, other threads can use the cache meanwhile
+        array = load()
+
+        if isinstance(array, np.memmap) or array.nbytes > self.max_bytes:
+            return array
+
+        array.setflags(write=False)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = array
+                self.nbytes += array.nbytes
+                self._evict(self.max_bytes)
+        return array
+
+    def resize(self, max_bytes: int):
+        """Change the byte budget, evicting arrays if needed.
+
+        Args:
+            max_bytes (int): The new byte budget.
+
+        """
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict(max_bytes)
+        return
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+        return
+
+    def info(self) -> dict:
+        """Get the counters and usage of the cache.
+
+        Returns:
+            dict: hits, misses, items, nbytes and max_bytes.
+
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._items),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _evict(self, max_bytes: int):
+        """Drop the least recently used arrays until within max_bytes."""
+        while self.nbytes > max_bytes and self._items:
+            _, array = self._items.popitem(last=False)
+            self.nbytes -= array.nbytes
+        return
@@ -0,0 +1,346 @@
+"""On-disk catalog of the rCells of a machine.
+
+Listing a machine tree and opening every file to read its metadata takes
+minutes for tens of thousands of rCells. The catalog is a SQLite file that
+stores, for every rCell file:
+    - id, path, machine, modification time and size,
+    - the flattened metadata (RCell.meta_dict, as JSON),
+    - the protocols and their stimulus ids.
+
+Refreshing the catalog only reads the files whose modification time or size
+changed, and drops the files that disappeared. The files are read in
+parallel worker processes, which return their records in column-oriented
+batches. A file that cannot be read is reported and left out of the catalog,
+it is retried at the next refresh. See CellDB.refresh.
+"""
+
+import json
+import sqlite3
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from .rcell import RCell
+
+# Catalogs of another version are rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    path TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    meta TEXT NOT NULL,
+    protocols TEXT NOT NULL,
+    stim_ids TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cells_id ON cells (id);
+"""
+
+COLUMNS = ["path", "id", "machine", "mtime_ns", "size", "meta", "protocols", "stim_ids"]
+
+INSERT = "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Files read per task of a worker process
+CHUNKSIZE = 64
+
+
+class Catalog:
+    """A SQLite catalog of the rCell files under a root folder.
+
+    Attributes:
+        path (Path): The path to the SQLite file.
+        root (Path): The folder of the rCell files.
+        machine (str): The machine of the rCells.
+        failures (dict[str, str]): Files that could not be read
+            in the last refresh, with the error.
+
+    Methods:
+        exists: Whether the catalog was built.
+        refresh: Update the catalog with the files that changed.
+        ids: List the rCell IDs.
+        get_path: Get the path of an rCell ID.
+        meta_columns: Get the metadata of all rCells as columns.
+        protocols: Get the protocols and stimulus ids of all rCells.
+
+    """
+
+    def __init__(self, path: Path, root: Path, machine: str):
+        """Initialize the catalog.
+
+        Args:
+            path (Path): The path to the SQLite file.
+            root (Path): The folder of the rCell files.
+            machine (str): The machine of the rCells.
+
+        """
+        self.path = path
+        self.root = root
+        self.machine = machine
+        self.failures: dict[str, str] = {}
+        return
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection (connections are not shared between processes)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.path)
+        (version,) = con.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            con.execute("DROP TABLE IF EXISTS cells")
+            con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        con.executescript(SCHEMA)
+        return con
+
+    def exists(self) -> bool:
+        """Whether the catalog was built."""
+        return self.path.is_file()
+
+    def refresh(
+        self,
+        progress: bool = False,
+        workers: int | None = None,
+        chunksize: int = CHUNKSIZE,
+    ) -> dict[str, int]:
+        """Update the catalog with the rCell files that changed.
+
+        Only new files and files whose modification time or size changed
+        are read, in parallel. Files that no longer exist are removed.
+
+        Args:
+            progress (bool, optional): Whether to display a progress bar.
+                Defaults to False.
+            workers (int, optional): Number of worker processes, 1 reads the
+                files in this process. Defaults to the number of CPUs.
+            chunksize (int, optional): Files read per worker task.
+                Defaults to CHUNKSIZE.
+
+        Returns:
+            dict[str, int]: Number of rCells "read", "failed", "removed"
+                and "total".
+
+        """
+        files = {str(path): path.stat() for path in self.root.rglob("*.nwb")}
+
+        with closing(self._connect()) as con:
+            known = {
+                path: (mtime_ns, size)
+                for path, mtime_ns, size in con.execute(
+                    "SELECT path, mtime_ns, size FROM cells"
+                )
+            }
+
+            removed = known.keys() - files.keys()
+            con.executemany("DELETE FROM cells WHERE path = ?", [(p,) for p in removed])
+            con.commit()
+
+            stale = [
+                path
+                for path, stat in files.items()
+                if known.get(path) != (stat.st_mtime_ns, stat.st_size)
+            ]
+            batches = [
+                stale[i : i + chunksize] for i in range(0, len(stale), chunksize)
+            ]
+
+            self.failures = {}
+            with tqdm(
+                total=len(stale),
+                disable=not progress,
+                desc=f"Refreshing {self.machine} catalog",
+                colour="blue",
+                dynamic_ncols=True,
+            ) as pbar:
+                # Each batch is committed, an interrupted refresh keeps them
+                for columns, failures in self._read(batches, workers):
+                    con.executemany(
+                        INSERT, zip(*(columns[name] for name in COLUMNS), strict=True)
+                    )
+                    # Unreadable files are not listed until they can be read
+                    con.executemany(
+                        "DELETE FROM cells WHERE path = ?", [(p,) for p in failures]
+                    )
+                    con.commit()
+                    self.failures.update(failures)
+                    pbar.update(len(columns["path"]) + len(failures))
+
+        if self.failures:
+            warnings.warn(
+                f"Could not read {len(self.failures)} {self.machine} rCells: "
+                + ", ".join(f"{p} ({e})" for p, e in list(self.failures.items())[:5]),
+                stacklevel=2,
+            )
+
+        return {
+            "read": len(stale) - len(self.failures),
+            "failed": len(self.failures),
+            "removed": len(removed),
+            "total": len(files),
+        }
+
+    def _read(self, batches: list[list[str]], workers: int | None):
+        """Read batches of files, in worker processes unless workers is 1.
+
+        Yields:
+            tuple[dict[str, list], dict[str, str]]: Results of read_batch.
+
+        """
+        if workers == 1 or len(batches) <= 1:
+            for batch in batches:
+                yield read_batch(batch, self.machine)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(read_batch, batch, self.machine) for batch in batches
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        return
+
+    def ids(self) -> list[str]:
+        """List the rCell IDs.
+
+        Returns:
+            list[str]: The rCell IDs, sorted by path.
+
+        """
+        with closing(self._connect()) as con:
+            return [id for (id,) in con.execute("SELECT id FROM cells ORDER BY path")]
+
+    def get_path(self, id: str) -> Path | None:
+        """Get the path of an rCell ID.
+
+        Args:
+            id (str): The rCell ID.
+
+        Returns:
+            Path | None: The path of the rCell, None if not in the catalog.
+
+        """
+        with closing(self._connect()) as con:
+            row = con.execute("SELECT path FROM cells WHERE id = ?", (id,)).fetchone()
+        return None if row is None else Path(row[0])
+
+    def meta_columns(self) -> dict[tuple, list]:
+        """Get the metadata (RCell.meta_dict) of all rCells as columns.
+
+        Values missing from an rCell are NaN.
+
+        Returns:
+            dict[tuple, list]: A list of values per key, rCells sorted by path.
+
+        """
+        with closing(self._connect()) as con:
+            metas = [
+                load_meta(text)
+                for (text,) in con.execute("SELECT meta FROM cells ORDER BY path")
+            ]
+
+        # Keys in order of first appearance, like a DataFrame of the rows
+        keys = dict.fromkeys(key for meta in metas for key in meta)
+        return {key: [meta.get(key, np.nan) for meta in metas] for key in keys}
+
+    def protocols(self) -> pd.DataFrame:
+        """Get the protocols and stimulus ids of all rCells.
+
+        Returns:
+            pd.DataFrame: One row per rCell and protocol,
+                with columns id, protocol and stim_id.
+
+        """
+        with closing(self._connect()) as con:
+            rows = con.execute("SELECT id, protocols, stim_ids FROM cells").fetchall()
+
+        records = [
+            (id, protocol, stim_id)
+            for id, protocols, stim_ids in rows
+            for protocol, stim_id in zip(
+                json.loads(protocols), json.loads(stim_ids), strict=True
+            )
+        ]
+        return pd.DataFrame(records, columns=["id", "protocol", "stim_id"])
+
+
+def read_batch(
+    paths: list[str], machine: str
+) -> tuple[dict[str, list], dict[str, str]]:
+    """Read the catalog records of rCell files.
+
+    Runs in the worker processes of Catalog.refresh.
+
+    Args:
+        paths (list[str]): Paths of the rCell files.
+        machine (str): The machine of the rCells.
+
+    Returns:
+        tuple[dict[str, list], dict[str, str]]: The records as one list per
+            column of the catalog, and the files that failed with their error.
+
+    """
+    columns: dict[str, list] = {name: [] for name in COLUMNS}
+    failures = {}
+
+    for path in paths:
+        try:
+            stat = Path(path).stat()
+            rcell = RCell(Path(path))
+            protocols = {prt: dic["stim_id"] for prt, dic in rcell.stimulus.items()}
+            record = (
+                path,
+                rcell.id,
+                machine,
+                stat.st_mtime_ns,
+                stat.st_size,
+                dump_meta(rcell.meta_dict),
+                json.dumps(list(protocols)),
+                json.dumps([int(stim_id) for stim_id in protocols.values()]),
+            )
+        except Exception as err:
+            failures[path] = repr(err)
+            continue
+
+        for name, value in zip(COLUMNS, record, strict=True):
+            columns[name].append(value)
+
+    return columns, failures
+
+
+def dump_meta(meta: dict[tuple, object]) -> str:
+    """Serialize the metadata of an rCell (RCell.meta_dict) to JSON.
+
+    The tuple keys are stored as lists, in [key, value] pairs, and numpy
+    scalars as the Python values.
+
+    Args:
+        meta (dict[tuple, object]): The flattened metadata.
+
+    Returns:
+        str: The JSON text.
+
+    """
+    return json.dumps(
+        [
+            [list(key), value.item() if isinstance(value, np.generic) else value]
+            for key, value in meta.items()
+        ]
+    )
+
+
+def load_meta(text: str) -> dict[tuple, object]:
+    """Deserialize the metadata of an rCell (see dump_meta).
+
+    Args:
+        text (str): The JSON text.
+
+    Returns:
+        dict[tuple, object]: The flattened metadata.
+
+    """
+    return {tuple(key): value for key, value in json.loads(text)}
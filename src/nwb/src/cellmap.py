@@ -0,0 +1,308 @@
+"""Run an analysis function over many rCells in parallel (see CellDB.map).
+
+    from nwb import CellDB
+
+    def input_resistance(rcell):
+        rep = rcell.protocol("Activation").repetition(1)
+        return {"leak": rep.segment_features()[:, 0, 1].mean()}
+
+    cellmap = CellDB().map(
+        input_resistance,
+        machine="qpc",
+        checkpoint="leak.jsonl",
+        parquet="leak_results",
+    )
+    for id, result in cellmap:  # streamed as they complete
+        ...
+    cellmap.failures  # {id: traceback}
+
+The function receives an RCell with an open file session and runs in a
+worker process (or thread). Exceptions are recorded per rCell instead of
+stopping the run. With a checkpoint, the rCells already done are skipped
+when the run is started again. With Parquet output, rCells are added to the
+checkpoint only once the part file holding their results is on disk.
+"""
+
+import json
+import os
+import time
+import traceback
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from contextlib import ExitStack
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from .rcell import RCell
+
+BACKENDS = ["process", "thread"]
+
+# Results written per Parquet part file
+PARQUET_BATCH = 256
+
+
+def run_cell(func: Callable, id: str, path: Path, dtype) -> tuple:
+    """Run the function on an rCell, catching its exceptions.
+
+    Runs in the workers of CellMap.
+
+    Args:
+        func (Callable): The function to run on the RCell.
+        id (str): The rCell ID.
+        path (Path): The path to the rCell.
+        dtype (np.dtype): The float dtype of the rCell data.
+
+    Returns:
+        tuple: (id, result, error), error is the traceback or None.
+
+    """
+    try:
+        with RCell(path, dtype=dtype).session() as rcell:
+            return id, func(rcell), None
+    except Exception:
+        return id, None, traceback.format_exc()
+
+
+class CellMap:
+    """The results of a function mapped over rCells.
+
+    Iterating runs the function and yields (id, result) as they complete.
+    The run can only be iterated once, see `run` to collect everything.
+
+    Attributes:
+        ids (list[str]): The rCell IDs to run, without those in the checkpoint.
+        skipped (list[str]): The rCell IDs already done in the checkpoint.
+        results (dict[str, Any]): The results of the rCells done in this run.
+        failures (dict[str, str]): The traceback of the rCells that failed.
+
+    Methods:
+        run: Run the function on all rCells and get the results.
+
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        paths: dict[str, Path],
+        workers: int | None = None,
+        backend: str = "process",
+        checkpoint: str | Path | None = None,
+        parquet: str | Path | None = None,
+        progress: bool = True,
+        dtype=np.float64,
+    ):
+        """Prepare the run (see CellDB.map).
+
+        Raises:
+            ValueError: If the backend is unknown.
+
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}. Expected one of {BACKENDS}.")
+
+        self.func = func
+        self.paths = paths
+        self.workers = workers
+        self.backend = backend
+        self.checkpoint = None if checkpoint is None else Path(checkpoint)
+        self.parquet = None if parquet is None else Path(parquet)
+        self.progress = progress
+        self.dtype = dtype
+
+        done = read_checkpoint(self.checkpoint)
+        self.skipped = [id for id in paths if id in done]
+        self.ids = [id for id in paths if id not in done]
+
+        self.results: dict = {}
+        self.failures: dict[str, str] = {}
+        self._started = False
+        # Results and checkpoint records not written yet (see _flush)
+        self._batch: dict = {}
+        self._pending: list[dict] = []
+        self._journal = None
+        return
+
+    def __repr__(self) -> str:
+        """Summarize the run."""
+        # Partials and callable objects have no __name__
+        name = getattr(self.func, "__name__", repr(self.func))
+        return (
+            f"CellMap({name}: {len(self.ids)} rCells,"
+            + f" {len(self.skipped)} skipped, {len(self.results)} done,"
+            + f" {len(self.failures)} failed)"
+        )
+
+    def __iter__(self) -> Iterator[tuple[str, object]]:
+        """Run the function and yield (id, result) as the rCells complete.
+
+        Raises:
+            RuntimeError: If the run was already started.
+
+        """
+        if self._started:
+            raise RuntimeError("A CellMap can only be run once.")
+        self._started = True
+        return self._stream()
+
+    def run(self) -> dict:
+        """Run the function on all rCells and get the results.
+
+        Returns:
+            dict[str, Any]: The results of the rCells done in this run.
+
+        """
+        for _ in self:
+            pass
+        return self.results
+
+    def _executor(self) -> Executor:
+        """Create the pool running the function."""
+        if self.backend == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    @staticmethod
+    def _outcome(future, id: str) -> tuple:
+        """Get (id, result, error) of a finished future."""
+        try:
+            return future.result()
+        except Exception:
+            # The worker died or the result could not be pickled
+            return id, None, traceback.format_exc()
+
+    def _stream(self) -> Iterator[tuple[str, object]]:
+        """Run the function in the pool, recording results and failures."""
+        with ExitStack() as stack:
+            if self.checkpoint is not None:
+                self._journal = stack.enter_context(open(self.checkpoint, "a"))
+            try:
+                yield from self._run()
+            finally:
+                self._flush()
+                self._journal = None
+        return
+
+    def _run(self) -> Iterator[tuple[str, object]]:
+        """Submit the rCells and record their outcomes as they complete."""
+        name = getattr(self.func, "__name__", repr(self.func))
+        with self._executor() as executor:
+            futures = {
+                executor.submit(run_cell, self.func, id, self.paths[id], self.dtype): id
+                for id in self.ids
+            }
+            try:
+                for future in tqdm(
+                    as_completed(futures),
+                    total=len(futures),
+                    disable=not self.progress,
+                    desc=f"Mapping {name}",
+                    colour="blue",
+                    dynamic_ncols=True,
+                ):
+                    id, result, error = self._outcome(future, futures[future])
+                    self._record(id, result, error)
+                    if error is None:
+                        yield id, result
+            except BaseException:
+                # Stopped early (break, interrupt): drop the pending rCells
+                executor.shutdown(cancel_futures=True)
+                raise
+        return
+
+    def _record(self, id: str, result, error: str | None):
+        """Record the outcome of an rCell in the results, Parquet and checkpoint."""
+        record = {"id": id}
+        if error is None:
+            self.results[id] = result
+            self._batch[id] = result
+        else:
+            self.failures[id] = error
+            record["error"] = error.strip().splitlines()[-1]
+        self._pending.append(record)
+
+        if self.parquet is None or len(self._batch) >= PARQUET_BATCH:
+            self._flush()
+        return
+
+    def _flush(self):
+        """Write the batch of results to Parquet, then its checkpoint records.
+
+        The checkpoint is written last: an rCell marked as done always has
+        its results on disk, a killed run only redoes the unwritten batch.
+        """
+        if self.parquet is not None and self._batch:
+            write_parquet(self.parquet, self._batch)
+        self._batch = {}
+
+        if self._journal is not None and self._pending:
+            self._journal.write(
+                "".join(json.dumps(rec) + "\n" for rec in self._pending)
+            )
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        self._pending = []
+        return
+
+
+def read_checkpoint(checkpoint: Path | None) -> set[str]:
+    """Get the rCell IDs done without error in a checkpoint file.
+
+    Args:
+        checkpoint (Path | None): The JSONL checkpoint file.
+
+    Returns:
+        set[str]: The IDs done.
+
+    """
+    if checkpoint is None or not checkpoint.is_file():
+        return set()
+
+    with open(checkpoint) as fp:
+        records = [json.loads(line) for line in fp if line.strip()]
+
+    # Only the last record of an rCell counts (failures can be retried)
+    last = {rec["id"]: rec for rec in records}
+    return {id for id, rec in last.items() if "error" not in rec}
+
+
+def write_parquet(folder: Path, results: dict):
+    """Write a batch of results as a new part of a Parquet dataset.
+
+    Dicts and Series become one row, DataFrames their rows, and other values
+    a "result" column. An "id" column is added. Read the whole dataset with
+    `pd.read_parquet(folder)`.
+
+    Args:
+        folder (Path): The folder of the Parquet dataset.
+        results (dict): The results of a batch of rCells.
+
+    """
+    frames = []
+    for id, result in results.items():
+        if isinstance(result, pd.DataFrame):
+            frame = result.reset_index(drop=True)
+        elif isinstance(result, dict | pd.Series):
+            frame = pd.DataFrame([dict(result)])
+        else:
+            frame = pd.DataFrame({"result": [result]})
+        frames.append(frame.assign(id=id))
+
+    folder.mkdir(parents=True, exist_ok=True)
+    # Unique and in order of writing, runs can share the folder
+    name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+    # Hidden while written, Parquet readers skip it
+    tmp_path = folder / f".{name}.tmp"
+    pd.concat(frames, ignore_index=True).to_parquet(tmp_path, index=False)
+    with open(tmp_path, "rb") as fp:
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, folder / name)
+    return
@@ -0,0 +1,110 @@
+"""Compression codecs of the datasets written to rCell files.
+
+A codec policy maps a dataset kind to a codec:
+    - "data": the acquisition data matrices.
+    - "array": all other numeric arrays (capacitance, n_points, time...).
+Scalars and strings are never compressed.
+
+Codecs are referred to by name (see CODECS). Filters from hdf5plugin
+(blosc, zstd) are added when the package is installed. Reading files written
+with them also requires hdf5plugin, which registers the filters on import.
+See benchmark.py to choose a policy.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+
+@dataclass(frozen=True)
+class Codec:
+    """A compression filter with its options.
+
+    Attributes:
+        compression (str | int | None): h5py compression name or filter id.
+        compression_opts (int | tuple | None): Options of the compression filter.
+        shuffle (bool): Apply the shuffle filter before compression.
+
+    """
+
+    compression: str | int | None = None
+    compression_opts: int | tuple | None = None
+    shuffle: bool = False
+
+    @property
+    def kwargs(self) -> dict:
+        """Keyword arguments of h5py's create_dataset for this codec."""
+        if self.compression is None and not self.shuffle:
+            return {}
+        return {
+            "compression": self.compression,
+            "compression_opts": self.compression_opts,
+            "shuffle": self.shuffle,
+        }
+
+
+CODECS: dict[str, Codec] = {
+    "none": Codec(),
+    "lzf": Codec("lzf"),
+    "shuffle-lzf": Codec("lzf", shuffle=True),
+    **{f"gzip{lvl}": Codec("gzip", lvl) for lvl in [1, 4, 6, 9]},
+    **{f"shuffle-gzip{lvl}": Codec("gzip", lvl, shuffle=True) for lvl in [1, 4, 6]},
+}
+
+if hdf5plugin is not None:
+    for name, plugin in {
+        "blosc-lz4": hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.SHUFFLE),
+        "blosc-zstd": hdf5plugin.Blosc(cname="zstd", shuffle=hdf5plugin.Blosc.SHUFFLE),
+        "zstd": hdf5plugin.Zstd(),
+    }.items():
+        CODECS[name] = Codec(plugin.filter_id, tuple(plugin.filter_options))
+
+KINDS = ["data", "array"]
+
+DEFAULT_POLICY: dict[str, str] = {
+    "data": "gzip6",
+    "array": "none",
+}
+
+
+def get_codec(codec: str | Codec) -> Codec:
+    """Get a codec from its name.
+
+    Args:
+        codec (str | Codec): The codec name (see CODECS) or a Codec.
+
+    Returns:
+        Codec: The codec.
+
+    Raises:
+        ValueError: If the codec name is unknown.
+
+    """
+    if isinstance(codec, Codec):
+        return codec
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}. Expected one of {list(CODECS)}.")
+    return CODECS[codec]
+
+
+def dataset_kind(key: str, data) -> str | None:
+    """Get the kind of a dataset in a codec policy.
+
+    Args:
+        key (str): The name of the dataset.
+        data (Any): The value to store.
+
+    Returns:
+        str | None: "data", "array", or None if it should not be compressed.
+
+    """
+    if not isinstance(data, np.ndarray) or not data.size:
+        return None
+    if data.dtype.kind not in "biuf":
+        return None
+    return "data" if key == "data" else "array"
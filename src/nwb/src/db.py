@@ -25,6 +25,11 @@ Usage:
     # No need to specify the full path, just the ID
     rcell = cellDB.load(rcell_name)
 
+    # Keep the file open while walking the tree
+    # (otherwise it is reopened on every access)
+    with rcell.session():
+        ...
+
     # Plot all data of the first repetition of Activation
     # and the stimulus
     prt = rcell.protocol("Activation")
@@ -50,15 +55,21 @@ Usage:
 
 """
 
+from __future__ import annotations
+
 from collections import Counter
-from functools import cache
+from collections.abc import Callable
 from os import environ
 from pathlib import Path
+from typing import Any
 
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
+from .catalog import CHUNKSIZE, Catalog
+from .cellmap import CellMap
 from .rcell import RCell
+from .stack import Stack, stack
 from .utils import singleton
 
 
@@ -66,14 +77,25 @@ from .utils import singleton
 class CellDB:
     """A singleton class to interface with rCells (list, find, load).
 
+    The rCells of each machine are listed in an on-disk catalog (see catalog.py),
+    stored next to the NWB files, or in the CELLDB_CATALOG_DIR folder if set.
+    The catalog is refreshed once per process on first use (only the files
+    that changed are read), call refresh after adding, changing or removing
+    rCell files in a running process.
+
     Attributes:
         path (dict[str, Path]): Path to rCell NWB files.
             Keys are machine names, values are Path objects.
+        catalog (dict[str, Catalog]): The catalog of each machine.
 
     Methods:
+        refresh: Update the catalogs with the rCell files that changed.
         list: List rCell IDs from a specific machine or all machines.
         validate: Check for duplicate IDs and missing files.
         load: Load an rCell by ID.
+        map: Run a function over rCells in parallel.
+        stack: Load a protocol repetition of many rCells as one array.
+        select: Select rCell IDs by metadata.
         get_path: Get the path to an rCell by ID.
         qpc_path: Get the path to a QPC rCell by ID.
         igor_path: Get the path to an Igor rCell by ID.
@@ -89,11 +111,77 @@ class CellDB:
             "igor": Path(environ["IGOR_NWB_PATH"]),
             "syncropatch": Path(environ["SYNCROPATCH_NWB_PATH"]),
         }
+
+        catalog_dir = environ.get("CELLDB_CATALOG_DIR")
+        self.catalog = {
+            machine: Catalog(
+                Path(catalog_dir) / f"{machine}.sqlite"
+                if catalog_dir
+                else root / ".catalog.sqlite",
+                root,
+                machine,
+            )
+            for machine, root in self.path.items()
+        }
+        # Machines whose catalog was refreshed in this process
+        self._refreshed: set[str] = set()
         return
 
-    @cache
+    def refresh(
+        self,
+        machine: str = "all",
+        progress: bool = False,
+        workers: int | None = None,
+        chunksize: int = CHUNKSIZE,
+    ) -> dict:
+        """Update the catalogs with the rCell files that changed.
+
+        Only new or modified files are read, in parallel worker processes.
+        Files that cannot be read are reported (see Catalog.failures)
+        and retried at the next refresh.
+
+        Args:
+            machine (str, optional): Machine to refresh.
+                Can be "qpc", "igor", "syncropatch", or "all".
+                Defaults to "all".
+            progress (bool, optional): Whether to display a progress bar.
+                Defaults to False.
+            workers (int, optional): Number of worker processes.
+                Defaults to the number of CPUs.
+            chunksize (int, optional): Files read per worker task.
+                Defaults to 64.
+
+        Returns:
+            dict: Counts of rCells read, failed, removed and in total,
+                per machine.
+
+        Raises:
+            ValueError: If an unknown machine is specified.
+
+        """
+        machines = list(self.path) if machine == "all" else [machine]
+        if any(m not in self.path for m in machines):
+            raise ValueError(f"Unknown machine {machine}.")
+        counts = {
+            m: self.catalog[m].refresh(progress, workers, chunksize) for m in machines
+        }
+        self._refreshed.update(machines)
+        return counts
+
+    def _catalog(self, machine: str, **kwargs) -> Catalog:
+        """Get the catalog of a machine, refreshed once per process on first use.
+
+        The refresh only reads the files that changed since the catalog was
+        last updated, by this or another process (see refresh).
+        """
+        catalog = self.catalog[machine]
+        if machine not in self._refreshed:
+            catalog.refresh(**kwargs)
+            self._refreshed.add(machine)
+        return catalog
+
     def _list(self, machine: str) -> list[str]:
-        return [path.stem for path in self.path[machine].rglob("*.nwb")]
+        return self._catalog(machine).ids()
 
     def list(self, machine: str = "all") -> list[str]:
         """List rCell IDs from a specific machine or all machines.
@@ -140,11 +228,16 @@ class CellDB:
                 raise FileNotFoundError(f"Expected rCell in path {cell_path}.")
         return
 
-    def load(self, id: str) -> RCell:
+    def load(self, id: str, keep_open: bool = False, dtype=np.float64) -> RCell:
         """Load an rCell by its ID.
 
         Args:
             id (str): The rCell ID.
+            keep_open (bool, optional): Keep a read-only handle to the file open
+                until rcell.close() is called. See RCell.session.
+                Defaults to False.
+            dtype (np.dtype, optional): Float dtype of acquisition data stored
+                as scaled integers. Defaults to np.float64.
 
         Returns:
             RCell: The loaded rCell object.
@@ -158,11 +251,186 @@ class CellDB:
         if not path.is_file():
             raise FileNotFoundError(f"Expected rCell in path {path}.")
 
-        return RCell(path)
+        rcell = RCell(path, dtype=dtype)
+        if keep_open:
+            rcell.open()
+        return rcell
+
+    def map(
+        self,
+        func: Callable[[RCell], Any],
+        ids: list[str] | None = None,
+        machine: str = "all",
+        workers: int | None = None,
+        backend: str = "process",
+        checkpoint: str | Path | None = None,
+        parquet: str | Path | None = None,
+        progress: bool = True,
+        dtype=np.float64,
+    ) -> CellMap:
+        """Run a function over rCells in parallel.
+
+        The function receives each RCell (with an open session) in a worker
+        process or thread. Iterate over the returned CellMap to stream
+        (id, result) as the rCells complete, or call its run method.
+        Exceptions are recorded per rCell in CellMap.failures.
+
+        Example:
+            >>> cellmap = cellDB.map(my_analysis, machine="qpc", checkpoint="run.jsonl")
+            >>> results = cellmap.run()
+
+        Args:
+            func (Callable[[RCell], Any]): The function to run. With the
+                process backend, it must be picklable (defined in a module).
+            ids (list[str], optional): rCell IDs to run on.
+                Defaults to all rCells of the machine.
+            machine (str, optional): Machine of the rCells when ids is not given.
+                Defaults to "all".
+            workers (int, optional): Number of workers.
+                Defaults to the number of CPUs.
+            backend (str, optional): "process" or "thread". Threads avoid
+                pickling, but only help when func releases the GIL.
+                Defaults to "process".
+            checkpoint (str | Path, optional): JSONL file recording the rCells
+                done, which are skipped when run again. Defaults to None.
+            parquet (str | Path, optional): Folder to write the results to,
+                as a Parquet dataset written in parts as results arrive
+                (requires pyarrow). Defaults to None.
+            progress (bool, optional): Whether to display a progress bar.
+                Defaults to True.
+            dtype (np.dtype, optional): Float dtype of acquisition data stored
+                as scaled integers. Defaults to np.float64.
+
+        Returns:
+            CellMap: The (lazy) run.
+
+        """
+        ids = self.list(machine) if ids is None else ids
+        paths = {id: self.get_path(id) for id in ids}
+        return CellMap(
+            func,
+            paths,
+            workers=workers,
+            backend=backend,
+            checkpoint=checkpoint,
+            parquet=parquet,
+            progress=progress,
+            dtype=dtype,
+        )
+
+    def stack(
+        self,
+        protocol: str,
+        rep: int,
+        filter: dict | Callable[[pd.DataFrame], pd.Series] | None = None,
+        ids: list[str] | None = None,
+        machine: str = "all",
+        workers: int | None = None,
+        dtype=np.float64,
+        progress: bool = False,
+    ) -> Stack:
+        """Load a protocol repetition of many rCells as one array.
+
+        The data is read in parallel worker processes into shared memory
+        (see stack.py). Cells with fewer samples or sweeps are padded with NaN,
+        see Stack.mask. Cells without the repetition are left out and listed
+        in Stack.failures.
+
+        Example:
+            >>> stack = cellDB.stack("Activation", 1, {"ion_channel": "Kv1.1"})
+            >>> stack.data.shape  # (cells, samples, sweeps)
+
+        Args:
+            protocol (str): The protocol name.
+            rep (int): The repetition number.
+            filter (dict | Callable, optional): Metadata selection, see select.
+                Defaults to None.
+            ids (list[str], optional): rCell IDs to load.
+                Defaults to all rCells of the machine.
+            machine (str, optional): Machine of the rCells when ids is not given.
+                Defaults to "all".
+            workers (int, optional): Number of worker processes.
+                Defaults to the number of CPUs.
+            dtype (np.dtype, optional): Float dtype of the array.
+                Defaults to np.float64.
+            progress (bool, optional): Whether to display a progress bar.
+                Defaults to False.
+
+        Returns:
+            Stack: The stacked data with the rCell IDs.
+
+        """
+        ids = self.list(machine) if ids is None else ids
+        if filter is not None:
+            ids = self.select(filter, ids)
+        paths = {id: self.get_path(id) for id in ids}
+        return stack(paths, protocol, rep, workers, dtype, progress)
+
+    def select(
+        self,
+        filter: dict | Callable[[pd.DataFrame], pd.Series],
+        ids: list[str] | None = None,
+    ) -> list[str]:
+        """Select rCell IDs by metadata (see meta_df).
+
+        Args:
+            filter (dict | Callable): Either a dict of meta_df column to value
+                (or list of values), e.g. `{"ion_channel": "Kv1.1"}`, or a
+                function of the meta_df returning a boolean Series.
+                Columns are tuples, or the name of a single column
+                (e.g. "ion_channel" for ("channel_info", "ion_channel")).
+            ids (list[str], optional): rCell IDs to select from.
+                Defaults to all rCells.
+
+        Returns:
+            list[str]: The selected rCell IDs, in the order of ids.
+
+        Raises:
+            ValueError: If a column name is unknown or ambiguous.
+
+        """
+        ids = self.list("all") if ids is None else ids
+        machines = {self._machine(id) for id in ids}
+        meta = pd.concat([self.meta_df(m) for m in sorted(machines)])
+        meta = meta[meta.index.isin(ids)]
+
+        if callable(filter):
+            mask = filter(meta)
+        else:
+            mask = pd.Series(True, index=meta.index)
+            for key, value in filter.items():
+                column = meta[self._column(meta, key)]
+                values = value if isinstance(value, list | tuple | set) else [value]
+                mask &= column.isin(values)
+
+        selected = set(meta.index[mask.to_numpy(dtype=bool)])
+        return [id for id in ids if id in selected]
+
+    @staticmethod
+    def _column(meta: pd.DataFrame, key: str | tuple) -> tuple:
+        """Get the meta_df column of a tuple or a single column name."""
+        if isinstance(key, tuple):
+            return key
+        matches = [col for col in meta.columns if key in (col[0], col[-1])]
+        if len(matches) != 1:
+            raise ValueError(f"Unknown or ambiguous metadata column {key}: {matches}")
+        return matches[0]
+
+    def _machine(self, id: str) -> str:
+        """Get the machine of an rCell ID from its naming rules."""
+        if id.startswith("qpc"):
+            return "qpc"
+        if id.startswith("HA"):
+            return "igor"
+        return "syncropatch"
 
     def get_path(self, id: str) -> Path:
         """Get the file path for an rCell ID.
 
+        The path is read from the catalog of the machine, refreshed on first
+        use if it was built. Otherwise, or if the file is gone (e.g. for a new
+        rCell), it follows the naming rules.
+
         Args:
             id (str): The rCell ID.
 
@@ -170,11 +438,19 @@ class CellDB:
             Path: The file path of the rCell.
 
         """
-        if id.startswith("qpc"):
-            return self.qpc_path(id)
-        if id.startswith("HA"):
-            return self.igor_path(id)
-        return self.syncropatch_path(id)
+        machine = self._machine(id)
+        path_of = {
+            "qpc": self.qpc_path,
+            "igor": self.igor_path,
+            "syncropatch": self.syncropatch_path,
+        }[machine]
+
+        # Not built just to find one path
+        if not self.catalog[machine].exists():
+            return path_of(id)
+
+        path = self._catalog(machine).get_path(id)
+        return path if path is not None and path.is_file() else path_of(id)
 
     def qpc_path(self, id: str) -> Path:
         """Get the path for a 'qpc' rCell ID.
@@ -221,14 +497,27 @@ class CellDB:
             / id
         ).with_suffix(".nwb")
 
-    def meta_df(self, machine: str, progress: bool = False) -> pd.DataFrame:
+    def meta_df(
+        self,
+        machine: str,
+        progress: bool = False,
+        workers: int | None = None,
+        chunksize: int = CHUNKSIZE,
+    ) -> pd.DataFrame:
         """Create a pandas DataFrame with metadata and stimulus information.
 
+        The metadata is read from the catalog as columns, no rCell file is
+        opened (unless the catalog has to be built, see refresh).
+
         Args:
             machine (str): Machine to load metadata from.
                 Can be "qpc", "igor", or "syncropatch".
-            progress (bool, optional): Whether to display a progress bar.
-                Defaults to False.
+            progress (bool, optional): Whether to display a progress bar
+                while building the catalog. Defaults to False.
+            workers (int, optional): Number of worker processes
+                to build the catalog. Defaults to the number of CPUs.
+            chunksize (int, optional): Files read per worker task
+                to build the catalog. Defaults to 64.
 
         Returns:
             pd.DataFrame: Metadata DataFrame.
@@ -237,23 +526,21 @@ class CellDB:
             ValueError: If no rCells are found for the specified machine.
 
         """
-        rows = [
-            self.load(rcell).meta_row
-            for rcell in tqdm(
-                self.list(machine),
-                disable=not progress,
-                desc=f"Loading {machine} metadata",
-                colour="blue",
-                dynamic_ncols=True,
-            )
-        ]
+        if machine not in self.path:
+            raise ValueError(f"Unknown machine {machine}.")
+
+        catalog = self._catalog(
+            machine, progress=progress, workers=workers, chunksize=chunksize
+        )
+        columns = catalog.meta_columns()
 
-        if not rows:
+        if not columns:
             raise ValueError(f"No rCells found for machine {machine}.")
 
-        df = pd.DataFrame(rows).fillna("")
+        # Build the frame once from the columns
+        df = pd.DataFrame(dict(enumerate(columns.values()))).fillna("")
 
-        df.columns = pd.MultiIndex.from_tuples(df.columns)
+        df.columns = pd.MultiIndex.from_tuples(list(columns))
 
         df = df[sorted(df.columns)].set_index(("id", "")).sort_index()
         df.index.name = None
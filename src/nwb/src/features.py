@@ -0,0 +1,279 @@
+"""Vectorized statistics on windows of the acquisition data.
+
+Windows are given as positions in the (n_points, n_sweeps) data matrix of a
+repetition: a sweep, a first position and a stop position (exclusive).
+All windows are computed at once with NumPy, instead of slicing a pandas
+object per window:
+    - sums (mean) from prefix sums along the time axis,
+    - deviations (std) from the points of all windows gathered in one array,
+      centred on the mean of their window,
+    - extrema (min, max) with ufunc.reduceat on the flattened sweeps.
+
+See the window_stats methods of the Repetition, Sweep and PulseSegment classes,
+and Repetition.segment_features.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+STATS = ("mean", "min", "max", "std")
+
+
+def parse_pcts(pcts: Sequence[float | str]) -> np.ndarray:
+    """Convert subsegment percentages to floats.
+
+    Args:
+        pcts (Sequence[float | str]): Percentages as fractions (0.1)
+            or as subsegment ids ("+10%").
+
+    Returns:
+        np.ndarray: The percentages as fractions.
+
+    Raises:
+        ValueError: If a percentage is not between -1 and 1.
+
+    """
+    out = np.array(
+        [float(p[:-1]) / 100 if isinstance(p, str) else p for p in pcts], dtype=float
+    )
+    if (np.abs(out) > 1).any():
+        raise ValueError(f"Invalid percentages: {pcts}")
+    return out
+
+
+def percent_windows(t_pairs: np.ndarray, pcts: np.ndarray) -> np.ndarray:
+    """Get the time limits of percent subsegments for all segments at once.
+
+    Vectorized version of rcell.percent_scale: positive/negative percentages
+    are windows from the start/end of the segment.
+
+    Args:
+        t_pairs (np.ndarray): (..., 2) array of segment time limits.
+        pcts (np.ndarray): (n_pcts,) array of percentages as fractions.
+
+    Returns:
+        np.ndarray: (..., n_pcts, 2) array of subsegment time limits.
+
+    """
+    start = t_pairs[..., 0, None].astype(float)
+    end = t_pairs[..., 1, None].astype(float)
+    span = pcts * (end - start)
+
+    w_start = np.where(pcts < 0, np.trunc(end + span), start)
+    w_end = np.where(pcts > 0, np.ceil(start + span), end)
+
+    return np.stack(np.broadcast_arrays(w_start, w_end), axis=-1)
+
+
+def time_positions(
+    index: pd.Index, start: np.ndarray, end: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the positions of the time points between start and end (inclusive).
+
+    Vectorized version of rcell.time_slice.
+
+    Args:
+        index (pd.Index): Sorted time index.
+        start (np.ndarray): Start times.
+        end (np.ndarray): End times.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: First and stop (exclusive) positions.
+
+    """
+    if isinstance(index, pd.RangeIndex):
+        first = np.ceil((start - index.start) / index.step)
+        stop = np.floor((end - index.start) / index.step) + 1
+        first = np.clip(first, 0, len(index)).astype(int)
+        stop = np.clip(stop, 0, len(index)).astype(int)
+    else:
+        values = index.to_numpy()
+        first = np.searchsorted(values, start, side="left")
+        stop = np.searchsorted(values, end, side="right")
+
+    return first, np.maximum(first, stop)
+
+
+def window_stats(
+    data: np.ndarray,
+    sweeps: np.ndarray,
+    first: np.ndarray,
+    stop: np.ndarray,
+    stats: Sequence[str] = STATS,
+) -> np.ndarray:
+    """Compute statistics of many windows of a data matrix at once.
+
+    The standard deviation uses ddof=1, like pandas, and is computed from
+    the deviations to the mean of the window (two passes), so that large
+    offsets (e.g. raw int16 currents) do not cancel out its precision.
+    Empty windows give NaN. Unlike pandas, NaN values in the data are not
+    skipped.
+
+    Args:
+        data (np.ndarray): (n_points, n_sweeps) data matrix.
+        sweeps (np.ndarray): Sweep (column) of each window.
+        first (np.ndarray): First position of each window.
+        stop (np.ndarray): Stop position (exclusive) of each window.
+        stats (Sequence[str], optional): Statistics to compute,
+            among "mean", "min", "max", "std". Defaults to all.
+
+    Returns:
+        np.ndarray: Array of shape (*first.shape, len(stats)).
+
+    Raises:
+        ValueError: If an unknown statistic is requested.
+
+    """
+    unknown = set(stats) - set(STATS)
+    if unknown:
+        raise ValueError(f"Unknown statistics {unknown}. Expected some of {STATS}.")
+
+    n_points = data.shape[0]
+    sweeps, first, stop = np.broadcast_arrays(sweeps, first, stop)
+    count = stop - first
+    empty = count == 0
+
+    out = {}
+
+    if "mean" in stats or "std" in stats:
+        # Prefix sums along time, with a leading row of zeros
+        csum = np.zeros((n_points + 1, data.shape[1]))
+        np.cumsum(data, axis=0, out=csum[1:])
+        sums = csum[stop, sweeps] - csum[first, sweeps]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["mean"] = sums / count
+
+        if "std" in stats:
+            out["std"] = window_std(data, sweeps, first, count, out["mean"])
+
+    if "min" in stats or "max" in stats:
+        # Sweeps one after the other, plus one sentinel
+        flat = np.append(data.T.ravel(), np.nan)
+        bounds = np.stack(
+            [sweeps * n_points + first, sweeps * n_points + stop], axis=-1
+        ).ravel()
+        for stat, ufunc in [("min", np.minimum), ("max", np.maximum)]:
+            if stat in stats:
+                # Even results are the reductions over [first, stop)
+                out[stat] = ufunc.reduceat(flat, bounds)[::2].reshape(first.shape)
+
+    result = np.stack([out[stat] for stat in stats], axis=-1).astype(float)
+    result[empty] = np.nan
+    return result
+
+
+def window_std(
+    data: np.ndarray,
+    sweeps: np.ndarray,
+    first: np.ndarray,
+    count: np.ndarray,
+    mean: np.ndarray,
+) -> np.ndarray:
+    """Compute the standard deviation (ddof=1) of many windows at once.
+
+    The points of all windows are gathered into one flat array and centred
+    on the mean of their window. The sum of the deviations corrects for the
+    rounding of the mean (corrected two-pass algorithm).
+
+    Args:
+        data (np.ndarray): (n_points, n_sweeps) data matrix.
+        sweeps (np.ndarray): Sweep (column) of each window.
+        first (np.ndarray): First position of each window.
+        count (np.ndarray): Number of points of each window.
+        mean (np.ndarray): Mean of each window.
+
+    Returns:
+        np.ndarray: Array of the shape of first, NaN for less than 2 points.
+
+    """
+    shape = first.shape
+    sweeps, first, counts = sweeps.ravel(), first.ravel(), count.ravel()
+    n_win = len(counts)
+
+    # Ragged gather: window of every point and its row in data
+    offsets = np.cumsum(counts) - counts
+    win = np.repeat(np.arange(n_win), counts)
+    rows = np.arange(counts.sum()) - np.repeat(offsets - first, counts)
+    devs = data[rows, np.repeat(sweeps, counts)] - mean.ravel()[win]
+
+    squares = np.bincount(win, weights=devs**2, minlength=n_win)
+    sums = np.bincount(win, weights=devs, minlength=n_win)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = (squares - sums**2 / counts) / (counts - 1)
+    std = np.sqrt(np.maximum(var, 0))
+    std[counts < 2] = np.nan
+    return std.reshape(shape)
+
+
+FEATURES = ("peak", "mean", "peak_time", "charge")
+
+
+def window_features(
+    data: np.ndarray,
+    time: np.ndarray,
+    sweeps: np.ndarray,
+    first: np.ndarray,
+    stop: np.ndarray,
+) -> np.ndarray:
+    """Compute the FEATURES of many windows of a data matrix at once.
+
+    The points of all windows are gathered into one flat array (no padding),
+    then reduced per window:
+        - peak: the value of largest magnitude (signed).
+        - mean: the mean value.
+        - peak_time: the time of the (first) peak.
+        - charge: the integral over time (trapezoidal rule), in data x time units.
+
+    Empty windows give NaN (and a charge of 0 for a single point).
+
+    Args:
+        data (np.ndarray): (n_points, n_sweeps) data matrix.
+        time (np.ndarray): (n_points,) time of the rows.
+        sweeps (np.ndarray): Sweep (column) of each window.
+        first (np.ndarray): First position of each window.
+        stop (np.ndarray): Stop position (exclusive) of each window.
+
+    Returns:
+        np.ndarray: Array of shape (*first.shape, len(FEATURES)).
+
+    """
+    sweeps, first, stop = np.broadcast_arrays(sweeps, first, stop)
+    shape = first.shape
+    sweeps, first = sweeps.ravel(), first.ravel()
+    counts = stop.ravel() - first
+    n_win = len(counts)
+
+    # Ragged gather: window of every point and its (row, column) in data
+    offsets = np.cumsum(counts) - counts
+    win = np.repeat(np.arange(n_win), counts)
+    rows = np.arange(counts.sum()) - np.repeat(offsets - first, counts)
+    vals = data[rows, np.repeat(sweeps, counts)].astype(float)
+    times = np.asarray(time, dtype=float)[rows]
+
+    out = np.full((n_win, len(FEATURES)), np.nan)
+    filled = counts > 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[:, 1] = np.bincount(win, weights=vals, minlength=n_win) / counts
+
+    if filled.any():
+        mags = np.abs(vals)
+        # Offsets of non-empty windows are increasing and in range
+        peak_mag = np.maximum.reduceat(mags, offsets[filled])
+        hits = np.flatnonzero(mags == np.repeat(peak_mag, counts[filled]))
+        hit_win, first_hit = np.unique(win[hits], return_index=True)
+        pos = hits[first_hit]
+        out[hit_win, 0] = vals[pos]
+        out[hit_win, 2] = times[pos]
+
+    # Trapezoids between consecutive points of the same window
+    same = win[1:] == win[:-1]
+    areas = (vals[1:] + vals[:-1]) / 2 * np.diff(times)
+    out[:, 3] = np.bincount(win[1:][same], weights=areas[same], minlength=n_win)
+    out[~filled, 3] = np.nan
+
+    return out.reshape(*shape, len(FEATURES))
@@ -1,10 +1,21 @@
 """I/O functions for transforming nested dictionaries to/from HDF5 files."""
 
+from collections.abc import Iterator
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
 from pathlib import Path
 
 import h5py
 import numpy as np
 
+from .codec import Codec
+from .layout import (
+    OFFSET_ATTR,
+    SCALE_ATTR,
+    ScaledArray,
+    dataset_kwargs,
+    is_attr_scalar,
+)
 from .validation import Validator
 
 VALIDATOR = Validator()
@@ -15,6 +26,9 @@ def save(
     nest: dict,
     overwrite: bool = False,
     validate: bool = False,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
 ):
     """Save nested dictionary to HDF5 file.
 
@@ -25,6 +39,16 @@ def save(
             Defaults to False.
         validate (bool, optional): Validate the dictionary before saving.
             Defaults to False.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            One of "auto", "single", "sweep", "tile" (see layout.py).
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy, the codec name
+            (see codec.CODECS) per dataset kind ("data" and "array"),
+            e.g. {"data": "shuffle-gzip1"}. Defaults to gzip6 for data only.
+        scalar_attrs (bool, optional): Store scalar leaves (numbers and short
+            strings) as attributes of their group instead of datasets.
+            They are loaded identically, and metadata reads are faster.
+            Defaults to False.
 
     """
     file_path = Path(file_path)
@@ -34,55 +58,208 @@ def save(
 
     if overwrite or not file_path.exists():
         with h5py.File(file_path, "w") as h5file:
-            recurse_save(h5file, [""], nest)
+            recurse_save(
+                h5file,
+                [""],
+                nest,
+                chunks=chunks,
+                codecs=codecs,
+                scalar_attrs=scalar_attrs,
+            )
 
     return
 
 
-def recurse_save(h5file: h5py.File, path: list[str], nest: dict):
+def recurse_save(
+    h5file: h5py.File,
+    path: list[str],
+    nest: dict,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
+):
     """Recursively save the contents of a dictionary to an h5py file.
 
     Args:
         h5file (h5py.File): H5py file object.
         path (list[str]): List of keys to the current group.
         nest (dict): Dictionary to save.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+        scalar_attrs (bool, optional): Store scalar leaves as attributes
+            of their group. Defaults to False.
 
     """
+    group = h5file["/".join(path) or "/"]
+
     for key, data in nest.items():
         path.append(key)
         st = "/".join(path)
 
         if isinstance(data, dict):
-            h5file.create_group(st)
-            recurse_save(h5file, path, data)
+            h5file.require_group(st)
+            recurse_save(h5file, path, data, chunks, codecs, scalar_attrs)
+        elif scalar_attrs and is_attr_scalar(data):
+            group.attrs[key] = data
         else:
-            # Strings are stored and read as bytes, need to be encoded
-            # See https://github.com/h5py/h5py/issues/1769
-            if isinstance(data, np.ndarray) and data.dtype.kind == "U":
-                data = data.astype("S")
+            create_dataset(h5file, st, data, chunks=chunks, codecs=codecs)
 
-            kwargs = {"data": data}
+        path.pop()
 
-            if key == "data":
-                kwargs.update(
-                    {
-                        "chunks": data.shape,
-                        "compression": "gzip",
-                        "compression_opts": 6,
-                    }
-                )
 
-            h5file.create_dataset(st, **kwargs)
+def create_dataset(
+    group: h5py.Group,
+    name: str,
+    data,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+) -> h5py.Dataset:
+    """Create a dataset from a value of the rCell dictionary.
 
-        path.pop()
+    Args:
+        group (h5py.Group): Group to create the dataset in.
+        name (str): Name (or path) of the dataset.
+        data (Any): The value to store. ScaledArray values are stored as their
+            integer samples with the scale and offset as attributes.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+
+    Returns:
+        h5py.Dataset: The created dataset.
+
+    """
+    key = name.rsplit("/", 1)[-1]
+    attrs = {}
+
+    # Strings are stored and read as bytes, need to be encoded
+    # See https://github.com/h5py/h5py/issues/1769
+    if isinstance(data, np.ndarray) and data.dtype.kind == "U":
+        data = data.astype("S")
+
+    elif isinstance(data, ScaledArray):
+        attrs = {SCALE_ATTR: data.scale, OFFSET_ATTR: data.offset}
+        data = data.samples
 
+    dataset = group.create_dataset(name, **dataset_kwargs(key, data, chunks, codecs))
+    dataset.attrs.update(attrs)
 
-def load(file_path: str | Path, root: str | Path = "") -> dict:
+    return dataset
+
+
+def recurse_copy(
+    src: h5py.Group,
+    dst: h5py.Group,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
+):
+    """Recursively copy an h5py group to another with a new storage layout.
+
+    Unlike a load/save round trip, soft links and attributes are preserved,
+    and datasets keep their exact dtype.
+
+    Args:
+        src (h5py.Group): Group to copy from.
+        dst (h5py.Group): Group to copy to.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+        scalar_attrs (bool, optional): Store scalar datasets as attributes
+            of their group (see save). Defaults to False.
+
+    Raises:
+        ValueError: If an unknown link or object type is encountered.
+
+    """
+    dst.attrs.update(src.attrs)
+
+    for key in src:
+        link = src.get(key, getlink=True)
+
+        if isinstance(link, h5py.SoftLink):
+            dst[key] = h5py.SoftLink(link.path)
+        elif isinstance(link, h5py.ExternalLink):
+            dst[key] = h5py.ExternalLink(link.filename, link.path)
+        else:
+            val = src[key]
+            if isinstance(val, h5py.Group):
+                group = dst.create_group(key)
+                recurse_copy(val, group, chunks, codecs, scalar_attrs)
+            elif (
+                scalar_attrs
+                and isinstance(val, h5py.Dataset)
+                and val.shape == ()
+                and not val.attrs
+                and is_attr_scalar(val[()])
+            ):
+                dst.attrs[key] = val[()]
+            elif isinstance(val, h5py.Dataset):
+                kwargs = dataset_kwargs(key, val[()], chunks, codecs)
+                dst.create_dataset(key, dtype=val.dtype, **kwargs)
+                dst[key].attrs.update(val.attrs)
+            else:
+                raise ValueError("Unknown type:", type(val))
+
+    return
+
+
+H5Source = str | Path | h5py.Group
+
+
+@contextmanager
+def open_file(source: H5Source) -> Iterator[h5py.Group]:
+    """Open an HDF5 file for reading, or reuse an already open handle.
+
+    Args:
+        source (str | Path | h5py.Group): Path to the file or an open h5py
+            File/Group. Open handles are yielded as is and are not closed.
+
+    Yields:
+        h5py.Group: The open file (or group).
+
+    """
+    if isinstance(source, h5py.Group):
+        yield source
+        return
+
+    with h5py.File(Path(source), "r") as h5file:
+        yield h5file
+
+
+def load(
+    file_path: H5Source,
+    root: str | Path = "",
+    decode: bool = True,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+) -> dict:
     """Load nested dictionary from HDF5 file.
 
+    The file is traversed once, following the groups relative to the current
+    one. Projections restrict what is read with glob patterns on the paths
+    relative to root: "*" matches one level, "**" any number of levels.
+    A matching group is loaded with all its contents. Groups that cannot
+    contain a match are not traversed.
+
+    Example:
+        >>> load(path, "/general", include=["channel_info/*", "experiment/date"])
+        >>> load(path, exclude=["acquisition/**/data"])
+
     Args:
-        file_path (str | Path): Path to the file.
+        file_path (str | Path | h5py.Group): Path to the file or an open handle.
         root (str, optional): Root group to load.
+        decode (bool, optional): Decode scaled integer datasets to float arrays.
+            If False, they are loaded as ScaledArray, so that saving the
+            dictionary again keeps them compact. Defaults to True.
+        include (list[str], optional): Only load the paths matching one of
+            these patterns. Defaults to everything.
+        exclude (list[str], optional): Skip the paths matching one of
+            these patterns. Defaults to nothing.
 
     Returns:
         dict: Nested dictionary.
@@ -91,24 +268,40 @@ def load(file_path: str | Path, root: str | Path = "") -> dict:
         ValueError: If the root is not a group.
 
     """
-    file_path = Path(file_path)
     root = str(root)
 
-    with h5py.File(file_path, "r") as h5file:
+    with open_file(file_path) as h5file:
         if root:
             h5file = h5file[root]
         if not isinstance(h5file, h5py.Group):
             raise ValueError(f"{root} is {type(root)}. Use get() to load datasets.")
 
-        return recurse_load([root], h5file)
+        return recurse_load(
+            h5file,
+            decode=decode,
+            include=None if include is None else compile_globs(include),
+            exclude=compile_globs(exclude or []),
+        )
 
 
-def recurse_load(path: list[str], nest: h5py.Group) -> dict:
-    """Recursively load the contents of an h5py file to a dictionary.
+def recurse_load(
+    nest: h5py.Group,
+    decode: bool = True,
+    include: list[tuple[str, ...]] | None = None,
+    exclude: list[tuple[str, ...]] | None = None,
+    path: tuple[str, ...] = (),
+) -> dict:
+    """Recursively load the contents of an h5py group to a dictionary.
 
     Args:
-        path (list[str]): List of keys to the current group.
         nest (h5py.Group): H5py group object.
+        decode (bool, optional): Decode scaled integer datasets.
+            Defaults to True.
+        include (list[tuple[str, ...]], optional): Compiled patterns of the
+            paths to load (see compile_globs). Defaults to everything.
+        exclude (list[tuple[str, ...]], optional): Compiled patterns of the
+            paths to skip. Defaults to nothing.
+        path (tuple[str, ...], optional): Keys from the loaded root to nest.
 
     Returns:
         dict: Loaded dictionary.
@@ -119,26 +312,132 @@ def recurse_load(path: list[str], nest: h5py.Group) -> dict:
     """
     data = {}
 
-    for key in nest.keys():
-        path.append(key)
-
-        st = "/".join(path)
-
-        val = nest[st]
+    # Scalar leaves stored as attributes of the group (see save)
+    for key, val in nest.attrs.items():
+        sub_path = (*path, key)
+        if exclude and any(match_glob(pat, sub_path) for pat in exclude):
+            continue
+        if include is None or any(match_glob(pat, sub_path) for pat in include):
+            data[key] = load_value(val)
+
+    for key, val in nest.items():
+        sub_path = (*path, key)
+
+        if exclude and any(match_glob(pat, sub_path) for pat in exclude):
+            continue
+
+        sub_include = include
+        if include is not None:
+            if any(match_glob(pat, sub_path) for pat in include):
+                # Load the whole subtree
+                sub_include = None
+            elif not isinstance(val, h5py.Group) or not any(
+                match_glob(pat, sub_path, partial=True) for pat in include
+            ):
+                continue
 
         if isinstance(val, h5py.Group):
-            data[key] = recurse_load(path, val)
+            sub_data = recurse_load(val, decode, sub_include, exclude, sub_path)
+            # Only keep groups traversed for a projection if something matched
+            if sub_data or sub_include is None:
+                data[key] = sub_data
         elif isinstance(val, h5py.Dataset):
-            data[key] = load_dataset(val)
+            data[key] = load_dataset(val, decode=decode)
         else:
             raise ValueError("Unknown type:", type(val))
 
-        path.pop()
+    if nest.attrs:
+        # Same order as a file with datasets only (by name)
+        data = dict(sorted(data.items()))
 
     return data
 
 
-def load_dataset(dataset: h5py.Dataset):
+def compile_globs(patterns: list[str]) -> list[tuple[str, ...]]:
+    """Split path glob patterns into their levels.
+
+    Args:
+        patterns (list[str]): Patterns like "general/channel_info/*".
+
+    Returns:
+        list[tuple[str, ...]]: The levels of each pattern.
+
+    """
+    return [tuple(part for part in pat.split("/") if part) for pat in patterns]
+
+
+def match_glob(
+    pattern: tuple[str, ...], path: tuple[str, ...], partial: bool = False
+) -> bool:
+    """Check if a path matches a compiled glob pattern.
+
+    Args:
+        pattern (tuple[str, ...]): Levels of the pattern, "**" matches
+            any number of levels, other levels are fnmatch patterns.
+        path (tuple[str, ...]): Keys of the path.
+        partial (bool, optional): Also match paths that are the beginning of
+            a match (i.e. groups that can contain a match). Defaults to False.
+
+    Returns:
+        bool: Whether the path matches.
+
+    """
+    if not path:
+        return partial or all(part == "**" for part in pattern)
+    if not pattern:
+        return False
+    if pattern[0] == "**":
+        return match_glob(pattern[1:], path, partial) or match_glob(
+            pattern, path[1:], partial
+        )
+    return fnmatchcase(path[0], pattern[0]) and match_glob(
+        pattern[1:], path[1:], partial
+    )
+
+
+def memmap(dataset: h5py.Dataset) -> np.memmap | None:
+    """Map a dataset directly from the file, without reading it.
+
+    Only contiguous, uncompressed numeric datasets of files on disk can be
+    mapped (see the "contiguous" layout). Slicing the map reads only the
+    requested bytes, with no decompression and no copy through h5py.
+
+    Args:
+        dataset (h5py.Dataset): Dataset from an HDF5 file.
+
+    Returns:
+        np.memmap | None: Read-only map of the dataset, None if not mappable.
+
+    """
+    if (
+        dataset.chunks is not None
+        or not dataset.ndim
+        or dataset.dtype.kind not in "biuf"
+        or dataset.file.driver != "sec2"
+    ):
+        return None
+
+    offset = dataset.id.get_offset()
+    if offset is None:
+        # Storage not allocated (empty dataset)
+        return None
+
+    return np.memmap(
+        dataset.file.filename,
+        dtype=dataset.dtype,
+        mode="r",
+        offset=offset,
+        shape=dataset.shape,
+    )
+
+
+def load_dataset(
+    dataset: h5py.Dataset,
+    sel: tuple = (),
+    decode: bool = True,
+    dtype=np.float64,
+    mmap: bool = False,
+):
     """Convert a dataset correctly to pass validation.
 
     When loading data from an HDF5 file, the data types are not always
@@ -153,25 +452,67 @@ def load_dataset(dataset: h5py.Dataset):
         * Some old rCells have arrays with singleton dimensions, and some
           scalars were stored as 0D arrays. These are fixed here for
           compatibility with older datasets.
+        * Integer datasets with scale/offset attributes (see ScaledArray)
+          are decoded to float arrays, like the float data of older rCells.
 
     Args:
         dataset (h5py.Dataset): Dataset from an HDF5 file.
+        sel (tuple, optional): Selection to read, e.g. `np.s_[:, 3]`.
+            Only the chunks that intersect the selection are read.
+            Defaults to the whole dataset.
+        decode (bool, optional): Decode scaled integer datasets.
+            If False, a ScaledArray is returned. Defaults to True.
+        dtype (np.dtype, optional): Float dtype of decoded scaled datasets.
+            Defaults to np.float64.
+        mmap (bool, optional): Memory-map the dataset instead of reading it,
+            when it is stored contiguous and uncompressed. The returned
+            array is then read-only. Defaults to False.
+
+    Returns:
+        Converted data in its appropriate type.
+
+    """
+    mapped = memmap(dataset) if mmap else None
+    source = dataset if mapped is None else mapped
+
+    if dataset.dtype.kind in "iu" and SCALE_ATTR in dataset.attrs:
+        scaled = ScaledArray(
+            source[sel],
+            scale=dataset.attrs[SCALE_ATTR].item(),
+            offset=dataset.attrs.get(OFFSET_ATTR, np.float64(0)).item(),
+        )
+        if not decode:
+            return scaled
+        val = scaled.decode(dtype)
+    else:
+        val = source[sel]
+
+    return load_value(val)
+
+
+def load_value(val):
+    """Convert a value read from a dataset or an attribute (see load_dataset).
+
+    Args:
+        val (Any): The value read by h5py.
 
     Returns:
         Converted data in its appropriate type.
 
     Raises:
-        ValueError: If an unexpected dataset type is encountered.
+        ValueError: If an unexpected value type is encountered.
 
     """
-    val = dataset[()]
-
     # Strings are stored and read as bytes, need to be decoded
     # See https://github.com/h5py/h5py/issues/1769
     if isinstance(val, bytes):
         # Decode bytes
         val = val.decode("utf-8")
 
+    elif isinstance(val, str):
+        # Strings stored as attributes are read as str
+        pass
+
     # numpy scalar or array
     elif isinstance(val, np.generic | np.ndarray):
         if val.dtype.kind in ["S", "O"]:
@@ -194,12 +535,51 @@ def load_dataset(dataset: h5py.Dataset):
     return val
 
 
-def get(path: str | Path, key: str | Path = ""):
+def same(a, b) -> bool:
+    """Check that two loaded rCell values are bit-exactly identical.
+
+    Args:
+        a (Any): A value returned by nwb.load.
+        b (Any): Another value returned by nwb.load.
+
+    Returns:
+        bool: Whether the values have the same type, shape, dtype and bytes.
+
+    """
+    if type(a) is not type(b):
+        return False
+
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+
+    if isinstance(a, np.ndarray):
+        if a.dtype != b.dtype or a.shape != b.shape:
+            return False
+        if a.dtype.kind == "O":
+            return bool((a == b).all())
+        return a.tobytes() == b.tobytes()
+
+    return np.asarray(a).tobytes() == np.asarray(b).tobytes()
+
+
+def get(
+    path: H5Source,
+    key: str | Path = "",
+    sel: tuple = (),
+    dtype=np.float64,
+    mmap: bool = False,
+):
     """Get a dataset from an HDF5 file.
 
     Args:
-        path (str | Path): Path to the file.
+        path (str | Path | h5py.Group): Path to the file or an open handle.
         key (str | Path): Key to the dataset.
+        sel (tuple, optional): Selection to read, e.g. `np.s_[:, 3]`.
+            Defaults to the whole dataset.
+        dtype (np.dtype, optional): Float dtype of decoded scaled datasets.
+            Defaults to np.float64.
+        mmap (bool, optional): Memory-map the dataset if it is contiguous and
+            uncompressed. Defaults to False.
 
     Returns:
         Any: Data from the dataset.
@@ -208,23 +588,29 @@ def get(path: str | Path, key: str | Path = ""):
         ValueError: If the key is not a dataset.
 
     """
-    path = Path(path)
     key = str(key)
 
-    with h5py.File(path, "r") as h5file:
+    with open_file(path) as h5file:
+        if key and key not in h5file:
+            # Scalar leaf stored as an attribute of its group (see save)
+            parent, sep, name = key.rpartition("/")
+            group = h5file.get(parent or sep or ".")
+            if isinstance(group, h5py.Group) and name in group.attrs:
+                return load_value(group.attrs[name])
+
         if key:
             h5file = h5file[key]
         if not isinstance(h5file, h5py.Dataset):
             raise ValueError(f"{key} is {type(key)}. Use load() to load groups.")
 
-        return load_dataset(h5file)
+        return load_dataset(h5file, sel=sel, dtype=dtype, mmap=mmap)
 
 
-def keys(path: str | Path, root: str | Path = "") -> list[str]:
+def keys(path: H5Source, root: str | Path = "") -> list[str]:
     """Get all keys in a group of an HDF5 file.
 
     Args:
-        path (str | Path): Path to the file.
+        path (str | Path | h5py.Group): Path to the file or an open handle.
         root (str | Path, optional): Root group to load.
 
     Returns:
@@ -234,14 +620,16 @@ def keys(path: str | Path, root: str | Path = "") -> list[str]:
         ValueError: If the root is not a group.
 
     """
-    path = Path(path)
     root = str(root)
 
-    with h5py.File(path, "r") as h5file:
+    with open_file(path) as h5file:
         if root:
             h5file = h5file[root]
 
         if not isinstance(h5file, h5py.Group):
             raise ValueError(f"{root} is not a group.")
 
+        if h5file.attrs:
+            # Including scalar leaves stored as attributes (see save)
+            return sorted([*h5file.keys(), *h5file.attrs.keys()])
         return list(h5file.keys())
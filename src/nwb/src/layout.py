@@ -0,0 +1,225 @@
+"""Storage layout (chunking) of the datasets written to rCell files.
+
+The acquisition `data` matrices have shape (n_points, n_sweeps). They are
+compressed (see codec.py), so HDF5 has to decompress a whole chunk to read
+any part of it.
+The chunk shape decides how much is decompressed when reading a single sweep
+or a time window of a repetition.
+
+Available layouts:
+    - "single": one chunk per dataset (the layout of older rCells).
+    - "sweep": one chunk per sweep (column).
+    - "tile": time-block x sweep tiles, sized to fit the HDF5 chunk cache.
+    - "auto": pick one of the above from the data shape (see auto_layout).
+    - "contiguous": no chunks and no compression. Files are larger, but the
+      data can be memory-mapped and read without decompression or copies
+      (see io.memmap).
+
+The data can also be stored compactly as the integer samples of the
+instrument with a scale and offset attribute (see ScaledArray).
+
+Scalar leaves (numbers, booleans and short strings) can be stored as
+attributes of their parent group instead of datasets (see is_attr_scalar).
+Each dataset has its own object header and needs a separate read, while the
+attributes of a group are read together with it.
+"""
+
+from dataclasses import dataclass
+from math import ceil, prod
+
+import numpy as np
+
+from .codec import DEFAULT_POLICY, Codec, dataset_kind, get_codec
+
+# h5py opens files with a chunk cache of 1 MiB (rdcc_nbytes).
+# Chunks should be well below it so that several fit at once.
+CHUNK_MAX_BYTES = 256 * 1024
+# Smaller chunks compress poorly and add index overhead.
+CHUNK_MIN_BYTES = 16 * 1024
+
+LAYOUTS = ["auto", "single", "sweep", "tile", "contiguous"]
+
+# Attributes of integer datasets storing scaled values (CF conventions)
+SCALE_ATTR = "scale_factor"
+OFFSET_ATTR = "add_offset"
+
+# Longer strings are stored as datasets (attributes are limited to 64 KiB)
+ATTR_MAX_STR = 1024
+
+
+@dataclass(eq=False)
+class ScaledArray:
+    """Integer samples with a linear scale to physical units.
+
+    The physical values are `samples * scale + offset`. Instruments like the
+    Syncropatch record int16 samples, storing those instead of float64 values
+    takes 4 times less space. On file, the samples are stored as an integer
+    dataset with the scale and offset as attributes.
+
+    Wherever the rCell dictionary expects a float array, a ScaledArray
+    can be used instead (the validator checks the decoded shape and dtype).
+
+    Attributes:
+        samples (np.ndarray): The integer samples.
+        scale (float): The scale factor to physical units.
+        offset (float): The offset in physical units.
+        shape (tuple): The shape of the samples.
+        dtype (np.dtype): The dtype of the decoded values (float64).
+
+    """
+
+    samples: np.ndarray
+    scale: float
+    offset: float = 0.0
+
+    @property
+    def shape(self) -> tuple:
+        """The shape of the samples."""
+        return self.samples.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The dtype of the decoded values."""
+        return np.dtype(np.float64)
+
+    def decode(self, dtype=np.float64) -> np.ndarray:
+        """Get the values in physical units.
+
+        Args:
+            dtype (np.dtype, optional): Float dtype of the values.
+                Defaults to np.float64.
+
+        Returns:
+            np.ndarray: The values in physical units.
+
+        """
+        val = self.samples.astype(dtype)
+        val *= val.dtype.type(self.scale)
+        if self.offset:
+            val += val.dtype.type(self.offset)
+        return val
+
+
+def is_attr_scalar(data) -> bool:
+    """Check if a value can be stored as an attribute of its parent group.
+
+    Args:
+        data (Any): The value to store.
+
+    Returns:
+        bool: Whether the value is a number, a boolean or a short string.
+
+    """
+    if isinstance(data, str | bytes):
+        return len(data) <= ATTR_MAX_STR
+    return isinstance(data, bool | int | float | np.bool_ | np.number)
+
+
+def auto_layout(shape: tuple[int, ...], itemsize: int) -> str:
+    """Choose a chunk layout from the shape of a dataset.
+
+    Small datasets are stored in a single chunk. Matrices whose sweeps
+    have a reasonable size get one chunk per sweep. Otherwise, very short
+    or very long sweeps are grouped or split into tiles.
+
+    Args:
+        shape (tuple[int, ...]): Shape of the dataset.
+        itemsize (int): Size in bytes of one element.
+
+    Returns:
+        str: The layout name.
+
+    """
+    if len(shape) != 2 or prod(shape) * itemsize <= CHUNK_MIN_BYTES:
+        return "single"
+
+    if CHUNK_MIN_BYTES <= shape[0] * itemsize <= CHUNK_MAX_BYTES:
+        return "sweep"
+
+    return "tile"
+
+
+def chunk_shape(
+    shape: tuple[int, ...],
+    itemsize: int,
+    layout: str = "auto",
+) -> tuple[int, ...] | None:
+    """Get the chunk shape of a (n_points, n_sweeps) dataset for a layout.
+
+    Args:
+        shape (tuple[int, ...]): Shape of the dataset.
+        itemsize (int): Size in bytes of one element.
+        layout (str, optional): One of LAYOUTS. Defaults to "auto".
+
+    Returns:
+        tuple[int, ...] | None: The chunk shape, None for contiguous storage.
+
+    Raises:
+        ValueError: If the layout is unknown.
+
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown chunk layout {layout}. Expected one of {LAYOUTS}.")
+
+    if layout == "contiguous":
+        return None
+
+    if layout == "auto":
+        layout = auto_layout(shape, itemsize)
+
+    if layout == "single" or len(shape) != 2:
+        return tuple(shape)
+
+    n_points, n_sweeps = shape
+
+    if layout == "sweep":
+        return (n_points, 1)
+
+    # tile: cap the time block to the max chunk size,
+    # group short sweeps until the min chunk size is reached
+    rows = min(n_points, max(1, CHUNK_MAX_BYTES // itemsize))
+    cols = min(n_sweeps, max(1, ceil(CHUNK_MIN_BYTES / (rows * itemsize))))
+    return (rows, cols)
+
+
+def dataset_kwargs(
+    key: str,
+    data,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+) -> dict:
+    """Get the keyword arguments of h5py's create_dataset for a value.
+
+    Args:
+        key (str): The name of the dataset.
+        data (Any): The value to store.
+        chunks (str, optional): The chunk layout of `data` datasets.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec per dataset kind
+            ("data", "array"). Missing kinds use codec.DEFAULT_POLICY.
+
+    Returns:
+        dict: Keyword arguments for create_dataset (including data).
+
+    """
+    kwargs = {"data": data}
+
+    kind = dataset_kind(key, data)
+    if kind is None:
+        return kwargs
+
+    codec = get_codec({**DEFAULT_POLICY, **(codecs or {})}[kind])
+
+    if kind == "data" and chunks == "contiguous":
+        # Filters need chunks, contiguous data is stored as is
+        return kwargs
+
+    if kind == "data":
+        kwargs["chunks"] = chunk_shape(data.shape, data.dtype.itemsize, chunks)
+    elif codec.kwargs:
+        # Let h5py guess the chunks of the other arrays
+        kwargs["chunks"] = True
+
+    kwargs.update(codec.kwargs)
+
+    return kwargs
@@ -5,23 +5,44 @@ See db.py for the main interface.
 
 from __future__ import annotations
 
+import os
 from abc import ABC, abstractmethod
 from collections.abc import Iterator
+from contextlib import contextmanager
 from functools import cached_property
 from itertools import chain
 from pathlib import Path
 from typing import cast
+from weakref import WeakValueDictionary
 
+import h5py
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from .cache import ArrayCache
 from .dict import flatten, pad_keytuples
+from .features import (
+    FEATURES,
+    STATS,
+    parse_pcts,
+    percent_windows,
+    time_positions,
+    window_features,
+    window_stats,
+)
 from .io import get, keys, load
 from .plot import Axes, Figure, PlotObject
 from .stimulus import PulseStimulus, StimCsv, StimType
+from .utils import cached_slot
 
 STIMCSV = StimCsv()
+ARRAY_CACHE = ArrayCache()
+
+# Default subsegments: 5% increments from 5% to 95% and from -95% to -5%
+SUBSEGMENTS: list[str] = [
+    f"{pct:+d}%" for pct in chain(range(5, 100, 5), range(-5, -100, -5))
+]
 
 
 class RCell:
@@ -29,33 +50,74 @@ class RCell:
 
     The class provides methods to load data from an rCell file.
 
+    By default, every access opens and closes the file. Inside a session
+    (see `session` and `open`), a single read-only handle is kept open and
+    reused by the whole Protocol/Repetition/Sweep tree. The handle is
+    reopened automatically when the object is used in a forked process,
+    and it is never pickled.
+
+    Protocols are canonical: while a Protocol object is in use, `protocol`
+    returns that same object (see AcquisitionPart).
+
     Attributes:
         path (Path): The path to the rCell.
         id (str): The id of the rCell.
+        dtype (np.dtype): The float dtype of decoded scaled integer data.
         metadata (dict): The metadata ("general" field) of the rCell.
         stimulus (dict): The stimulus information on the rCell.
         meta_row (pd.Series): The metadata and stimulus information in a pandas Series.
+        meta_dict (dict): The same information as a flat dictionary.
 
     Methods:
         get: Get a dataset from the rCell.
         load: Load rCell group as a nested dictionary.
         keys: Get all keys in a group of the rCell.
         protocol | prt: Get the protocol object
+        open: Keep a read-only handle to the rCell file open.
+        close: Close the handle opened with open.
+        session: Context manager that keeps the file open within its block.
 
     """
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, dtype=np.float64):
         """Initialize the rCell object.
 
         Args:
             path (Path): The path to the rCell.
+            dtype (np.dtype, optional): Float dtype to decode acquisition data
+                stored as scaled integers (see ScaledArray). Use np.float32 to
+                halve the memory of the decoded data. Defaults to np.float64.
 
         """
         self.path: Path = path
         self.id: str = self.path.stem
+        self.dtype = dtype
 
-        self.prt = self.protocol
         self.parent = None
+
+        self._h5file: h5py.File | None = None
+        self._pid: int | None = None
+        self._sessions: int = 0
+        self._children: WeakValueDictionary[str, Protocol] = WeakValueDictionary()
+        return
+
+    def __getstate__(self) -> dict:
+        """Drop the open file handle when pickling (e.g. to a process pool)."""
+        state = self.__dict__.copy()
+        state.update(_h5file=None, _pid=None, _sessions=0)
+        # Weak references cannot be pickled
+        state.pop("_children", None)
+        return state
+
+    def __setstate__(self, state: dict):
+        """Restore the object from a pickled state."""
+        self.__dict__.update(state)
+        self._children = WeakValueDictionary()
+        return
+
+    def __del__(self):
+        """Close the file handle if still open."""
+        self._release()
         return
 
     def __iter__(self):
@@ -72,12 +134,86 @@ class RCell:
         """Return the id of the rCell."""
         return f"{self.id}"
 
+    @property
+    def is_open(self) -> bool:
+        """Whether a file handle is held open for this process."""
+        return self._h5file is not None and self._pid == os.getpid()
+
+    def open(self) -> RCell:
+        """Keep a read-only handle to the rCell file open.
+
+        Calls can be nested, the file is closed when close is called
+        the same number of times.
+
+        Returns:
+            RCell: The rCell object itself.
+
+        """
+        self._sessions += 1
+        self._source()
+        return self
+
+    def close(self):
+        """Close the file handle opened with open.
+
+        The handle is only released once all nested open calls are closed.
+        """
+        self._sessions = max(self._sessions - 1, 0)
+        if not self._sessions:
+            self._release()
+        return
+
+    @contextmanager
+    def session(self) -> Iterator[RCell]:
+        """Keep the rCell file open for the duration of the with block.
+
+        Example:
+            >>> with rcell.session():
+            ...     for rep in rcell.protocol("Activation"):
+            ...         rep.data
+
+        Yields:
+            RCell: The rCell object itself.
+
+        """
+        self.open()
+        try:
+            yield self
+        finally:
+            self.close()
+
+    def _source(self) -> Path | h5py.File:
+        """Get the open file handle if in a session, otherwise the file path.
+
+        A handle inherited from a parent process (after fork) is not used,
+        a new one is opened in the current process instead.
+        """
+        if self._h5file is not None and self._pid != os.getpid():
+            # Do not close the handle of the parent process, just forget it
+            self._h5file = None
+
+        if self._h5file is None:
+            if not self._sessions:
+                return self.path
+            self._h5file = h5py.File(self.path, "r")
+            self._pid = os.getpid()
+
+        return self._h5file
+
+    def _release(self):
+        """Close the file handle if it belongs to the current process."""
+        h5file = getattr(self, "_h5file", None)
+        if h5file is not None and self._pid == os.getpid():
+            h5file.close()
+        self._h5file = None
+        self._pid = None
+        return
+
     @cached_property
     def metadata(self) -> dict:
         """The metadata ("general" field) of the rCell."""
-        meta = self.load("/general")
-        meta["experiment"].pop("nanioncsv_log", None)
-        return meta
+        # The nanion csv log is large and not metadata, it is not read
+        return self.load("/general", exclude=["experiment/nanioncsv_log"])
 
     @cached_property
     def stimulus(self) -> dict:
@@ -85,13 +221,13 @@ class RCell:
         return self.load("/stimulus/presentation")
 
     @property
-    def meta_row(self) -> pd.Series:
-        """Get the metadata and stimulus information in a pandas Series.
+    def meta_dict(self) -> dict[tuple, object]:
+        """Get the metadata and stimulus information as a flat dictionary.
 
-        This method is appropriate to use when creating a database of rCells.
+        Keys are tuples of at least 2 keys, see meta_row.
 
         Returns:
-            pd.Series: The metadata and stimulus information.
+            dict[tuple, object]: The metadata and stimulus information.
 
         """
         flat_row = flatten(self.metadata)
@@ -100,32 +236,58 @@ class RCell:
         for protocol, dic in self.stimulus.items():
             flat_row[("stim_id", protocol)] = dic["stim_id"]
 
-        flat_row = pad_keytuples(flat_row, 2)
-        return pd.Series(flat_row)
+        return pad_keytuples(flat_row, 2)
+
+    @property
+    def meta_row(self) -> pd.Series:
+        """Get the metadata and stimulus information in a pandas Series.
 
-    def get(self, key: str | Path):
+        This method is appropriate to use when creating a database of rCells.
+
+        Returns:
+            pd.Series: The metadata and stimulus information.
+
+        """
+        return pd.Series(self.meta_dict)
+
+    def get(self, key: str | Path, sel: tuple = (), mmap: bool = False):
         """Get a dataset from the rCell.
 
+        Scaled integer data is decoded to the dtype of the rCell.
+
         Args:
             key (str | Path): The key path to get.
+            sel (tuple, optional): Selection to read, e.g. `np.s_[:, 3]`.
+                Defaults to the whole dataset.
+            mmap (bool, optional): Memory-map the dataset if it is stored
+                contiguous and uncompressed. Defaults to False.
 
         Returns:
             Any: The data loaded from file.
 
         """
-        return get(self.path, key)
-
-    def load(self, root: str | Path = ""):
+        return get(self._source(), key, sel=sel, dtype=self.dtype, mmap=mmap)
+
+    def load(
+        self,
+        root: str | Path = "",
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
+    ):
         """Load rCell as a nested dictionary.
 
         Args:
             root (str, optional): root group to load.
+            include (list[str], optional): Glob patterns of the paths
+                (relative to root) to load, see io.load. Defaults to everything.
+            exclude (list[str], optional): Glob patterns of the paths
+                to skip. Defaults to nothing.
 
         Returns:
             dict | Any: nested dictionary or the data loaded from file.
 
         """
-        return load(self.path, root=root)
+        return load(self._source(), root=root, include=include, exclude=exclude)
 
     def keys(self, root: str | Path = ""):
         """Get all keys in a group of the rCell.
@@ -137,7 +299,7 @@ class RCell:
             list[str]: list of keys in the group.
 
         """
-        return keys(self.path, root=root)
+        return keys(self._source(), root=root)
 
     def protocol(self, protocol: str):
         """Get the protocol object.
@@ -155,16 +317,23 @@ class RCell:
         if protocol not in self.stimulus:
             raise KeyError(f"Protocol '{protocol}' not found in rCell.")
 
-        return Protocol(protocol, self)
+        return child(self, Protocol, protocol)
+
+    prt = protocol
 
 
 class AcquisitionPart(ABC):
     """Base class for all parts of the acquisition data.
 
+    The objects are compact (__slots__) and canonical: each parent keeps a
+    weak registry of its children, so the same (parent, id) returns the same
+    object for as long as it is in use, with its cached attributes
+    (see utils.cached_slot). Unused objects are freed as usual.
+
     Attributes:
         id (str | int): The id of the object.
         parent (AcquisitionPart | RCell): The parent object.
-        name (str): The name of the class.
+        name (str): A short name for the class.
         path (Path): The path to the object.
 
     Methods:
@@ -174,9 +343,25 @@ class AcquisitionPart(ABC):
 
     """
 
+    __slots__ = (
+        "id",
+        "parent",
+        "path",
+        "_children",
+        "_id_path",
+        "_keys",
+        "_rcell",
+        "__weakref__",
+    )
+
+    name = "Part"
+
     def __init__(self, id, parent):
         """Initialize an AcquisitionPart object.
 
+        Use the parent methods (e.g. `Protocol.repetition`) to get the
+        canonical object instead.
+
         Args:
             id (str | int): The id of the object.
             parent (AcquisitionPart | RCell): The parent object.
@@ -184,8 +369,23 @@ class AcquisitionPart(ABC):
         """
         self.id: str | int = id
         self.parent = parent
-        self.name = self.__class__.__name__
         self.path: Path = self.parent.path
+        self._children: WeakValueDictionary = WeakValueDictionary()
+
+    def __getstate__(self) -> dict:
+        """Get the slots to pickle, without the registry of children."""
+        return {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if slot not in ("_children", "__weakref__") and hasattr(self, slot)
+        }
+
+    def __setstate__(self, state: dict):
+        """Restore the object from a pickled state."""
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._children = WeakValueDictionary()
 
     def __iter__(self) -> Iterator[AcquisitionPart]:
         """Iterate over the children of the object."""
@@ -196,27 +396,24 @@ class AcquisitionPart(ABC):
         parent = "" if self.parent is None else f"{self.parent} | "
         return f"{parent}{self.name}:{self.id}"
 
-    @cached_property
+    @cached_slot
     def id_path(self) -> tuple:
-        """A tuple of the ids of the object and its parents."""
-        ids = [self.id]
-        while self.parent is not None:
-            self = self.parent
-            ids.append(self.id)
-        return tuple(reversed(ids))
+        """Get a tuple of the ids of the object and its parents."""
+        parent = self.parent
+        if isinstance(parent, AcquisitionPart):
+            return (*parent.id_path, self.id)
+        return (parent.id, self.id)
 
-    @cached_property
+    @cached_slot
     def keys(self):
-        """A list of ids of the children of the object."""
+        """Get a list of ids of the children of the object."""
         return []
 
-    @cached_property
+    @cached_slot
     def rcell(self) -> RCell:
-        """The root rCell object."""
-        obj = self
-        while not isinstance(obj, RCell):
-            obj = obj.parent
-        return obj
+        """Get the root rCell object."""
+        parent = self.parent
+        return parent.rcell if isinstance(parent, AcquisitionPart) else parent
 
     @abstractmethod
     def iter(self) -> Iterator[AcquisitionPart]:
@@ -266,6 +463,10 @@ class Protocol(AcquisitionPart):
 
     """
 
+    __slots__ = ("_stim_id", "_stimulus")
+
+    name = "Prt"
+
     def __init__(self, id: str, parent: RCell):
         """Initialize a Protocol object.
 
@@ -276,22 +477,23 @@ class Protocol(AcquisitionPart):
         """
         super().__init__(id, parent)
         self.path = Path(f"/acquisition/timeseries/{self.id}/repetitions")
-        self.name = "Prt"
-        self.rep = self.repetition
 
-    @cached_property
+    @cached_slot
     def keys(self):
-        """The repetition numbers for the protocol."""
+        """Get the repetition numbers for the protocol."""
         return [int(rep[10:]) for rep in self.parent.keys(self.path)]
 
-    @cached_property
+    @cached_slot
     def stim_id(self) -> int:
-        """The stimulus id for the protocol."""
-        return self.rcell.get(f"/stimulus/presentation/{self.id}/stim_id")  # type: ignore
+        """Get the stimulus id for the protocol.
 
-    @cached_property
+        Read from the stimulus group of the rCell, loaded once for all protocols.
+        """
+        return self.rcell.stimulus[self.id]["stim_id"]
+
+    @cached_slot
     def stimulus(self) -> StimType:
-        """The Stimulus object for the protocol."""
+        """Get the Stimulus object for the protocol."""
         return STIMCSV.get(self.stim_id)
 
     def iter(self) -> Iterator[Repetition]:
@@ -314,12 +516,16 @@ class Protocol(AcquisitionPart):
         """
         if rep not in self.keys:
             raise ValueError(f"Protocol does not have repetition {rep}")
-        return Repetition(rep, self)
+        return child(self, Repetition, rep)
+
+    rep = repetition
 
 
 class SubProtocol(AcquisitionPart, ABC):
     """Subclass for acquisition parts below protocol."""
 
+    __slots__ = ("_protocol",)
+
     def __init__(self, id, parent):
         """Initialize a SubProtocol object.
 
@@ -330,21 +536,13 @@ class SubProtocol(AcquisitionPart, ABC):
         """
         super().__init__(id, parent)
 
-        self.data: (
-            property
-            | pd.DataFrame
-            | pd.Series
-            | cached_property[pd.DataFrame]
-            | cached_property[pd.Series]
-        )
+        self.data: property | pd.DataFrame | pd.Series | cached_slot
 
-    @cached_property
+    @cached_slot
     def protocol(self) -> Protocol:
-        """The parent protocol object."""
-        obj = self
-        while not isinstance(obj, Protocol):
-            obj = obj.parent
-        return obj
+        """Get the parent protocol object."""
+        parent = self.parent
+        return parent if isinstance(parent, Protocol) else parent.protocol
 
     def plot(self, ax: Axes | None = None) -> PlotObject:
         """Plot the data on the acquisition object.
@@ -384,9 +582,12 @@ class Repetition(SubProtocol):
         id (int): The id of the repetition.
         name (str): A short name for the object.
         parent (Protocol): The parent protocol object.
-        data (pd.DataFrame): The data for the repetition.
+        data (pd.DataFrame): The data for the repetition (a writable copy).
+        view (pd.DataFrame): The data for the repetition, read-only and
+            without copy.
         keys (list): The sweep numbers for the repetition.
         parent_protocol (Protocol): The parent protocol object.
+        cache_key (tuple): The key of the data in the ArrayCache.
         RCell (RCell): The root rCell object.
 
     Methods:
@@ -397,6 +598,10 @@ class Repetition(SubProtocol):
 
     """
 
+    __slots__ = ("_data", "_view")
+
+    name = "Rep"
+
     def __init__(self, id: int, parent: Protocol):
         """Initialize a Repetition object.
 
@@ -407,30 +612,221 @@ class Repetition(SubProtocol):
         """
         super().__init__(id, parent)
         self.path = self.parent.path / f"repetition{self.id}"
-        self.name = "Rep"
-        self.swp = self.sweep
 
-    @cached_property
+    @cached_slot
     def keys(self):
-        """The sweep numbers for the repetition."""
+        """Get the sweep numbers for the repetition."""
         n_sweeps = self.parent.stimulus.sweep_count
         return list(range(n_sweeps))
 
-    @cached_property
+    @cached_slot
     def data(self) -> pd.DataFrame:
-        """Get the data of the repetition.
+        """Get the data of the repetition, as a writable copy of view.
+
+        The frame can be modified in place, the data shared with other
+        repetitions is not changed. Use view to read it without a copy.
 
         Returns:
             pd.DataFrame: The data for this repetition with the time as index.
 
         """
-        data: np.ndarray = self.get("data")  # type: ignore
-        time: np.ndarray = self.get("time")  # type: ignore
+        return self.view.copy()
 
+    @cached_slot
+    def view(self) -> pd.DataFrame:
+        """Get the data of the repetition without copying it (read-only).
+
+        Data stored with the "contiguous" layout is memory-mapped instead of
+        read, slicing sweeps and segments then copies nothing. Other data is
+        kept in the process-wide ArrayCache (see cache.py), so repetitions used
+        again are not read and decompressed again. Setting values raises a
+        ValueError, as the arrays are shared.
+
+        Returns:
+            pd.DataFrame: The data for this repetition with the time as index.
+
+        """
+        data: np.ndarray = ARRAY_CACHE.get(
+            self.cache_key,
+            lambda: self.rcell.get(self.path / "data", mmap=True),  # type: ignore
+        )
+        # Single sweeps are squeezed on load
+        data = data.reshape(len(data), -1)
+
+        # copy=False: keep the memory map (pandas >= 3 copies arrays by default)
         return pd.DataFrame(
             data,
             columns=pd.Index(range(data.shape[1]), name="Sweep"),
-            index=pd.Index(time, name="Time (us)"),
+            index=self.time_index(len(data)),
+            copy=False,
+        )
+
+    @property
+    def cache_key(self) -> tuple:
+        """The key of the repetition data in the ArrayCache.
+
+        The modification time of the file invalidates the key
+        when the rCell is rewritten.
+        """
+        rcell = self.rcell
+        return (
+            str(rcell.path.resolve()),
+            rcell.path.stat().st_mtime_ns,
+            self.parent.id,
+            self.id,
+            np.dtype(rcell.dtype).name,
+        )
+
+    def time_index(self, n_points: int) -> pd.Index:
+        """Get the time axis of the repetition.
+
+        The sampling is uniform, so the axis is a RangeIndex built from the
+        first time point and x_interval, without reading the time vector.
+        Only if its last point does not match (non-uniform time vector)
+        is the stored time vector read in full.
+
+        Args:
+            n_points (int): The number of time points.
+
+        Returns:
+            pd.Index: The time axis in microseconds.
+
+        """
+        x_interval = self.get("x_interval")
+        time_key = self.path / "time"
+
+        # First and last points only
+        ends = np.atleast_1d(
+            self.rcell.get(time_key, sel=np.s_[:: max(n_points - 1, 1)])
+        )
+        start = ends[0].item()
+
+        if (
+            isinstance(x_interval, int)
+            and float(start).is_integer()
+            and ends[-1] == start + (n_points - 1) * x_interval
+        ):
+            start = int(start)
+            return pd.RangeIndex(
+                start, start + n_points * x_interval, x_interval, name="Time (us)"
+            )
+
+        return pd.Index(self.rcell.get(time_key), name="Time (us)")
+
+    def window_stats(
+        self,
+        pcts: list | None = None,
+        stats: tuple[str, ...] = STATS,
+        sweeps: list[int] | None = None,
+        segments: list[int] | None = None,
+    ) -> np.ndarray:
+        """Compute statistics of the subsegments of all segments and sweeps.
+
+        All windows are computed at once on the data matrix (see features.py),
+        without creating Sweep, PulseSegment or PulseSubSegment objects. The
+        stored data is used (view), changes made to data are not seen.
+        The windows match the PulseSubSegment data, and the statistics the
+        pandas ones (std with ddof=1), up to floating point rounding.
+
+        Example:
+            >>> stats = rep.window_stats(["+10%", "-10%"], stats=("mean",))
+            >>> stats[sweep, segment, 1, 0]  # mean of the last 10%
+
+        Args:
+            pcts (list, optional): Subsegment percentages, as fractions (0.1)
+                or ids ("+10%"). Defaults to the PulseSegment subsegments.
+            stats (tuple[str, ...], optional): Statistics among "mean", "min",
+                "max" and "std". Defaults to all.
+            sweeps (list[int], optional): Sweeps to compute. Defaults to all.
+            segments (list[int], optional): Segments to compute.
+                Defaults to all.
+
+        Returns:
+            np.ndarray: Array of shape (sweeps, segments, pcts, stats).
+
+        Raises:
+            ValueError: If the stimulus is not a PulseStimulus.
+
+        """
+        stim = self.parent.stimulus
+        if not isinstance(stim, PulseStimulus):
+            raise ValueError("Stimulus is not a PulseStimulus")
+
+        sweeps = self.keys if sweeps is None else sweeps
+        segments = list(range(stim.t_pairs.shape[1])) if segments is None else segments
+        pct_arr = parse_pcts(SUBSEGMENTS if pcts is None else pcts)
+
+        t_pairs = stim.t_pairs[np.ix_(sweeps, segments)]
+        # (sweeps, segments, pcts, 2)
+        windows = percent_windows(t_pairs, pct_arr)
+
+        data = self.view
+        first, stop = time_positions(data.index, windows[..., 0], windows[..., 1])
+        sweep_idx = np.asarray(sweeps).reshape(-1, 1, 1)
+
+        return window_stats(data.to_numpy(), sweep_idx, first, stop, stats)
+
+    def segment_features(
+        self,
+        sweeps: list[int] | None = None,
+        segments: list[int] | None = None,
+        as_frame: bool = False,
+    ) -> np.ndarray | pd.DataFrame:
+        """Compute features of all segments of all sweeps in one pass.
+
+        The features (see features.FEATURES) are:
+            - peak: the current of largest magnitude (signed).
+            - mean: the mean current.
+            - peak_time: the time of the peak in microseconds.
+            - charge: the integral of the current over the segment (nA x us).
+
+        The segments are the PulseSegment data, no Sweep or PulseSegment
+        object is created.
+
+        Example:
+            >>> peaks = rep.segment_features()[:, 2, 0]  # peak of segment 2
+
+        Args:
+            sweeps (list[int], optional): Sweeps to compute. Defaults to all.
+            segments (list[int], optional): Segments to compute.
+                Defaults to all.
+            as_frame (bool, optional): Return a DataFrame with one row per
+                sweep and segment. Defaults to False.
+
+        Returns:
+            np.ndarray | pd.DataFrame: Array of shape (sweeps, segments, features),
+                or DataFrame indexed by (Sweep, Segment) with a column per feature.
+
+        Raises:
+            ValueError: If the stimulus is not a PulseStimulus.
+
+        """
+        stim = self.parent.stimulus
+        if not isinstance(stim, PulseStimulus):
+            raise ValueError("Stimulus is not a PulseStimulus")
+
+        sweeps = self.keys if sweeps is None else sweeps
+        segments = list(range(stim.t_pairs.shape[1])) if segments is None else segments
+
+        # (sweeps, segments, 2)
+        t_pairs = stim.t_pairs[np.ix_(sweeps, segments)]
+
+        data = self.view
+        first, stop = time_positions(data.index, t_pairs[..., 0], t_pairs[..., 1])
+        sweep_idx = np.asarray(sweeps).reshape(-1, 1)
+
+        features = window_features(
+            data.to_numpy(), data.index.to_numpy(), sweep_idx, first, stop
+        )
+        if not as_frame:
+            return features
+
+        return pd.DataFrame(
+            features.reshape(-1, len(FEATURES)),
+            index=pd.MultiIndex.from_product(
+                [sweeps, segments], names=["Sweep", "Segment"]
+            ),
+            columns=list(FEATURES),
         )
 
     def iter(self) -> Iterator[Sweep]:
@@ -453,7 +849,9 @@ class Repetition(SubProtocol):
         """
         if sweep not in self.keys:
             raise ValueError(f"Repetition does not have sweep {sweep}")
-        return Sweep(sweep, self)
+        return child(self, Sweep, sweep)
+
+    swp = sweep
 
 
 class Sweep(SubProtocol):
@@ -468,47 +866,65 @@ class Sweep(SubProtocol):
         data (pd.Series): The data for the sweep.
         keys (list): The segment numbers for the sweep.
         stimulus (pd.Series): The stimulus data for the sweep.
+        command (pd.Series): The command voltage sampled like the data.
+        segment_times (list): The time limits of all segments of the sweep.
+        segment_voltages (list): The voltage limits of all segments of the sweep.
 
     Methods:
         get: Get a field from the repetition appropriate to this sweep.
-        segment: Get a segment of the sweep.
+        segment | seg: Get a segment of the sweep.
 
     """
 
-    def __init__(self, id: int, parent: Repetition):
-        """Initialize a Sweep object.
-
-        Args:
-            id (int): The id of the sweep.
-            parent (Repetition): The parent repetition object.
+    __slots__ = ("_stimulus", "_command", "_segment_times", "_segment_voltages")
 
-        """
-        super().__init__(id, parent)
-        self.name = "Swp"
-        self.seg = self.segment
+    name = "Swp"
 
     @property
     def data(self) -> pd.Series:
         """The data of the sweep as a pandas Series."""
         return self.parent.data.loc[:, self.id]
 
-    @cached_property
+    @cached_slot
     def keys(self):
-        """The segment numbers for the sweep.
+        """Get the segment numbers for the sweep.
+
+        Raises:
+            ValueError: If the stimulus is not a PulseStimulus.
+
+        """
+        return list(range(len(self.segment_times)))
+
+    @cached_slot
+    def segment_times(self) -> list:
+        """Get the time limits of all segments, read at once for the segments.
 
         Raises:
             ValueError: If the stimulus is not a PulseStimulus.
 
         """
+        return self._pulse_stimulus().t_pairs[self.id].tolist()
+
+    @cached_slot
+    def segment_voltages(self) -> list:
+        """Get the voltage limits of all segments, read at once for the segments.
+
+        Raises:
+            ValueError: If the stimulus is not a PulseStimulus.
+
+        """
+        return self._pulse_stimulus().v_pairs[self.id].tolist()
+
+    def _pulse_stimulus(self) -> PulseStimulus:
+        """Get the stimulus of the protocol, which must be a PulseStimulus."""
         stim = self.protocol.stimulus
         if not isinstance(stim, PulseStimulus):
             raise ValueError("Stimulus is not a PulseStimulus")
-        n_segments = stim.t_pairs.shape[1]
-        return list(range(n_segments))
+        return stim
 
-    @cached_property
+    @cached_slot
     def stimulus(self) -> pd.Series:
-        """The stimulus data for the sweep as a pandas Series."""
+        """Get the stimulus data for the sweep as a pandas Series."""
         sweep_ind = self.id
         stim = self.protocol.stimulus
 
@@ -520,6 +936,42 @@ class Sweep(SubProtocol):
 
         return pd.Series(v, index=pd.Index(t))
 
+    @cached_slot
+    def command(self) -> pd.Series:
+        """Get the command voltage of the sweep, on the time axis of its data.
+
+        The command is sampled every x_interval from the start of the sweep
+        (see BaseStimulus.sample, the waveform is shared by all sweeps with
+        the same stimulus and x_interval), sample i at the time of data point
+        i. Data points after the end of the command are NaN.
+        """
+        index = self.parent.view.index
+        samples = self.protocol.stimulus.sample(self.get("x_interval"), [self.id])[0]
+
+        command = np.full(len(index), np.nan)
+        n_samples = min(len(index), len(samples))
+        command[:n_samples] = samples[:n_samples]
+        return pd.Series(command, index=index, name="Command (mV)")
+
+    def window_stats(
+        self, pcts: list | None = None, stats: tuple[str, ...] = STATS
+    ) -> np.ndarray:
+        """Compute statistics of the subsegments of all segments of the sweep.
+
+        See Repetition.window_stats.
+
+        Args:
+            pcts (list, optional): Subsegment percentages, as fractions (0.1)
+                or ids ("+10%"). Defaults to the PulseSegment subsegments.
+            stats (tuple[str, ...], optional): Statistics among "mean", "min",
+                "max" and "std". Defaults to all.
+
+        Returns:
+            np.ndarray: Array of shape (segments, pcts, stats).
+
+        """
+        return self.parent.window_stats(pcts, stats, sweeps=[self.id])[0]
+
     def iter(self) -> Iterator[PulseSegment]:
         """Iterate over the segments of the sweep."""
         for seg in self.keys:
@@ -547,7 +999,9 @@ class Sweep(SubProtocol):
         """
         if seg not in self.keys:
             raise ValueError(f"Sweep does not have segment {seg}")
-        return PulseSegment(seg, self)
+        return child(self, PulseSegment, seg)
+
+    seg = segment
 
 
 class PulseSegment(SubProtocol):
@@ -570,6 +1024,10 @@ class PulseSegment(SubProtocol):
 
     """
 
+    __slots__ = ("subs", "_voltage", "_time")
+
+    name = "Seg"
+
     def __init__(self, id: int, parent: Sweep):
         """Initialize a PulseSegment object.
 
@@ -579,12 +1037,7 @@ class PulseSegment(SubProtocol):
 
         """
         super().__init__(id, parent)
-
-        self.name = "Seg"
-        self.sub = self.subsegment
-        self.subs: list[str] = [
-            f"{pct:+d}%" for pct in chain(range(5, 100, 5), range(-5, -100, -5))
-        ]
+        self.subs: list[str] = list(SUBSEGMENTS)
 
     @property
     def stimulus(self) -> PulseStimulus:
@@ -599,25 +1052,46 @@ class PulseSegment(SubProtocol):
             raise ValueError("Stimulus is not a PulseStimulus")
         return stim
 
-    @cached_property
+    @cached_slot
     def voltage(self) -> list:
-        """The voltage limits of the segment as a list."""
-        par_id: int = self.parent.id
-        id: int = cast(int, self.id)
-        return self.stimulus.v_pairs[par_id, id].tolist()
+        """Get the voltage limits of the segment as a list."""
+        return self.parent.segment_voltages[cast(int, self.id)]
 
-    @cached_property
+    @cached_slot
     def time(self) -> list:
-        """The time limits of the segment as a list."""
-        par_id: int = self.parent.id
-        id: int = cast(int, self.id)
-        return self.stimulus.t_pairs[par_id, id].tolist()
+        """Get the time limits of the segment as a list."""
+        return self.parent.segment_times[cast(int, self.id)]
 
     @property
     def data(self) -> pd.Series:
         """The data of the segment as a pandas Series with the time as index."""
-        start, end = self.time
-        return self.parent.data.loc[start:end]
+        data = self.parent.data
+        return data.iloc[time_slice(data.index, *self.time)]
+
+    def window_stats(
+        self, pcts: list | None = None, stats: tuple[str, ...] = STATS
+    ) -> np.ndarray:
+        """Compute statistics of subsegments without creating them.
+
+        See Repetition.window_stats.
+
+        Example:
+            >>> means = seg.window_stats(seg.subs, stats=("mean",))[:, 0]
+
+        Args:
+            pcts (list, optional): Subsegment percentages, as fractions (0.1)
+                or ids ("+10%"). Defaults to the subs attribute.
+            stats (tuple[str, ...], optional): Statistics among "mean", "min",
+                "max" and "std". Defaults to all.
+
+        Returns:
+            np.ndarray: Array of shape (pcts, stats).
+
+        """
+        sweep: Sweep = self.parent
+        rep: Repetition = sweep.parent
+        pcts = self.subs if pcts is None else pcts
+        return rep.window_stats(pcts, stats, [sweep.id], [cast(int, self.id)])[0, 0]
 
     def iter(self) -> Iterator[PulseSubSegment]:
         """Iterate over the subsegments of the pulse segment."""
@@ -628,13 +1102,16 @@ class PulseSegment(SubProtocol):
         """Get a subsegment of the pulse segment.
 
         Args:
-            pct (float): The percentage of the subsegment.
+            pct (float | str): The percentage of the subsegment.
 
         Returns:
             PulseSubSegment: The subsegment object.
 
         """
-        return PulseSubSegment(pct, self)
+        pct = PulseSubSegment.parse_pct(pct)
+        return child(self, PulseSubSegment, pct)
+
+    sub = subsegment
 
 
 class PulseSubSegment(SubProtocol):
@@ -654,6 +1131,10 @@ class PulseSubSegment(SubProtocol):
 
     """
 
+    __slots__ = ("pct", "_voltage", "_time")
+
+    name = "Sub"
+
     def __init__(self, id, parent):
         """Initialize a PulseSubSegment object.
 
@@ -665,6 +1146,25 @@ class PulseSubSegment(SubProtocol):
             ValueError: If the id is not a float or string
                 or if the percentage is not between -1 and 1.
 
+        """
+        pct = self.parse_pct(id)
+        super().__init__(f"{pct * 100:+.0f}%", parent)
+        self.pct = pct
+
+    @staticmethod
+    def parse_pct(id) -> float:
+        """Get the percentage of a subsegment id as a fraction.
+
+        Args:
+            id (str | float): The percentage, e.g. "+10%" or 0.1.
+
+        Returns:
+            float: The percentage as a fraction.
+
+        Raises:
+            ValueError: If the id is not a float or string
+                or if the percentage is not between -1 and 1.
+
         """
         if isinstance(id, str):
             id = float(id[:-1]) / 100
@@ -674,32 +1174,76 @@ class PulseSubSegment(SubProtocol):
         if not -1 <= id <= 1:
             raise ValueError(f"Invalid percentage: {id}")
 
-        str_id = f"{id * 100:+.0f}%"
-        super().__init__(str_id, parent)
-        self.name = "Sub"
-        self.pct = id
+        return id
 
-    @cached_property
+    @cached_slot
     def voltage(self) -> tuple[int, int]:
-        """The voltage limits of the subsegment in milliVolts."""
+        """Get the voltage limits of the subsegment in milliVolts."""
         return percent_scale(self.pct, *self.parent.voltage)
 
-    @cached_property
+    @cached_slot
     def time(self) -> tuple[int, int]:
-        """The time limits of the subsegment in microseconds."""
+        """Get the time limits of the subsegment in microseconds."""
         return percent_scale(self.pct, *self.parent.time)
 
     @property
     def data(self) -> pd.Series:
         """The data of the subsegment as a pandas Series with the time as index."""
-        start, end = self.time
-        return self.parent.data.loc[start:end]
+        data = self.parent.data
+        return data.iloc[time_slice(data.index, *self.time)]
 
     def iter(self):
         """Not implemented for PulseSubSegment."""
         raise NotImplementedError("SubSegments have no children.")
 
 
+def child(parent, cls: type, id):
+    """Get the canonical child object of a parent.
+
+    The object is created on first use and kept in the weak registry
+    of the parent, so it is reused while it is referenced anywhere.
+
+    Args:
+        parent (AcquisitionPart | RCell): The parent object.
+        cls (type): The class of the child.
+        id (str | int | float): The id of the child, also its key in the registry.
+
+    Returns:
+        AcquisitionPart: The child object.
+
+    """
+    obj = parent._children.get(id)
+    if obj is None:
+        obj = cls(id, parent)
+        parent._children[id] = obj
+    return obj
+
+
+def time_slice(index: pd.Index, start, end) -> slice:
+    """Get the positions of the time points between start and end (inclusive).
+
+    Equivalent to label-based slicing `.loc[start:end]` on a sorted time index,
+    but computed in O(1) for a uniform (RangeIndex) time axis.
+
+    Args:
+        index (pd.Index): Sorted time index.
+        start: Start time.
+        end: End time.
+
+    Returns:
+        slice: Positional slice for `.iloc`.
+
+    """
+    if not isinstance(index, pd.RangeIndex):
+        return index.slice_indexer(start, end)
+
+    # first position with time >= start: ceil((start - t0) / step)
+    first = max(0, int(-((index.start - start) // index.step)))
+    # last position with time <= end: floor((end - t0) / step)
+    stop = min(len(index), int((end - index.start) // index.step) + 1)
+    return slice(first, max(first, stop))
+
+
 def percent_scale(pct, start, end) -> tuple[int, int]:
     """Scale the start and end values by the percentage.
 
@@ -0,0 +1,229 @@
+"""Load one protocol repetition of many rCells as a single array (see CellDB.stack).
+
+The shapes of the data matrices are read first, then the data, both in
+parallel worker processes. The data is written directly into one shared
+memory array: nothing is pickled back to the main process. Cells with fewer
+samples or sweeps are padded.
+
+    stack = CellDB().stack("Activation", 1, filter={"ion_channel": "Kv1.1"})
+    stack.data      # (cells, samples, sweeps)
+    stack.ids       # the rCell of each cell
+    stack.mask()    # False on padding
+
+Shared memory is an anonymous shared mapping inherited by the workers,
+which requires the "fork" start method (Linux). Elsewhere, the workers
+return the arrays to the main process instead.
+"""
+
+import mmap
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from itertools import repeat
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from .io import get
+
+# Shared output array of the worker processes (see attach)
+_OUT: np.ndarray | None = None
+
+# Files whose shape is read per task of a worker process
+PROBE_CHUNKSIZE = 64
+
+
+@dataclass
+class Stack:
+    """One protocol repetition of many rCells.
+
+    Attributes:
+        ids (pd.Index): The rCell ID of each cell.
+        data (np.ndarray): (cells, samples, sweeps) array, padded with NaN.
+        n_points (np.ndarray): Number of samples of each cell.
+        n_sweeps (np.ndarray): Number of sweeps of each cell.
+        x_interval (np.ndarray): Sampling interval of each cell (us).
+        failures (dict[str, str]): Cells that could not be read, with the error.
+            They are left out, or kept as padding if they failed while reading
+            the data (n_points and n_sweeps are 0).
+
+    """
+
+    ids: pd.Index
+    data: np.ndarray
+    n_points: np.ndarray
+    n_sweeps: np.ndarray
+    x_interval: np.ndarray
+    failures: dict[str, str] = field(default_factory=dict)
+
+    def mask(self) -> np.ndarray:
+        """Get the mask of the data actually recorded.
+
+        Returns:
+            np.ndarray: (cells, samples, sweeps) boolean array, False on padding.
+
+        """
+        _, samples, sweeps = self.data.shape
+        in_points = np.arange(samples) < self.n_points[:, None]
+        in_sweeps = np.arange(sweeps) < self.n_sweeps[:, None]
+        return in_points[:, :, None] & in_sweeps[:, None, :]
+
+
+def stack(
+    paths: dict[str, Path],
+    protocol: str,
+    rep: int,
+    workers: int | None = None,
+    dtype=np.float64,
+    progress: bool = False,
+) -> Stack:
+    """Load one protocol repetition of many rCells as a single array.
+
+    Args:
+        paths (dict[str, Path]): The path of each rCell ID.
+        protocol (str): The protocol name.
+        rep (int): The repetition number.
+        workers (int, optional): Number of worker processes.
+            Defaults to the number of CPUs.
+        dtype (np.dtype, optional): Float dtype of the array.
+            Defaults to np.float64.
+        progress (bool, optional): Whether to display a progress bar.
+            Defaults to False.
+
+    Returns:
+        Stack: The stacked data.
+
+    """
+    key = f"/acquisition/timeseries/{protocol}/repetitions/repetition{rep}"
+
+    # Shapes first (dataset metadata only), to allocate the output
+    shapes, x_intervals, failures = {}, {}, {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        probes = executor.map(
+            probe, paths.values(), repeat(key), chunksize=PROBE_CHUNKSIZE
+        )
+        for id, (shape, x_interval, error) in zip(paths, probes, strict=True):
+            if error is not None:
+                failures[id] = error
+                continue
+            shapes[id] = shape
+            x_intervals[id] = x_interval
+
+    ids = list(shapes)
+    n_points = np.array([shapes[id][0] for id in ids], dtype=int)
+    n_sweeps = np.array([shapes[id][1] for id in ids], dtype=int)
+    out_shape = (len(ids), n_points.max(initial=0), n_sweeps.max(initial=0))
+    nbytes = int(np.prod(out_shape)) * np.dtype(dtype).itemsize
+
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    if fork and nbytes:
+        # Anonymous shared mapping, inherited by the forked workers
+        buffer = mmap.mmap(-1, nbytes)
+        out = np.frombuffer(buffer, dtype=dtype).reshape(out_shape)
+    else:
+        out = np.empty(out_shape, dtype=dtype)
+    out.fill(np.nan)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork") if fork else None,
+        initializer=attach if fork else None,
+        initargs=(out,) if fork else (),
+    ) as executor:
+        futures = {
+            executor.submit(fill, i, paths[id], f"{key}/data", dtype, fork): i
+            for i, id in enumerate(ids)
+        }
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            disable=not progress,
+            desc=f"Stacking {protocol} repetition {rep}",
+            colour="blue",
+            dynamic_ncols=True,
+        ):
+            i = futures[future]
+            try:
+                data, error = future.result()
+            except Exception:
+                data, error = None, traceback.format_exc()
+
+            if error is not None:
+                failures[ids[i]] = error.strip().splitlines()[-1]
+                n_points[i] = n_sweeps[i] = 0
+                out[i] = np.nan
+            elif data is not None:
+                out[i, : len(data), : data.shape[1]] = data
+
+    return Stack(
+        ids=pd.Index(ids, name="id"),
+        data=out,
+        n_points=n_points,
+        n_sweeps=n_sweeps,
+        x_interval=np.array([x_intervals[id] for id in ids]),
+        failures=failures,
+    )
+
+
+def probe(path: Path, key: str) -> tuple:
+    """Read the shape and sampling interval of a repetition, without its data.
+
+    Runs in the worker processes of stack.
+
+    Args:
+        path (Path): The path to the rCell.
+        key (str): The key of the repetition group.
+
+    Returns:
+        tuple: ((n_points, n_sweeps), x_interval, error), error is the
+            exception or None.
+
+    """
+    try:
+        with h5py.File(path, "r") as h5file:
+            shape = h5file[f"{key}/data"].shape
+            x_interval = get(h5file, f"{key}/x_interval")
+        return (shape[0], shape[1] if len(shape) > 1 else 1), x_interval, None
+    except Exception as err:
+        return None, None, repr(err)
+
+
+def attach(out: np.ndarray):
+    """Keep the shared output array in a worker process (pool initializer)."""
+    global _OUT
+    _OUT = out
+    return
+
+
+def fill(i: int, path: Path, key: str, dtype, shared: bool) -> tuple:
+    """Read the data of a cell into row i of the shared output array.
+
+    Runs in the worker processes of stack.
+
+    Args:
+        i (int): The row of the cell in the output.
+        path (Path): The path to the rCell.
+        key (str): The key of the data matrix.
+        dtype (np.dtype): Float dtype of the output.
+        shared (bool): Write to the shared output array, instead of
+            returning the data.
+
+    Returns:
+        tuple: (data, error). data is None when written to the shared array,
+            error is the traceback or None.
+
+    """
+    try:
+        data = np.asarray(get(path, key, dtype=dtype), dtype=dtype)
+        # Single sweeps are squeezed on load
+        data = data.reshape(len(data), -1)
+        if not shared:
+            return data, None
+        _OUT[i, : len(data), : data.shape[1]] = data  # type: ignore
+        return None, None
+    except Exception:
+        return None, traceback.format_exc()
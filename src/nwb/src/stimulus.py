@@ -1,9 +1,16 @@
-"""A module to add stimulus information to the rCell dictionary."""
+"""A module to add stimulus information to the rCell dictionary.
 
+Parsing the stimulus commands is done once per version of the stimulus CSV:
+the arrays of all stimuli (see COMPILED) are stored in a compiled library
+file next to the CSV, keyed by its hash, and read in one go by StimCsv.
+"""
+
+import hashlib
+import logging
+import os
 from dataclasses import asdict, dataclass
 from decimal import Decimal
 from functools import cache, cached_property
-from itertools import accumulate, pairwise
 from os import environ
 from pathlib import Path
 
@@ -22,6 +29,14 @@ global StimType
 
 STIM_FOLDER = Path(environ["STIMULUS_PATH"])
 
+# Bump when the parsing or the compiled arrays change, to recompile libraries
+LIBRARY_VERSION = 1
+
+# Errors of stimuli that cannot be parsed, left out of the library
+PARSE_ERRORS = (ValueError, ArithmeticError, IndexError, TypeError, OSError)
+
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class BaseStimulus:
@@ -45,6 +60,9 @@ class BaseStimulus:
     sweep_count: int
     command: str
 
+    # Cached properties stored in the compiled library (see StimCsv.library)
+    COMPILED = ()
+
     @property
     def info(self):
         """Return stimulus information as a dictionary."""
@@ -86,6 +104,53 @@ class BaseStimulus:
         """The maximum voltage value in the stimulus."""
         return self.v_matrix.max()
 
+    @cached_property
+    def _samples(self) -> dict[float, np.ndarray]:
+        """The sampled waveforms by x_interval (see sample)."""
+        return {}
+
+    def sample(self, x_interval: float, sweeps: list[int] | None = None) -> np.ndarray:
+        """Sample the command voltage of the sweeps every x_interval.
+
+        The samples are at 0, x_interval, ... until the duration (excluded),
+        on the time grid of the acquired data. Ramps are linearly interpolated.
+        The waveform is computed once per x_interval and cached on the stimulus
+        (read-only), StimCsv.get returns the same stimulus for every rCell.
+
+        Example:
+            >>> stim.sample(100, sweeps=[0, 2]).shape
+            (2, stim.duration // 100)
+
+        Args:
+            x_interval (float): The sampling interval in microseconds.
+            sweeps (list[int], optional): The sweeps to sample.
+                Defaults to all sweeps (sweep_count).
+
+        Returns:
+            np.ndarray: A 2D array with shape (n_sweeps, n_samples).
+
+        """
+        waveform = self._samples.get(x_interval)
+        if waveform is None:
+            waveform = self._sample(np.arange(0, self.duration, x_interval))
+            waveform.flags.writeable = False
+            self._samples[x_interval] = waveform
+
+        n_sweeps = self.sweep_count if sweeps is None else len(sweeps)
+        # Single sweep commands repeated sweep_count times
+        if len(waveform) == 1:
+            return np.broadcast_to(waveform, (n_sweeps, waveform.shape[1]))
+        return waveform if sweeps is None else waveform[sweeps]
+
+    def _sample(self, time: np.ndarray) -> np.ndarray:
+        """Interpolate the waveform of each sweep at the given times."""
+        return np.stack(
+            [
+                np.interp(time, t, v)
+                for t, v in zip(self.t_matrix, self.v_matrix, strict=True)
+            ]
+        )
+
     def validate(self):
         """Validate the command string and consistency with the name and sweep_count."""
         raise NotImplementedError
@@ -150,31 +215,53 @@ class APStimulus(BaseStimulus):
 
     The stimulus is stored in a .dat file with the same name as the command.
     These are text files with two columns: time and voltage.
+    The file is only read when the waveform is needed.
     """
 
-    def __init__(self, *args, **kwargs):
-        """Initialize the APStimulus object and load the .dat file."""
-        super().__init__(*args, **kwargs)
-        self.file_path = STIM_FOLDER / f"{self.command}.dat"
-        self.df = pd.read_csv(self.file_path, sep="  ", header=None)
-        self.df.columns = ["time", "voltage"]
-        # convert time from ms to us
-        self.df.time = (self.df.time * 1000).map(round)
+    COMPILED = ("time", "voltage")
+
+    @property
+    def file_path(self) -> Path:
+        """The path to the .dat file of the waveform."""
+        return STIM_FOLDER / f"{self.command}.dat"
+
+    @cached_property
+    def df(self) -> pd.DataFrame:
+        """The waveform, with time in microseconds and voltage."""
+        return pd.DataFrame({"time": self.time, "voltage": self.voltage})
+
+    @cached_property
+    def time(self) -> np.ndarray:
+        """The time values of the waveform in microseconds."""
+        return self._dat[0]
+
+    @cached_property
+    def voltage(self) -> np.ndarray:
+        """The voltage values of the waveform."""
+        return self._dat[1]
+
+    @cached_property
+    def _dat(self) -> tuple[np.ndarray, np.ndarray]:
+        """Read the (time, voltage) columns of the .dat file."""
+        columns = read_dat(self.file_path)
+        # convert time from ms to us, rounding half to even like round
+        time = np.rint(columns[:, 0] * 1000).astype(np.int64)
+        return time, np.ascontiguousarray(columns[:, 1])
 
     @cached_property
     def duration(self) -> int:
         """The duration of the action potential stimulus in microseconds."""
-        return self.df.time.iat[-1]
+        return self.time[-1]
 
     @cached_property
     def t_matrix(self) -> np.ndarray:
         """Matrix of time values for the action potential stimulus."""
-        return self.df.time.values.reshape(1, -1)
+        return self.time.reshape(1, -1)
 
     @cached_property
     def v_matrix(self) -> np.ndarray:
         """Matrix of voltage values for the action potential stimulus."""
-        return self.df.voltage.values.reshape(1, -1)
+        return self.voltage.reshape(1, -1)
 
     @cached_property
     def peaks(self) -> np.ndarray:
@@ -184,10 +271,46 @@ class APStimulus(BaseStimulus):
             np.ndarray: Array of middle points between peaks.
 
         """
-        peak_indices, _ = find_peaks(self.df.voltage.values, height=0, prominence=0.01)
+        peak_indices, _ = find_peaks(self.voltage, height=0, prominence=0.01)
         return np.round((peak_indices[1:] + peak_indices[:-1]) / 2).astype(int)
 
 
+def read_dat(path: Path) -> np.ndarray:
+    """Read the columns of a .dat waveform file, through a binary cache.
+
+    The parsed values are saved to a .npy file next to the text file, with
+    the same modification time. The cache is used while the modification
+    times match, so it is parsed again when the text file changes.
+
+    Args:
+        path (Path): The path to the .dat file.
+
+    Returns:
+        np.ndarray: A 2D array with shape (n_points, n_columns).
+
+    """
+    cache_path = path.with_suffix(".npy")
+    mtime_ns = path.stat().st_mtime_ns
+
+    try:
+        if cache_path.stat().st_mtime_ns == mtime_ns:
+            return np.load(cache_path)
+    except (OSError, ValueError, EOFError):
+        # No cache, or a truncated one
+        pass
+
+    columns = np.loadtxt(path, ndmin=2)
+    try:
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp.npy")
+        np.save(tmp_path, columns)
+        os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Read-only folder, parsed again next time
+        pass
+    return columns
+
+
 class BaseSegment:
     """A class to represent a segment of a Pulse stimulus command string.
 
@@ -247,6 +370,29 @@ class BaseSegment:
         """Return a string representation of the segment."""
         return ":".join(str(v) for v in (self.min, self.step, self.max))
 
+    def sweeps(self, n: int) -> np.ndarray:
+        """Get the values of the first n sweeps, as n steps of the iterator.
+
+        Args:
+            n (int): The number of sweeps.
+
+        Returns:
+            np.ndarray: A 2D array with shape (n, 2).
+
+        Raises:
+            ValueError: If the segment steps through less than n values.
+
+        """
+        if not self.step:
+            return np.broadcast_to(np.array([self.min, self.max]), (n, 2))
+
+        if n > self.n_sweeps:
+            raise ValueError(
+                f"Segment {self} has {max(self.n_sweeps, 0)} sweeps, expected {n}."
+            )
+        values = self.min + self.step * np.arange(n)
+        return np.stack([values, values], axis=-1)
+
 
 class PulseSegment:
     """A class to represent a segment of a Pulse stimulus command string.
@@ -320,6 +466,8 @@ class PulseStimulus(BaseStimulus):
 
     """
 
+    COMPILED = ("t_pairs", "v_pairs", "duration")
+
     @cached_property
     def repetition_count(self) -> int:
         """The number of times the protocol is repeated in a row."""
@@ -386,16 +534,15 @@ class PulseStimulus(BaseStimulus):
             np.ndarray: A 3D array with shape (sweep_count, n_segments, 2).
 
         """
-        matrix = []
-        t_gens = [iter(seg.t) for seg in self.segments]
-
-        for _ in range(self.sweep_count):
-            nxt = [next(t_gen)[0] for t_gen in t_gens]
-            lst = list(pairwise(accumulate(nxt, initial=0)))
-            lst[-1] = (lst[-1][0], self.duration)
-            matrix.append(lst)
+        # (sweep_count, n_segments) durations, segments follow each other
+        times = np.stack(
+            [seg.t.sweeps(self.sweep_count)[:, 0] for seg in self.segments], axis=1
+        )
+        ends = np.cumsum(times, axis=1)
+        starts = ends - times
+        ends[:, -1] = self.duration
 
-        return np.array(matrix)
+        return np.stack([starts, ends], axis=-1)
 
     @cached_property
     def v_pairs(self) -> np.ndarray:
@@ -405,14 +552,7 @@ class PulseStimulus(BaseStimulus):
             np.ndarray: A 3D array with shape (sweep_count, n_segments, 2).
 
         """
-        matrix = []
-        v_gens = [iter(seg.v) for seg in self.segments]
-
-        for _ in range(self.sweep_count):
-            nxt = [next(v_gen) for v_gen in v_gens]
-            matrix.append(nxt)
-
-        return np.array(matrix)
+        return np.stack([seg.v.sweeps(self.sweep_count) for seg in self.segments], 1)
 
     @cached_property
     def t_matrix(self) -> np.ndarray:
@@ -438,6 +578,23 @@ class PulseStimulus(BaseStimulus):
         """
         return self.v_pairs.reshape(self.sweep_count, -1)
 
+    def _sample(self, time: np.ndarray) -> np.ndarray:
+        """Sample all sweeps at once, segment by segment.
+
+        The sweeps are placed one after the other, so that the segment of
+        every sample is found with a single search.
+        """
+        offsets = self.duration * np.arange(self.sweep_count)[:, None, None]
+        t_pairs = (self.t_pairs + offsets).reshape(-1, 2)
+        times = (time + offsets[:, :, 0]).ravel()
+
+        ind = np.searchsorted(t_pairs[:, 1], times, side="right")
+        start, end = t_pairs[ind].T
+        v_start, v_end = self.v_pairs.reshape(-1, 2)[ind].T
+        samples = v_start + (v_end - v_start) * (times - start) / (end - start)
+
+        return samples.reshape(self.sweep_count, -1)
+
 
 StimType = BaseStimulus | VRestStimulus | PulseStimulus | APStimulus
 
@@ -449,6 +606,8 @@ class StimCsv:
     Attributes:
         path (Path): The path to the stimulus CSV file.
         data (pd.DataFrame): The stimulus data lazy-loaded from the CSV file.
+        library (dict[str, np.ndarray]): The compiled arrays of all stimuli,
+            by "stim_id/property" (see compile).
 
     """
 
@@ -495,6 +654,9 @@ class StimCsv:
     def get(self, stim_id: int) -> StimType:
         """Get the stimulus data for a given stimulus ID.
 
+        The arrays in the compiled library are set on the stimulus, so that
+        its command is not parsed again.
+
         Args:
             stim_id (int): The stimulus ID.
 
@@ -502,6 +664,16 @@ class StimCsv:
             StimType: The stimulus data as an instance of a stimulus class.
 
         """
+        stim = self._create(stim_id)
+        for name in stim.COMPILED:
+            val = self.library.get(f"{stim_id}/{name}")
+            if val is not None:
+                # Set the cached_property
+                stim.__dict__[name] = val.item() if val.ndim == 0 else val
+        return stim
+
+    def _create(self, stim_id: int) -> StimType:
+        """Create the stimulus object of a stimulus ID."""
         data = self.data.loc[stim_id].to_dict()
 
         if data["type"] == "Pulse":
@@ -513,6 +685,70 @@ class StimCsv:
 
         raise ValueError(f"Unknown stimulus: {data}")
 
+    @cached_property
+    def digest(self) -> str:
+        """Hash of the CSV file, the AP waveform files and LIBRARY_VERSION."""
+        sha = hashlib.sha256(f"v{LIBRARY_VERSION}:".encode())
+        sha.update(self.path.read_bytes())
+        for command in self.data.loc[self.data["name"] == "AP", "command"]:
+            dat = STIM_FOLDER / f"{command}.dat"
+            stat = (dat.stat().st_mtime_ns, dat.stat().st_size) if dat.is_file() else ()
+            sha.update(f"{command}:{stat}".encode())
+        return sha.hexdigest()[:16]
+
+    @property
+    def library_path(self) -> Path:
+        """The path to the compiled library of this version of the CSV."""
+        return self.path.with_name(f".{self.path.stem}-{self.digest}.npz")
+
+    @cached_property
+    def library(self) -> dict[str, np.ndarray]:
+        """The compiled arrays of all stimuli, read in one go.
+
+        The library is compiled and saved if it does not exist for the current
+        version of the CSV (the libraries of other versions are removed).
+        """
+        path = self.library_path
+        if path.is_file():
+            with np.load(path) as npz:
+                return {key: npz[key] for key in npz.files}
+
+        library = self.compile()
+        try:
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp.npz")
+            np.savez(tmp_path, **library)
+            os.replace(tmp_path, path)
+            for old in path.parent.glob(f".{self.path.stem}-*.npz"):
+                if old != path:
+                    old.unlink(missing_ok=True)
+        except OSError:
+            # Read-only folder, compiled again by the next process
+            pass
+        return library
+
+    def compile(self) -> dict[str, np.ndarray]:
+        """Compute the arrays of all stimuli (see COMPILED of the classes).
+
+        Stimuli that cannot be parsed are logged and left out, they fail
+        when used.
+
+        Returns:
+            dict[str, np.ndarray]: The arrays by "stim_id/property".
+
+        """
+        library = {}
+        for stim_id in self.data.index:
+            try:
+                stim = self._create(stim_id)
+                arrays = {name: getattr(stim, name) for name in stim.COMPILED}
+            except PARSE_ERRORS as err:
+                logger.warning(f"Stimulus {stim_id} left out of the library: {err!r}")
+                continue
+            library.update(
+                {f"{stim_id}/{name}": np.asarray(val) for name, val in arrays.items()}
+            )
+        return library
+
     def info(self, stim_ids: list[int]) -> dict:
         """Get the stimulus data for a list of stimulus IDs.
 
@@ -1,5 +1,8 @@
 """Utility functions for the project."""
 
+from contextlib import suppress
+
+
 def singleton(cls):
     """Create a singleton instance of a class.
 
@@ -18,3 +21,57 @@ def singleton(cls):
         return instances[cls]
 
     return get_instance
+
+
+class cached_slot:  # noqa: N801 - a decorator, named like functools.cached_property
+    """Like functools.cached_property, for classes with __slots__.
+
+    The value is computed on first access and stored in the slot named after
+    the property with a leading underscore, which the class must declare.
+    Assigning or deleting the property sets or clears the slot.
+
+    Example:
+        >>> class Part:
+        ...     __slots__ = ("_keys",)
+        ...
+        ...     @cached_slot
+        ...     def keys(self):
+        ...         return [0, 1]
+
+    """
+
+    def __init__(self, func):
+        """Wrap the function computing the value.
+
+        Args:
+            func (Callable): The getter of the property.
+
+        """
+        self.func = func
+        self.slot = f"_{func.__name__}"
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        """Store the value in the slot named after the attribute."""
+        self.slot = f"_{name}"
+
+    def __get__(self, obj, objtype=None):
+        """Get the cached value, computing it on first access."""
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            pass
+        value = self.func(obj)
+        setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        """Set the cached value."""
+        setattr(obj, self.slot, value)
+
+    def __delete__(self, obj):
+        """Clear the cached value, it is computed again on next access."""
+        with suppress(AttributeError):
+            delattr(obj, self.slot)
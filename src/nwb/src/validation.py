@@ -1,17 +1,22 @@
 """A module for checking the structure of the rCell dictionary before conversion to nwb.
 
-A single DictValidator class instance is created and used to validate the structure
-of the rCell dictionary.
+The reference structure (see reference) is compiled once into a tree of
+checker functions, with the regex patterns precompiled and the keys of every
+group resolved to their checker. Validation is then a walk of the rCell that
+keeps its state (the current protocol and repetition) in its arguments: it
+can run concurrently in threads and processes.
 """
 
 import re
+from collections.abc import Callable, Mapping
 from datetime import datetime
 from functools import cached_property
-from typing import Any
+from typing import Any, NamedTuple
 
 import numpy as np
 
 from . import unit
+from .layout import ScaledArray
 from .stimulus import StimCsv
 from .utils import singleton
 
@@ -27,7 +32,8 @@ class Validator:
 
     This class checks the structure of an rCell and inserts default values
     where necessary. The structure of the rCell dictionary is defined in the
-    'structure' method of the class. The checking/structure follows certain rules:
+    'reference' function of the module. The checking/structure follows certain
+    rules:
 
     - the keys of 'timeseries' and 'presentation' are variable but must be
         exactly the same and must match the protocol types
@@ -43,27 +49,21 @@ class Validator:
 
     - np.ndarray types can have additional keys:
         * '#dims' defines the number of dimensions of the array
-        * '#shape' is a tuple of callables to compare with the shape of the array
+        * '#shape' is a tuple of callables to compare with the shape of the array,
+            they get the Context of the array (see sweep_count and n_points)
         * '#element' defines the type of the elements of the array
             should be a numpy dtype
 
+    The reference is compiled on first use, the validator has no other state
+    and can be used from several threads.
+
     Possible improvements:
         Add a '#deprecated' key containing a string which is printed as a warning about
         the usage of that key and with instructions on what to use instead.
 
     """
 
-    def __init__(self):
-        """Initialize the Validator class."""
-        self._prot_types: list[str] | None = None
-
-        self.protocol: str
-        self.repetition: str
-        self.root: dict
-
-        return
-
-    def validate(self, root: dict):
+    def validate(self, root: Mapping):
         """Validate the structure of the rCell dictionary.
 
         This function first navigates the reference structure recursively to
@@ -76,225 +76,282 @@ class Validator:
         the expected types/shapes and other constraints.
 
         Args:
-            root: The rCell dictionary to validate.
-
-        """
-        self.root = root
-
-        for key in self.structure:
-            self.navigate_ref(self.root, self.structure, key)
-
-        self.check_protocol_types()
-
-        for key in self.root:
-            self.navigate(self.root, self.structure, key)
-
-        return
-
-    def check_protocol_types(self):
-        """Check match between 'stimulus/presentation' and 'acquisition/timeseries'.
+            root: The rCell dictionary to validate, or a view of an rCell file
+                (see view.H5View) to validate it in place.
 
         Raises:
-            ValidationError: If the keys are not the same.
+            ValidationError: If the rCell is not valid, with the path of the
+                invalid key.
 
         """
-        stim_protocols = set(self.root["stimulus"]["presentation"].keys())
-        acq_protocols = set(self.root["acquisition"]["timeseries"].keys())
-
-        if stim_protocols != acq_protocols:
-            raise ValidationError(
-                "The keys of 'stimulus/presentation' and 'acquisition/timeseries'"
-                + f" must be exactly the same. Got {stim_protocols=}, {acq_protocols=}."
-            )
+        fill, check = self.compiled
+        fill(root)
+        check_protocol_types(root)
+        check(root, Context(root))
         return
 
-    def navigate_ref(self, node: dict, ref: dict, ref_key: str):
-        """Navigate the reference structure recursively.
+    @cached_property
+    def compiled(self) -> tuple[Callable, Callable]:
+        """The reference structure compiled to (fill, check) functions."""
+        ref = reference()
+        return compile_fill(ref, {}), compile_group(ref, "", {})
 
-        Checks for missing keys and inserts default values where necessary.
 
-        Args:
-            node: The input dictionary.
-            ref: The reference dictionary.
-            ref_key: The key to navigate.
+class Context(NamedTuple):
+    """The position of a value in the rCell being validated.
 
-        Raises:
-            ValidationError: If a key is missing and not optional.
+    Attributes:
+        root (Mapping): The rCell.
+        protocol (str): The current protocol (key of timeseries).
+        repetition (str): The current repetition (key of repetitions).
 
-        """
-        # Key in reference dict but not in input dict
-        if ref_key not in node:
-            # Fill in default value if it exists
-            if "#default" in ref[ref_key]:
-                node[ref_key] = ref[ref_key]["#default"]
-
-            # Raise error if key is not optional
-            elif not ref[ref_key].get("#optional", False):
-                raise ValidationError(f"Key {ref_key} missing from dictionary.")
-
-        # Key is in both reference and input dict
-        # Any keys not starting with '#' should be navigated further
-        else:
-            node = node[ref_key]
-            ref = ref[ref_key]
-
-            for key in ref:
-                # Special keys are prefixed with '#'
-                if not key.startswith("#"):
-                    # recurse
-                    self.navigate_ref(node, ref, key)
+    """
 
-        return
+    root: Mapping
+    protocol: str = ""
+    repetition: str = ""
 
-    def navigate(self, node: dict, ref: dict, key: str):
-        """Navigate the input dictionary.
 
-        Checks their contents against the expected types/shapes and other constraints.
-        Also checks that all 1-to-n repetitions are present.
+def check_protocol_types(root: Mapping):
+    """Check match between 'stimulus/presentation' and 'acquisition/timeseries'.
 
-        While navigating, the repetition and protocol keys are stored to be used
-        later to check the n_points and sweep_count.
+    Args:
+        root: The rCell dictionary.
 
-        Args:
-            node: The input dictionary.
-            ref: The reference dictionary.
-            key: The key to navigate.
+    Raises:
+        ValidationError: If the keys are not the same.
 
-        Raises:
-            ValidationError: If a key is not valid or has the wrong type.
+    """
+    stim_protocols = set(root["stimulus"]["presentation"].keys())
+    acq_protocols = set(root["acquisition"]["timeseries"].keys())
 
-        """
-        if key not in ref:
-            raise ValidationError(f"Key {key} is not valid.")
+    if stim_protocols != acq_protocols:
+        raise ValidationError(
+            "The keys of 'stimulus/presentation' and 'acquisition/timeseries'"
+            + f" must be exactly the same. Got {stim_protocols=}, {acq_protocols=}."
+        )
+    return
 
-        node = node[key]
-        ref = ref[key]
 
-        if key == "repetitions":
-            self.check_repetitions(node)
+def compile_fill(ref: dict, memo: dict) -> Callable[[Mapping], None]:
+    """Compile the check of the missing keys of a group of the reference.
 
-        if "#type" in ref:
-            self.check_type(node, ref, key)
-        else:
-            for rkey in node:
-                # Store the repetition and protocol keys
-                # to be used later to check the n_points and sweep_count
-                if key == "repetitions":
-                    self.repetition = rkey
-                elif key == "timeseries":
-                    self.protocol = rkey
+    The compiled function inserts the default values of the missing keys
+    and raises an error for the missing keys that are not optional.
+    It recurses into the keys present that have nested keys.
 
-                self.navigate(node, ref, rkey)
+    Args:
+        ref: The reference dictionary of the group.
+        memo: Compiled functions by id(ref), shared references
+            (protocols, repetitions) are compiled once.
 
+    Returns:
+        Callable[[Mapping], None]: The function filling a group of the rCell.
+
+    """
+    # (key, has default, default), in reference order
+    missing = []
+    nested = {}
+
+    for key, sub in ref.items():
+        if key.startswith("#"):
+            continue
+        if "#default" in sub:
+            missing.append((key, True, sub["#default"]))
+        elif not sub.get("#optional", False):
+            missing.append((key, False, None))
+        if any(not k.startswith("#") for k in sub):
+            if id(sub) not in memo:
+                memo[id(sub)] = compile_fill(sub, memo)
+            nested[key] = memo[id(sub)]
+
+    def fill(node: Mapping):
+        for key, has_default, default in missing:
+            if key not in node:
+                if not has_default:
+                    raise ValidationError(
+                        f"Key {key} missing from dictionary.", f"/{key}"
+                    )
+                node[key] = default  # type: ignore
+
+        # Iterate over the smaller of the two (e.g. the 999 repetitions)
+        keys = nested if len(nested) < len(node) else node
+        for key in keys:
+            if key in nested and key in node:
+                try:
+                    nested[key](node[key])
+                except ValidationError as err:
+                    err.path = f"/{key}{err.path}"
+                    raise
         return
 
-    def check_repetitions(self, node: dict):
-        """Check that all 1-to-n repetitions are present.
+    return fill
 
-        Args:
-            node: The input dictionary.
 
-        """
-        rep_ids = sorted(int(rep[10:]) for rep in node)
+def compile_group(ref: dict, key: str, memo: dict) -> Callable[[Any, Context], None]:
+    """Compile the check of a group of the rCell against the reference.
 
-        if any(i != ri for i, ri in enumerate(rep_ids, start=1)):
+    Args:
+        ref: The reference dictionary of the group.
+        key: The key of the group.
+        memo: Compiled checkers by (id(ref), key), shared references
+            (protocols, repetitions) are compiled once.
+
+    Returns:
+        Callable[[Any, Context], None]: The function checking a group.
+
+    """
+    children: dict[str, Callable] = {}
+    for rkey, sub in ref.items():
+        if rkey.startswith("#"):
+            continue
+        memo_key = (id(sub), rkey)
+        if memo_key not in memo:
+            if "#type" in sub:
+                memo[memo_key] = compile_value(sub, rkey)
+            else:
+                memo[memo_key] = compile_group(sub, rkey, memo)
+        children[rkey] = memo[memo_key]
+
+    def check(node: Any, ctx: Context):
+        if not isinstance(node, Mapping):
             raise ValidationError(
-                "Invalid repetition IDs. Every 1-to-n repetitions must be present."
-                + f" Got {rep_ids=}."
+                f"Key {key} has the wrong type. Expected a group, got {type(node)}."
             )
 
+        if key == "repetitions":
+            check_repetitions(node)
+
+        for rkey in node:
+            checker = children.get(rkey)
+            if checker is None:
+                raise ValidationError(f"Key {rkey} is not valid.", f"/{rkey}")
+
+            # The protocol and repetition of the values, for their shapes
+            if key == "repetitions":
+                sub_ctx = ctx._replace(repetition=rkey)
+            elif key == "timeseries":
+                sub_ctx = ctx._replace(protocol=rkey)
+            else:
+                sub_ctx = ctx
+
+            try:
+                checker(node[rkey], sub_ctx)
+            except ValidationError as err:
+                err.path = f"/{rkey}{err.path}"
+                raise
         return
 
-    def check_type(self, node: Any, ref: Any, key: str):
-        """Check the type of the value against the reference.
+    return check
 
-        Args:
-            node: The value to check.
-            ref: The reference dictionary.
-            key: The key of the value.
 
-        Raises:
-            ValidationError: If the value has the wrong type
-                or does not match the pattern
-                or does not match the date pattern.
+def compile_value(ref: dict, key: str) -> Callable[[Any, Context], None]:
+    """Compile the check of a value against the reference.
 
-        """
-        if not isinstance(node, ref["#type"]):
+    Args:
+        ref: The reference dictionary of the value.
+        key: The key of the value.
+
+    Returns:
+        Callable[[Any, Context], None]: The function checking a value.
+
+    Raises:
+        ValidationError: If the value has the wrong type
+            or does not match the pattern
+            or does not match the date pattern.
+
+    """
+    # Groups of an rCell file are mappings (see view.H5View)
+    expected = Mapping if ref["#type"] is dict else ref["#type"]
+    match = re.compile(ref["#pattern"]).match if "#pattern" in ref else None
+    date_pattern = ref.get("#date_pattern")
+    check_array = compile_array(ref, key)
+
+    def check(node: Any, ctx: Context):
+        if not isinstance(node, expected):
             raise ValidationError(
                 f"Key {key} has the wrong type."
                 + f" Expected {ref['#type']}, got {type(node)}."
             )
 
-        if isinstance(node, np.ndarray):
-            self.check_array(node, ref, key)
+        if isinstance(node, np.ndarray | ScaledArray):
+            check_array(node, ctx)
+            return
+
+        if match is not None and not match(node):
+            raise ValidationError(
+                f"Value of {key} ({node}) does not match"
+                + f" the pattern {ref['#pattern']}."
+            )
 
-        else:
-            if "#pattern" in ref and not re.match(ref["#pattern"], node):
+        if date_pattern is not None:
+            try:
+                datetime.strptime(node, date_pattern)
+            except ValueError as err:
                 raise ValidationError(
                     f"Value of {key} ({node}) does not match"
-                    + f" the pattern {ref['#pattern']}."
-                )
+                    + f" the date pattern {date_pattern}."
+                ) from err
+        return
 
-            if "#date_pattern" in ref:
-                date_pattern = ref["#date_pattern"]
-                try:
-                    datetime.strptime(node, date_pattern)
-                except ValueError as err:
-                    raise ValidationError(
-                        f"Value of {key} ({node}) does not match"
-                        + f" the date pattern {date_pattern}."
-                    ) from err
+    return check
 
-        return
 
-    def check_array(self, node: np.ndarray, ref: dict, key: str):
-        """Check the type, shape, and element type of the array against the reference.
+def compile_array(ref: dict, key: str) -> Callable[[Any, Context], None]:
+    """Compile the check of the shape and elements of an array.
 
-        Args:
-            node: The array to check.
-            ref: The reference dictionary.
-            key: The key of the array.
+    Scaled integer arrays are checked with the dtype of their decoded values.
 
-        Raises:
-            ValidationError: If the array has the wrong number of dimensions
-                or the wrong shape or the wrong element type
-                or the elements do not match the pattern
-                or the elements do not match the date pattern.
+    Args:
+        ref: The reference dictionary of the array.
+        key: The key of the array.
 
-        """
-        if "#dims" in ref and len(node.shape) != ref["#dims"]:
+    Returns:
+        Callable[[Any, Context], None]: The function checking an array.
+
+    Raises:
+        ValidationError: If the array has the wrong number of dimensions
+            or the wrong shape or the wrong element type
+            or the elements do not match the pattern
+            or the elements do not match the date pattern.
+
+    """
+    dims = ref.get("#dims")
+    shape_of = ref.get("#shape")
+    element = ref.get("#element")
+    match = re.compile(ref["#pattern"]).match if "#pattern" in ref else None
+    date_pattern = ref.get("#date_pattern")
+
+    def check(node: np.ndarray | ScaledArray, ctx: Context):
+        if dims is not None and len(node.shape) != dims:
             raise ValidationError(
                 f"Key {key} has the wrong number of dimensions."
-                + f" Expected {ref['#dims']}, got {len(node.shape)}."
+                + f" Expected {dims}, got {len(node.shape)}."
             )
 
-        if "#shape" in ref:
-            # Note: ref["#shape"] is a tuple of callables
-            # since the shape of the array is not known in advance
-            # We need to call the functions to get the expected shape
-            shape = tuple(sh() for sh in ref["#shape"])
+        if shape_of is not None:
+            # The shape of the array is not known in advance, it is computed
+            # from the rCell (see sweep_count and n_points)
+            shape = tuple(sh(ctx) for sh in shape_of)
             if shape != node.shape:
                 raise ValidationError(
                     f"Key {key} has the wrong shape."
                     + f" Expected {shape}, got {node.shape}."
                 )
 
-        if "#element" in ref and not np.issubdtype(node.dtype, ref["#element"]):
+        if element is not None and not np.issubdtype(node.dtype, element):
             raise ValidationError(
                 f"Array {key} has the wrong element type."
-                + f" Expected {ref['#element']}, got {node.dtype}."
+                + f" Expected {element}, got {node.dtype}."
             )
 
-        if "#pattern" in ref and not all(
-            re.match(ref["#pattern"], val) for val in node.flat
-        ):
+        if match is not None and not all(match(val) for val in node.flat):
             raise ValidationError(
                 f"Array {key} has elements that do not match"
                 + f" the pattern {ref['#pattern']}."
             )
 
-        if "#date_pattern" in ref:
-            date_pattern = ref["#date_pattern"]
+        if date_pattern is not None:
             for val in node.flat:
                 try:
                     datetime.strptime(val, date_pattern)
@@ -303,399 +360,430 @@ class Validator:
                         f"Array {key} has element ({val}) that does not match"
                         + f" the date pattern {date_pattern}."
                     ) from err
-
         return
 
-    def n_points(self) -> int:
-        """Get the number of points for the current repetition and protocol."""
-        return self.root["acquisition"]["timeseries"][self.protocol]["repetitions"][
-            self.repetition
-        ]["n_points"][0]
+    return check
 
-    def sweep_count(self) -> int:
-        """Get the number of sweeps for the current protocol."""
-        return self.root["stimulus"]["presentation"][self.protocol]["sweep_count"]
 
-    @cached_property
-    def structure(self) -> dict:
-        """Initialization of the reference structure."""
-        sweep_count = self.sweep_count
-        n_points = self.n_points
+def check_repetitions(node: Mapping):
+    """Check that all 1-to-n repetitions are present.
+
+    Args:
+        node: The repetitions dictionary.
+
+    Raises:
+        ValidationError: If a repetition is missing.
+
+    """
+    rep_ids = sorted(int(rep[10:]) for rep in node)
+
+    if any(i != ri for i, ri in enumerate(rep_ids, start=1)):
+        raise ValidationError(
+            "Invalid repetition IDs. Every 1-to-n repetitions must be present."
+            + f" Got {rep_ids=}."
+        )
+
+    return
+
+
+def n_points(ctx: Context) -> int:
+    """Get the number of points for the repetition and protocol of the context."""
+    return ctx.root["acquisition"]["timeseries"][ctx.protocol]["repetitions"][
+        ctx.repetition
+    ]["n_points"][0]
 
-        protocol_types = STIMCSV.data["name"].unique().tolist()
 
-        repetition = {
+def sweep_count(ctx: Context) -> int:
+    """Get the number of sweeps for the protocol of the context."""
+    return ctx.root["stimulus"]["presentation"][ctx.protocol]["sweep_count"]
+
+
+def reference() -> dict:
+    """Get the reference structure of the rCell dictionary."""
+    protocol_types = STIMCSV.data["name"].unique().tolist()
+
+    repetition = {
+        "#optional": True,
+        "amp": {
             "#optional": True,
-            "amp": {
-                "#optional": True,
-                "#type": dict,
-            },
-            "pharmacology": {
-                "#optional": True,
-                "#type": dict,
+            "#type": dict,
+        },
+        "pharmacology": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "capacitance_fast": {
+            "#optional": True,
+            "#type": np.ndarray,
+            "#element": np.floating,
+            "#unit": unit.picoFarad,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "capacitance_slow": {
+            "#optional": True,
+            "#type": np.ndarray,
+            "#element": np.floating,
+            "#unit": unit.picoFarad,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "data": {
+            "#type": np.ndarray | ScaledArray,
+            "#element": np.floating,
+            "#unit": unit.nanoAmpere,
+            "#dims": 2,
+            "#shape": [n_points, sweep_count],
+        },
+        "head_temp": {
+            "#default": np.nan,
+            "#type": float,
+        },
+        "n_points": {
+            "#type": np.ndarray,
+            "#element": np.integer,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "r_membrane": {
+            "#optional": True,
+            "#type": np.ndarray,
+            "#element": np.floating,
+            "#unit": unit.MegaOhm,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "r_series": {
+            "#optional": True,
+            "#type": np.ndarray,
+            "#element": np.floating,
+            "#unit": unit.MegaOhm,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "seal": {
+            "#optional": True,
+            "#type": np.ndarray,
+            "#element": np.floating,
+            "#unit": unit.MegaOhm,
+            "#dims": 1,
+        },
+        "time": {
+            "#optional": True,
+            "#description": "Time axis of the data for each sweep in microseconds",
+            "#type": np.ndarray,
+            "#element": np.integer,
+            "#unit": unit.microsecond,
+            "#dims": 1,
+            "#shape": [n_points],
+        },
+        "trace_times": {
+            "#optional": True,
+            "#description": "Starting time of each sweep from the beginning"
+            + "of the experiment in microseconds",
+            "#type": np.ndarray,
+            "#element": np.integer,
+            "#unit": unit.microsecond,
+            "#dims": 1,
+            "#shape": [sweep_count],
+        },
+        "v_offset": {
+            "#type": float,
+            "#default": np.nan,
+        },
+        "x_interval": {
+            "#description": "time between each point in microseconds",
+            "#type": int,
+        },
+        "x_start": {
+            "#optional": True,
+            "#description": "Start time of each sweep in microseconds",
+            "#type": np.ndarray,
+            "#element": np.integer,
+            "#unit": unit.microsecond,
+            "#shape": [sweep_count],
+        },
+    }
+
+    reps = {
+        "repetitions": {f"repetition{i}": repetition for i in range(1, 1000)},
+        "#optional": True,
+    }
+
+    timeseries = {k: reps for k in protocol_types}
+
+    acquisition = {
+        "images": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "timeseries": timeseries,
+    }
+
+    general = {
+        "code_info": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "heka": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "nanion": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "cell_id": {
+            "#type": int,
+            "#default": 0,
+        },
+        "cell_info": {
+            "cell_countpml": {
+                "#type": int | str,
+                "#default": "0k",
             },
-            "capacitance_fast": {
+            "chip_cols": {
                 "#optional": True,
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.picoFarad,
-                "#dims": 1,
-                "#shape": [sweep_count],
+                "#type": str,
+                "#default": "",
             },
-            "capacitance_slow": {
+            "culture_medium": {
                 "#optional": True,
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.picoFarad,
-                "#dims": 1,
-                "#shape": [sweep_count],
-            },
-            "data": {
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.nanoAmpere,
-                "#dims": 2,
-                "#shape": [n_points, sweep_count],
-            },
-            "head_temp": {
-                "#default": np.nan,
-                "#type": float,
+                "#type": str,
+                "#default": "",
             },
-            "n_points": {
-                "#type": np.ndarray,
-                "#element": np.integer,
-                "#dims": 1,
-                "#shape": [sweep_count],
+            "cell_image": {
+                "#type": str,
+                "#default": "",
             },
-            "r_membrane": {
-                "#optional": True,
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.MegaOhm,
-                "#dims": 1,
-                "#shape": [sweep_count],
+            "cell_stock_id": {
+                "#type": str,
+                "#default": "",
             },
-            "r_series": {
-                "#optional": True,
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.MegaOhm,
-                "#dims": 1,
-                "#shape": [sweep_count],
+            "cell_suspension_medium": {
+                "#type": str,
+                "#default": "",
             },
-            "seal": {
-                "#optional": True,
-                "#type": np.ndarray,
-                "#element": np.floating,
-                "#unit": unit.MegaOhm,
-                "#dims": 1,
+            "host_cell": {
+                "#type": str,
+                "#default": "",
             },
-            "time": {
-                "#optional": True,
-                "#description": "Time axis of the data for each sweep in microseconds",
-                "#type": np.ndarray,
-                "#element": np.integer,
-                "#unit": unit.microsecond,
-                "#dims": 1,
-                "#shape": [n_points],
-            },
-            "trace_times": {
-                "#optional": True,
-                "#description": "Starting time of each sweep from the beginning"
-                + "of the experiment in microseconds",
-                "#type": np.ndarray,
-                "#element": np.integer,
-                "#unit": unit.microsecond,
-                "#dims": 1,
-                "#shape": [sweep_count],
-            },
-            "v_offset": {
-                "#type": float,
-                "#default": np.nan,
+            "passage": {
+                "#type": str,
+                "#default": "",
             },
-            "x_interval": {
-                "#description": "time between each point in microseconds",
-                "#type": int,
+            "species": {
+                "#type": str,
             },
-            "x_start": {
-                "#optional": True,
-                "#description": "Start time of each sweep in microseconds",
-                "#type": np.ndarray,
-                "#element": np.integer,
-                "#unit": unit.microsecond,
-                "#shape": [sweep_count],
+        },
+        "channel_info": {
+            "host_cell": {
+                "#type": str,
+                "#default": "",
             },
-        }
-
-        reps = {
-            "repetitions": {f"repetition{i}": repetition for i in range(1, 1000)},
-            "#optional": True,
-        }
-
-        timeseries = {k: reps for k in protocol_types}
-
-        acquisition = {
-            "images": {
-                "#optional": True,
-                "#type": dict,
+            "ion_channel": {
+                "#type": str,
+                "#default": "",
             },
-            "timeseries": timeseries,
-        }
-
-        general = {
-            "code_info": {
-                "#optional": True,
-                "#type": dict,
+            "species": {
+                "#type": str,
+                "#default": "",
             },
-            "heka": {
-                "#optional": True,
-                "#type": dict,
+        },
+        "data_quality_notes": {
+            "#type": str,
+            "#default": "",
+        },
+        "drn": {
+            "#date_pattern": "%Y.%m.%d",
+            "#description": "Date of recording in yyyy.mm.dd format",
+            "#type": str,
+        },
+        "experiment": {
+            "comment": {
+                "#default": "",
+                "#type": str,
             },
-            "nanion": {
-                "#optional": True,
-                "#type": dict,
+            "date": {
+                "#date_pattern": "%Y.%m.%d",
+                "#description": "Date of experiment in yyyy.mm.dd format",
+                "#type": str,
             },
-            "cell_id": {
-                "#type": int,
-                "#default": 0,
-            },
-            "cell_info": {
-                "cell_countpml": {
-                    "#type": int | str,
-                    "#default": "0k",
-                },
-                "chip_cols": {
-                    "#optional": True,
-                    "#type": str,
-                    "#default": "",
-                },
-                "culture_medium": {
-                    "#optional": True,
-                    "#type": str,
-                    "#default": "",
-                },
-                "cell_image": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "cell_stock_id": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "cell_suspension_medium": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "host_cell": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "passage": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "species": {
-                    "#type": str,
-                },
-            },
-            "channel_info": {
-                "host_cell": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "ion_channel": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "species": {
-                    "#type": str,
-                    "#default": "",
-                },
-            },
-            "data_quality_notes": {
+            "doxycycline_conc": {
                 "#type": str,
                 "#default": "",
             },
-            "drn": {
-                "#date_pattern": "%Y.%m.%d",
-                "#description": "Date of recording in yyyy.mm.dd format",
-                "#type": str,
-            },
-            "experiment": {
-                "comment": {
-                    "#default": "",
-                    "#type": str,
-                },
-                "date": {
-                    "#date_pattern": "%Y.%m.%d",
-                    "#description": "Date of experiment in yyyy.mm.dd format",
-                    "#type": str,
-                },
-                "doxycycline_conc": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "ec_id": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "ec_solution": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "ic_id": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "ic_solution": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "induction": {
-                    "#type": int | str,
-                    "#default": 24,
-                },
-                "induction_medium": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "manufacturer": {
-                    "#default": "",
-                    "#type": str,
-                },
-                "model_name": {
-                    "#default": "",
-                    "#type": str,
-                },
-                "nanioncsv_log": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "project_id": {
-                    "#type": str,
-                    "#default": "P0013",
-                },
-                "project_name": {
-                    "#type": str,
-                    "#default": "Channelome",
-                },
-                "se_id": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "se_solution": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "temp": {
-                    "#type": str,
-                    "#default": "rt",
-                },
-                "time": {
-                    "#date_pattern": "%H:%M:%S",
-                    "#description": "Time of experiment in HH:MM:SS format",
-                    "#type": str,
-                },
-                "total_cells": {
-                    "#type": float,
-                    "#default": np.nan,
-                },
-                "trypsin_concentration": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "trypsinization_time": {
-                    "#type": int,
-                    "#default": 60,
-                },
+            "ec_id": {
+                "#type": str,
+                "#default": "",
             },
-            "experimenter": {
-                "experimenter": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "user_email": {
-                    "#type": str,
-                    "#default": "",
-                },
-                "user_initials": {
-                    "#type": str,
-                    "#default": "",
-                },
+            "ec_solution": {
+                "#type": str,
+                "#default": "",
             },
-            "institution": {
+            "ic_id": {
                 "#type": str,
-                "#default": "Ecole polytechnique federale de Lausanne (EPFL)",
+                "#default": "",
             },
-            "lab": {
+            "ic_solution": {
                 "#type": str,
-                "#default": "Blue Brain Project (BBP)",
+                "#default": "",
             },
-            "session_id": {
+            "induction": {
                 "#type": int | str,
-                "#default": 0,
+                "#default": 24,
             },
-        }
-
-        stim_dict = {
-            "#optional": True,
-            "command": {
+            "induction_medium": {
                 "#type": str,
                 "#default": "",
             },
-            "stim_id": {
-                "#type": int,
+            "manufacturer": {
+                "#default": "",
+                "#type": str,
             },
-            "sweep_count": {
-                "#type": int,
+            "model_name": {
+                "#default": "",
+                "#type": str,
             },
-            "sweep_interval": {
-                "#type": int,
-                "#default": 0,
+            "nanioncsv_log": {
+                "#type": str,
+                "#default": "",
+            },
+            "project_id": {
+                "#type": str,
+                "#default": "P0013",
             },
-            "type": {
+            "project_name": {
+                "#type": str,
+                "#default": "Channelome",
+            },
+            "se_id": {
                 "#type": str,
                 "#default": "",
             },
-        }
-
-        stimulus = {"presentation": {k: stim_dict for k in protocol_types}}
-
-        return {
-            "analysis": {
-                "#optional": True,
-                "#type": dict,
+            "se_solution": {
+                "#type": str,
+                "#default": "",
             },
-            "epochs": {
-                "#optional": True,
-                "#type": dict,
+            "temp": {
+                "#type": str,
+                "#default": "rt",
             },
-            "data_release": {
-                "#date_pattern": "%Y.%m",
-                "#description": "The date of data creation in yyyy.mm format",
+            "time": {
+                "#date_pattern": "%H:%M:%S",
+                "#description": "Time of experiment in HH:MM:SS format",
                 "#type": str,
             },
-            "file_create_date": {
-                "#date_pattern": "%d-%b-%Y %H:%M:%S",
-                "#description": "The time of rCell creation in dd-mm-yyyy HH:MM:SS",
+            "total_cells": {
+                "#type": float,
+                "#default": np.nan,
+            },
+            "trypsin_concentration": {
                 "#type": str,
+                "#default": "",
+            },
+            "trypsinization_time": {
+                "#type": int,
+                "#default": 60,
             },
-            "identifier": {
-                "#description": "Name of the experiment usually",
+        },
+        "experimenter": {
+            "experimenter": {
                 "#type": str,
                 "#default": "",
             },
-            "session_description": {
-                "#optional": True,
+            "user_email": {
                 "#type": str,
+                "#default": "",
+            },
+            "user_initials": {
+                "#type": str,
+                "#default": "",
             },
-            "acquisition": acquisition,
-            "general": general,
-            "stimulus": stimulus,
-        }
+        },
+        "institution": {
+            "#type": str,
+            "#default": "Ecole polytechnique federale de Lausanne (EPFL)",
+        },
+        "lab": {
+            "#type": str,
+            "#default": "Blue Brain Project (BBP)",
+        },
+        "session_id": {
+            "#type": int | str,
+            "#default": 0,
+        },
+    }
+
+    stim_dict = {
+        "#optional": True,
+        "command": {
+            "#type": str,
+            "#default": "",
+        },
+        "stim_id": {
+            "#type": int,
+        },
+        "sweep_count": {
+            "#type": int,
+        },
+        "sweep_interval": {
+            "#type": int,
+            "#default": 0,
+        },
+        "type": {
+            "#type": str,
+            "#default": "",
+        },
+    }
+
+    stimulus = {"presentation": {k: stim_dict for k in protocol_types}}
+
+    return {
+        "analysis": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "epochs": {
+            "#optional": True,
+            "#type": dict,
+        },
+        "data_release": {
+            "#date_pattern": "%Y.%m",
+            "#description": "The date of data creation in yyyy.mm format",
+            "#type": str,
+        },
+        "file_create_date": {
+            "#date_pattern": "%d-%b-%Y %H:%M:%S",
+            "#description": "The time of rCell creation in dd-mm-yyyy HH:MM:SS",
+            "#type": str,
+        },
+        "identifier": {
+            "#description": "Name of the experiment usually",
+            "#type": str,
+            "#default": "",
+        },
+        "session_description": {
+            "#optional": True,
+            "#type": str,
+        },
+        "acquisition": acquisition,
+        "general": general,
+        "stimulus": stimulus,
+    }
 
 
 class ValidationError(Exception):
-    """An exception raised when a validation error occurs."""
+    """An exception raised when a validation error occurs.
+
+    Attributes:
+        path (str): The path of the invalid key in the rCell, e.g.
+            "/general/drn". Empty if the error is not about a single key.
 
-    pass
+    """
+
+    def __init__(self, message: str, path: str = ""):
+        """Initialize the error with its message and path."""
+        super().__init__(message)
+        self.path = path
+        return
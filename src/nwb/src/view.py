@@ -0,0 +1,249 @@
+"""A lazy mapping view of an rCell file, to validate it in place.
+
+Validating a converted rCell used to mean loading it and saving it again:
+every data matrix was decompressed, compressed and rewritten. The H5View
+presents an open HDF5 group as the nested dictionary load would return,
+without reading anything up front:
+
+    - subgroups are views,
+    - small datasets and attributes are read when accessed,
+    - large numeric datasets are stand-ins with their shape and dtype,
+      their payload is never read,
+    - setting a key writes it to the file (the defaults of the validator),
+      or only to the view if it is read-only.
+
+    nwb.validate_file(path)  # checks the file, writes the missing defaults
+    nwb.validate_file(path, write=False)  # only checks the file
+"""
+
+from collections.abc import Iterator, MutableMapping
+
+import h5py
+import numpy as np
+
+from .codec import Codec
+from .io import H5Source, create_dataset, load_dataset, load_value, recurse_save
+from .layout import OFFSET_ATTR, SCALE_ATTR, ScaledArray, is_attr_scalar
+from .validation import Validator
+
+VALIDATOR = Validator()
+
+# Numeric datasets larger than this are not read (see standin)
+STANDIN_BYTES = 64 * 1024
+
+
+class H5View(MutableMapping):
+    """A mutable mapping view of an HDF5 group, like a loaded dictionary.
+
+    Attributes:
+        group (h5py.Group): The viewed group.
+        decode (bool): Decode scaled integer datasets (see load).
+        scalar_attrs (bool): Write scalar values as attributes (see save).
+        writable (bool): Write the values set to the file. If False, they
+            are only set in the view.
+
+    """
+
+    def __init__(
+        self,
+        group: h5py.Group,
+        decode: bool = True,
+        scalar_attrs: bool = False,
+        chunks: str = "auto",
+        codecs: dict[str, str | Codec] | None = None,
+        writable: bool = True,
+    ):
+        """Initialize the view.
+
+        Args:
+            group (h5py.Group): The group to view.
+            decode (bool, optional): Decode scaled integer datasets.
+                Defaults to True.
+            scalar_attrs (bool, optional): Write scalar values as attributes
+                of the group. Defaults to False.
+            chunks (str, optional): Chunk layout of written data.
+                Defaults to "auto".
+            codecs (dict[str, str | Codec], optional): Codec policy of written
+                data. Defaults to codec.DEFAULT_POLICY.
+            writable (bool, optional): Write the values set to the file.
+                Defaults to True.
+
+        """
+        self.group = group
+        self.decode = decode
+        self.scalar_attrs = scalar_attrs
+        self.writable = writable
+        self._options = (chunks, codecs)
+        self._values: dict = {}
+        # Keys set in a read-only view
+        self._added: set[str] = set()
+        return
+
+    def __repr__(self) -> str:
+        """Return the path of the viewed group."""
+        return f"H5View({self.group.file.filename}:{self.group.name})"
+
+    def __getitem__(self, key: str):
+        """Get a value, reading it on first access.
+
+        Raises:
+            KeyError: If the key is not in the group.
+
+        """
+        if key in self._values:
+            return self._values[key]
+
+        if key in self.group.attrs:
+            val = load_value(self.group.attrs[key])
+        elif key in self.group:
+            obj = self.group[key]
+            if isinstance(obj, h5py.Group):
+                val = H5View(
+                    obj, self.decode, self.scalar_attrs, *self._options, self.writable
+                )
+            elif is_large(obj):
+                val = standin(obj, self.decode)
+            else:
+                val = load_dataset(obj, decode=self.decode)
+        else:
+            raise KeyError(key)
+
+        self._values[key] = val
+        return val
+
+    def __setitem__(self, key: str, val):
+        """Write a value to the group, replacing the existing one."""
+        if not self.writable:
+            self._values[key] = val
+            self._added.add(key)
+            return
+
+        if key in self:
+            del self[key]
+
+        chunks, codecs = self._options
+        if isinstance(val, dict):
+            path = self.group.name.split("/") if self.group.name != "/" else [""]
+            recurse_save(
+                self.group.file, path, {key: val}, chunks, codecs, self.scalar_attrs
+            )
+        elif self.scalar_attrs and is_attr_scalar(val):
+            self.group.attrs[key] = val
+        else:
+            create_dataset(self.group, key, val, chunks=chunks, codecs=codecs)
+        return
+
+    def __delitem__(self, key: str):
+        """Delete a value from the group.
+
+        Raises:
+            KeyError: If the key is not in the group.
+
+        """
+        self._values.pop(key, None)
+        if key in self._added:
+            self._added.discard(key)
+        elif not self.writable:
+            raise KeyError(f"{key} cannot be deleted from a read-only view.")
+        elif key in self.group.attrs:
+            del self.group.attrs[key]
+        elif key in self.group:
+            del self.group[key]
+        else:
+            raise KeyError(key)
+        return
+
+    def __contains__(self, key) -> bool:
+        """Whether the key is in the group, without reading it."""
+        return key in self.group or key in self.group.attrs or key in self._added
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys by name, like a loaded dictionary."""
+        if self.group.attrs or self._added:
+            keys = {*self.group.keys(), *self.group.attrs.keys(), *self._added}
+            return iter(sorted(keys))
+        return iter(self.group.keys())
+
+    def __len__(self) -> int:
+        """Return the number of keys."""
+        return len(self.group) + len(self.group.attrs) + len(self._added)
+
+
+def validate_file(
+    source: H5Source,
+    write: bool = True,
+    scalar_attrs: bool = False,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+):
+    """Validate an rCell file in place, writing the missing defaults.
+
+    Only the metadata and the small datasets are read, the data matrices
+    are checked from their shape and dtype.
+
+    Args:
+        source (str | Path | h5py.Group): Path to the file or an open handle
+            (writable, if defaults are missing).
+        write (bool, optional): Write the missing defaults. If False, the file
+            is opened read-only and only checked. Defaults to True.
+        scalar_attrs (bool, optional): Write the defaults as attributes.
+            Defaults to False.
+        chunks (str, optional): Chunk layout of written data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy of written data.
+            Defaults to codec.DEFAULT_POLICY.
+
+    Raises:
+        ValidationError: If the rCell is not valid.
+
+    """
+    if isinstance(source, h5py.Group):
+        VALIDATOR.validate(
+            H5View(source, False, scalar_attrs, chunks, codecs, writable=write)
+        )
+        return
+
+    with h5py.File(source, "r+" if write else "r") as h5file:
+        VALIDATOR.validate(
+            H5View(h5file, False, scalar_attrs, chunks, codecs, writable=write)
+        )
+    return
+
+
+def is_large(dataset: h5py.Dataset) -> bool:
+    """Check if a dataset is numeric and larger than STANDIN_BYTES."""
+    return dataset.dtype.kind in "biufc" and dataset.nbytes > STANDIN_BYTES
+
+
+def standin(dataset: h5py.Dataset, decode: bool = False) -> np.ndarray | ScaledArray:
+    """Get a stand-in of a dataset, without reading it.
+
+    The stand-in is a read-only broadcast view of a single zero, with the
+    shape and dtype load would return: it takes no memory and passes
+    validation like the loaded values.
+
+    Args:
+        dataset (h5py.Dataset): The dataset.
+        decode (bool, optional): Stand in for the decoded values of scaled
+            integer datasets, instead of a ScaledArray. Defaults to False.
+
+    Returns:
+        np.ndarray | ScaledArray: The stand-in.
+
+    """
+    shape = dataset.shape
+    # Singleton dimensions are removed on load (see load_value)
+    if len(shape) > 1 and 1 in shape:
+        shape = tuple(n for n in shape if n != 1)
+
+    if SCALE_ATTR in dataset.attrs and decode:
+        return np.broadcast_to(np.zeros((), np.float64), shape)
+
+    samples = np.broadcast_to(np.zeros((), dataset.dtype), shape)
+    if SCALE_ATTR in dataset.attrs:
+        return ScaledArray(
+            samples,
+            float(dataset.attrs[SCALE_ATTR]),
+            float(dataset.attrs.get(OFFSET_ATTR, 0.0)),
+        )
+    return samples
@@ -0,0 +1,559 @@
+"""Write an rCell file incrementally, one repetition at a time.
+
+nwb.save needs the whole rCell dictionary in memory, with the data matrices
+of every protocol. The Writer writes each repetition as soon as it is
+appended, so memory is bounded by one repetition:
+
+    with nwb.Writer(path) as writer:
+        writer.write_general(general)
+        for protocol, stim_id, rep in runs:
+            writer.append_repetition(protocol, rep, stim_id=stim_id)
+
+On close, the stimulus presentation of the protocols is completed from the
+stimulus CSV, the creation dates are set, and the rCell is validated. The
+validation works on a skeleton of everything written, where the large
+numeric arrays are zero-copy stand-ins with the same shape and dtype
+(the values of small arrays like n_points are checked). Defaults
+inserted by the validator are written to the file.
+
+The file is written next to its destination and only moved in place once
+closed without error: a failed conversion leaves no partial rCell.
+
+An existing rCell can be changed in place with update, which writes only
+what differs from the file (new repetitions, changed metadata...):
+
+    nwb.update(path, {"general": {"data_quality_notes": "noisy"}})
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from .codec import Codec
+from .io import load, load_dataset, load_value, recurse_save, same
+from .layout import OFFSET_ATTR, SCALE_ATTR, ScaledArray
+from .stimulus import StimCsv
+from .validation import Validator
+from .view import STANDIN_BYTES, standin
+
+STIMCSV = StimCsv()
+VALIDATOR = Validator()
+
+
+class Writer:
+    """A context manager writing an rCell file incrementally.
+
+    Attributes:
+        file_path (Path): The path to the rCell file.
+        overwrite (bool): Whether to replace an existing file.
+        validate (bool): Whether to validate the rCell on close.
+        chunks (str): Chunk layout of the acquisition data.
+        codecs (dict[str, str | Codec] | None): Codec policy.
+        scalar_attrs (bool): Store scalar leaves as attributes (see save).
+
+    Methods:
+        write: Write part of the rCell dictionary.
+        write_general: Write the general metadata.
+        write_stimulus: Set the stimulus presentation of a protocol.
+        append_repetition: Write the next repetition of a protocol.
+        close: Finalize, validate and move the file in place.
+        abort: Discard the file.
+
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path,
+        overwrite: bool = False,
+        validate: bool = True,
+        chunks: str = "auto",
+        codecs: dict[str, str | Codec] | None = None,
+        scalar_attrs: bool = False,
+    ):
+        """Initialize the writer (the file is created by open).
+
+        Args:
+            file_path (str | Path): The path to the rCell file.
+            overwrite (bool, optional): Replace the file if it exists.
+                Defaults to False.
+            validate (bool, optional): Validate the rCell on close.
+                Defaults to True.
+            chunks (str, optional): Chunk layout of the acquisition data.
+                Defaults to "auto".
+            codecs (dict[str, str | Codec], optional): Codec policy.
+                Defaults to codec.DEFAULT_POLICY.
+            scalar_attrs (bool, optional): Store scalar leaves as attributes
+                of their group. Defaults to False.
+
+        """
+        self.file_path = Path(file_path)
+        self.overwrite = overwrite
+        self.validate = validate
+        self.chunks = chunks
+        self.codecs = codecs
+        self.scalar_attrs = scalar_attrs
+
+        self._tmp_path = self.file_path.with_name(f"{self.file_path.name}.tmp")
+        self._h5file: h5py.File | None = None
+        self._skeleton: dict = {}
+        self._stimulus: dict[str, dict] = {}
+        self._stim_ids: dict[str, int] = {}
+        return
+
+    def __enter__(self) -> "Writer":
+        """Open the file."""
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        """Close the file, or discard it if an exception was raised."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return
+
+    def open(self) -> "Writer":
+        """Create the temporary file.
+
+        Returns:
+            Writer: The writer.
+
+        Raises:
+            FileExistsError: If the file exists and overwrite is False.
+
+        """
+        if self.file_path.exists() and not self.overwrite:
+            raise FileExistsError(f"{self.file_path} already exists.")
+
+        self._h5file = h5py.File(self._tmp_path, "w")
+        return self
+
+    def write(self, nest: dict):
+        """Write part of the rCell dictionary, merging with what was written.
+
+        The stimulus presentation is kept and written on close.
+
+        Args:
+            nest (dict): A nested dictionary from the root of the rCell.
+
+        """
+        nest = dict(nest)
+        if "stimulus" in nest:
+            stimulus = nest.pop("stimulus")
+            for protocol, stim in stimulus.get("presentation", {}).items():
+                self.write_stimulus(protocol, stim)
+
+        recurse_save(
+            self._file, [""], nest, self.chunks, self.codecs, self.scalar_attrs
+        )
+        merge(self._skeleton, skeleton(nest))
+        return
+
+    def write_general(self, general: dict):
+        """Write the general metadata.
+
+        Args:
+            general (dict): The "general" dictionary of the rCell.
+
+        """
+        self.write({"general": general})
+        return
+
+    def write_stimulus(self, protocol: str, stim: dict):
+        """Set the stimulus presentation of a protocol (written on close).
+
+        Args:
+            protocol (str): The protocol name.
+            stim (dict): The presentation dictionary (stim_id, sweep_count...).
+
+        """
+        self._stimulus[protocol] = dict(stim)
+        return
+
+    def append_repetition(
+        self, protocol: str, rep: dict, stim_id: int | None = None
+    ) -> int:
+        """Write the next repetition of a protocol.
+
+        Args:
+            protocol (str): The protocol name.
+            rep (dict): The repetition dictionary (data, n_points...).
+            stim_id (int, optional): The stimulus ID of the protocol, to fill
+                its stimulus presentation on close. Defaults to None.
+
+        Returns:
+            int: The repetition number.
+
+        """
+        timeseries = self._skeleton.get("acquisition", {}).get("timeseries", {})
+        num = len(timeseries.get(protocol, {}).get("repetitions", {})) + 1
+
+        reps = {f"repetition{num}": rep}
+        self.write({"acquisition": {"timeseries": {protocol: {"repetitions": reps}}}})
+
+        if stim_id is not None:
+            self._stim_ids[protocol] = stim_id
+        return num
+
+    def close(self):
+        """Finalize, validate and move the file in place.
+
+        The missing stimulus presentations are read from the stimulus CSV,
+        and the missing creation dates are set to now.
+
+        Raises:
+            ValidationError: If the rCell is not valid (the file is discarded).
+
+        """
+        try:
+            self._finalize()
+        except BaseException:
+            self.abort()
+            raise
+
+        self._file.close()
+        self._h5file = None
+        os.replace(self._tmp_path, self.file_path)
+        return
+
+    def abort(self):
+        """Discard the file."""
+        if self._h5file is not None:
+            self._h5file.close()
+            self._h5file = None
+        self._tmp_path.unlink(missing_ok=True)
+        return
+
+    @property
+    def _file(self) -> h5py.File:
+        """The open temporary file."""
+        if self._h5file is None:
+            raise ValueError("The writer is not open.")
+        return self._h5file
+
+    def _finalize(self):
+        """Write the stimulus and dates, then validate and write the defaults."""
+        missing = [p for p in self._stim_ids if p not in self._stimulus]
+        stimulus = {
+            **STIMCSV.info([self._stim_ids[p] for p in missing]),
+            **self._stimulus,
+        }
+
+        now = datetime.now()
+        header = {
+            "data_release": now.strftime("%Y.%m"),
+            "file_create_date": now.strftime("%d-%b-%Y %H:%M:%S"),
+        }
+        header = {k: v for k, v in header.items() if k not in self._skeleton}
+
+        self._stimulus = {}
+        self.write(header)
+        self._file.require_group("stimulus/presentation")
+        recurse_save(
+            self._file,
+            ["", "stimulus", "presentation"],
+            stimulus,
+            self.chunks,
+            self.codecs,
+            self.scalar_attrs,
+        )
+        merge(self._skeleton, {"stimulus": {"presentation": skeleton(stimulus)}})
+
+        if self.validate:
+            VALIDATOR.validate(self._skeleton)
+            write_missing(
+                self._file, self._skeleton, self.chunks, self.codecs, self.scalar_attrs
+            )
+        return
+
+
+def skeleton(nest: dict) -> dict:
+    """Copy a nested dictionary with stand-ins for its large numeric arrays.
+
+    The stand-ins are read-only broadcast views of a single zero, with the
+    shape and dtype of the arrays: they take no memory and pass validation.
+
+    Args:
+        nest (dict): The nested dictionary.
+
+    Returns:
+        dict: The skeleton of the dictionary.
+
+    """
+    out = {}
+    for key, val in nest.items():
+        if isinstance(val, dict):
+            out[key] = skeleton(val)
+        elif (
+            isinstance(val, np.ndarray)
+            and val.dtype.kind in "biufc"
+            and val.nbytes > STANDIN_BYTES
+        ):
+            out[key] = np.broadcast_to(np.zeros((), val.dtype), val.shape)
+        elif isinstance(val, ScaledArray) and val.samples.nbytes > STANDIN_BYTES:
+            samples = np.broadcast_to(np.zeros((), val.samples.dtype), val.shape)
+            out[key] = ScaledArray(samples, val.scale, val.offset)
+        else:
+            out[key] = val
+    return out
+
+
+def merge(dst: dict, src: dict):
+    """Recursively merge a nested dictionary into another, in place.
+
+    Args:
+        dst (dict): The dictionary to update.
+        src (dict): The dictionary to merge.
+
+    """
+    for key, val in src.items():
+        if isinstance(val, dict) and isinstance(dst.get(key), dict):
+            merge(dst[key], val)
+        else:
+            dst[key] = val
+    return
+
+
+def write_missing(
+    group: h5py.Group,
+    nest: dict,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
+):
+    """Write the values of a nested dictionary that are not in a group.
+
+    Used to write the defaults inserted by the validator.
+
+    Args:
+        group (h5py.Group): The group matching the dictionary.
+        nest (dict): The nested dictionary.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+        scalar_attrs (bool, optional): Store scalar leaves as attributes
+            of their group. Defaults to False.
+
+    """
+    missing = {}
+    for key, val in nest.items():
+        if key in group:
+            if isinstance(val, dict):
+                write_missing(group[key], val, chunks, codecs, scalar_attrs)
+        elif key not in group.attrs:
+            missing[key] = val
+
+    if missing:
+        path = group.name.split("/") if group.name != "/" else [""]
+        recurse_save(group.file, path, missing, chunks, codecs, scalar_attrs)
+    return
+
+
+def update(
+    file_path: str | Path,
+    nest: dict,
+    validate: bool = True,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
+) -> list[str]:
+    """Write the values of a partial rCell dictionary that differ from the file.
+
+    Values equal to those on file are not written, new and changed ones are
+    (re)written in place. Keys that are not in the dictionary are kept.
+
+    Only the affected part of the rCell is validated, before anything is
+    written: the general metadata and the protocols in the dictionary, with
+    stand-ins for the data matrices on file. Missing defaults are inserted.
+
+    The space of replaced datasets is not reclaimed by HDF5, use the repack
+    command to compact rCells that were updated many times.
+
+    Args:
+        file_path (str | Path): Path to the rCell file.
+        nest (dict): The partial rCell dictionary, from the root.
+        validate (bool, optional): Validate the affected part of the rCell.
+            Defaults to True.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+        scalar_attrs (bool, optional): Store new scalar leaves as attributes
+            of their group. Defaults to False.
+
+    Returns:
+        list[str]: The paths written.
+
+    Raises:
+        ValidationError: If the updated rCell is not valid (nothing is written).
+
+    """
+    with h5py.File(file_path, "r+") as h5file:
+        root = None
+        if validate:
+            root = affected(h5file, nest)
+            merge(root, skeleton(nest))
+            VALIDATOR.validate(root)
+
+        written = write_changes(h5file, nest, chunks, codecs, scalar_attrs)
+        if root is not None:
+            write_missing(h5file, root, chunks, codecs, scalar_attrs)
+
+    return written
+
+
+def affected(h5file: h5py.File, nest: dict) -> dict:
+    """Load the part of an rCell file affected by a partial dictionary.
+
+    Everything but the acquisition and stimulus is loaded, and only the
+    protocols in the partial dictionary. The data matrices are not read,
+    stand-ins with their shape and dtype are used (see skeleton).
+
+    Args:
+        h5file (h5py.File): The open rCell file.
+        nest (dict): The partial rCell dictionary.
+
+    Returns:
+        dict: The affected part of the rCell.
+
+    """
+    protocols = {
+        *nest.get("acquisition", {}).get("timeseries", {}),
+        *nest.get("stimulus", {}).get("presentation", {}),
+    }
+    include = [
+        key
+        for key in [*h5file, *h5file.attrs]
+        if key not in ("acquisition", "stimulus")
+    ]
+    for protocol in protocols:
+        include += [
+            f"acquisition/timeseries/{protocol}",
+            f"stimulus/presentation/{protocol}",
+        ]
+
+    data_key = "acquisition/timeseries/*/repetitions/*/data"
+    root = load(h5file, include=include, exclude=[data_key])
+    root.setdefault("acquisition", {}).setdefault("timeseries", {})
+    root.setdefault("stimulus", {}).setdefault("presentation", {})
+
+    for protocol, dic in root["acquisition"]["timeseries"].items():
+        reps = h5file[f"acquisition/timeseries/{protocol}"].get("repetitions", {})
+        for rep, group in reps.items():
+            dataset = group.get("data")
+            if isinstance(dataset, h5py.Dataset):
+                dic["repetitions"][rep]["data"] = standin(dataset)
+
+    return root
+
+
+def write_changes(
+    group: h5py.Group,
+    nest: dict,
+    chunks: str = "auto",
+    codecs: dict[str, str | Codec] | None = None,
+    scalar_attrs: bool = False,
+) -> list[str]:
+    """Write the values of a nested dictionary that differ from a group.
+
+    Args:
+        group (h5py.Group): The group matching the dictionary.
+        nest (dict): The nested dictionary.
+        chunks (str, optional): Chunk layout of the acquisition data.
+            Defaults to "auto".
+        codecs (dict[str, str | Codec], optional): Codec policy.
+            Defaults to codec.DEFAULT_POLICY.
+        scalar_attrs (bool, optional): Store new scalar leaves as attributes
+            of their group. Defaults to False.
+
+    Returns:
+        list[str]: The paths written.
+
+    """
+    written = []
+    changed = {}
+
+    for key, val in nest.items():
+        if isinstance(val, dict) and isinstance(group.get(key), h5py.Group):
+            written += write_changes(group[key], val, chunks, codecs, scalar_attrs)
+        elif not unchanged(group, key, val):
+            changed[key] = val
+
+    for key, val in changed.items():
+        if key in group.attrs:
+            if not isinstance(val, dict) and key not in group:
+                # Keep scalar leaves stored as attributes as such
+                group.attrs[key] = val
+                written.append(f"{group.name.rstrip('/')}/{key}")
+                continue
+            del group.attrs[key]
+        if key in group:
+            del group[key]
+
+        path = group.name.split("/") if group.name != "/" else [""]
+        recurse_save(group.file, path, {key: val}, chunks, codecs, scalar_attrs)
+        written.append(f"{group.name.rstrip('/')}/{key}")
+
+    return written
+
+
+def unchanged(group: h5py.Group, key: str, val) -> bool:
+    """Check if a leaf value is already stored in a group.
+
+    Args:
+        group (h5py.Group): The group.
+        key (str): The key of the value.
+        val (Any): The value of the rCell dictionary.
+
+    Returns:
+        bool: Whether the group stores the same value under the key.
+
+    """
+    if isinstance(val, dict):
+        return False
+
+    if key in group.attrs:
+        return equal(load_value(group.attrs[key]), val)
+
+    dataset = group.get(key)
+    if not isinstance(dataset, h5py.Dataset):
+        return False
+
+    if isinstance(val, ScaledArray):
+        return (
+            dataset.attrs.get(SCALE_ATTR) == val.scale
+            and dataset.attrs.get(OFFSET_ATTR, 0.0) == val.offset
+            and dataset.dtype == val.samples.dtype
+            and dataset.shape == val.shape
+            and np.array_equal(dataset[()], val.samples)
+        )
+
+    # Metadata first, the values are only read if the shapes match
+    if SCALE_ATTR in dataset.attrs or dataset.shape != np.shape(val):
+        return False
+    return equal(load_dataset(dataset), val)
+
+
+def equal(loaded, val) -> bool:
+    """Check if a loaded value equals a value of the rCell dictionary.
+
+    Args:
+        loaded (Any): A value returned by load_dataset.
+        val (Any): The value of the rCell dictionary.
+
+    Returns:
+        bool: Whether the value would be loaded identically.
+
+    """
+    if isinstance(val, bytes | str | np.generic | np.ndarray):
+        val = load_value(val)
+
+    # Strings arrays of different widths can be equal
+    if isinstance(val, np.ndarray) and val.dtype.kind == "U":
+        return isinstance(loaded, np.ndarray) and np.array_equal(loaded, val)
+
+    return same(loaded, val)
@@ -1,5 +1,6 @@
 """Module to create rCell dictionaries and nwb files from the data of an experiment."""
 
+from collections.abc import Iterable, Iterator
 from datetime import datetime
 
 import numpy as np
@@ -69,26 +70,30 @@ class RCell:
 
         report = ""
         if overwrite or not out_path.is_file():
-            counts, rcell_dict = self.create_dict()
-            nwb.save(
-                out_path,
-                rcell_dict,
-                overwrite=True,
-                validate=True,
-            )
+            # The runs are written as they are read, not kept in memory
+            with nwb.Writer(out_path, overwrite=True, validate=True) as writer:
+                counts, rcell_dict = self.create_dict(writer)
+                writer.write(rcell_dict)
             report = self.dict_report(rcell_dict, counts)
         return report
 
-    def create_dict(self) -> tuple[dict, dict]:
+    def create_dict(self, writer: nwb.Writer | None = None) -> tuple[dict, dict]:
         """Create the rCell dictionary.
 
+        Args:
+            writer (nwb.Writer, optional): Append the repetitions to this writer
+                instead of the dictionary, where they are left empty.
+                Defaults to None.
+
         Returns:
             dict: The rCell dictionary.
 
         """
         protocol_map = self.get_protocol_map()
         protocol_runs = self.get_protocol_runs(protocol_map)
-        counts, acquisition = self.group_protocol_runs(protocol_runs, protocol_map)
+        counts, acquisition = self.group_protocol_runs(
+            protocol_runs, protocol_map, writer
+        )
 
         if not acquisition:
             raise ValueError(
@@ -316,11 +321,11 @@ class RCell:
         # map the internal ids to the parsed protocol id
         return {id: protocol_ids[i] for i, id in enumerate(internal_ids)}
 
-    def get_protocol_runs(self, protocol_map: dict) -> list:
+    def get_protocol_runs(self, protocol_map: dict) -> Iterator[dict]:
         """Get the protocol runs for the rcell dictionary.
 
-        Returns:
-            list: A list of protocol runs.
+        Yields:
+            dict: The protocol runs, one at a time.
 
         Each run corresponds to the application of a protocol with a given number
         of sweeps. Runs corresponding to the same protocol will later be grouped
@@ -405,8 +410,6 @@ class RCell:
             sort=False,
         )
 
-        protocol_runs = []
-
         start = 2
         for _, group in meta_groups:
             md = {}
@@ -448,18 +451,23 @@ class RCell:
             #     "capacitance_slow": nwb.unit.picoFarad,
             # }
 
-            protocol_runs.append(run)
+            yield run
 
-        return protocol_runs
+        return
 
     def group_protocol_runs(
-        self, protocol_runs: list, protocol_map: dict
+        self,
+        protocol_runs: Iterable[dict],
+        protocol_map: dict,
+        writer: nwb.Writer | None = None,
     ) -> tuple[dict, dict]:
         """Group repeated applications of the same protocol under the same dictionary.
 
         Args:
-            protocol_runs (list): The list of protocol runs.
+            protocol_runs (Iterable[dict]): The protocol runs.
             protocol_map (dict): The protocol map.
+            writer (nwb.Writer, optional): Append the kept runs to this writer
+                instead of the repetitions dictionary. Defaults to None.
 
         Returns:
             dict: A dictionary of protocol ids to the number of repetitions.
@@ -518,6 +526,7 @@ class RCell:
 
         discarded_protocols = set()
         counts = dict()
+        rep_counts = dict()
 
         # Finally, group the runs by protocol name
         acquisition = {}
@@ -585,11 +594,12 @@ class RCell:
 
             if typ not in acquisition:
                 acquisition[typ] = {"repetitions": dict()}
+                rep_counts[typ] = 0
                 stim_ids.append(id)
 
             reps = acquisition[typ]["repetitions"]
 
-            rep_num = len(reps) + 1
+            rep_num = rep_counts[typ] + 1
             rep_name = f"repetition{rep_num}"
 
             if self.keep_reps and rep_num > self.keep_reps:
@@ -600,8 +610,12 @@ class RCell:
                 continue
 
             counts[id]["kept"].append(i)
+            rep_counts[typ] = rep_num
 
-            reps[rep_name] = run
+            if writer is None:
+                reps[rep_name] = run
+            else:
+                writer.append_repetition(typ, run, stim_id=id)
 
         return counts, acquisition
 
@@ -135,8 +135,17 @@ def protocol_generator(
 
 def get_protocol_data(protocol_path:Path, dataFileList:list, nSamples:int, nCells:int,
              leakData:int, I2DScale:list, recordedWellIDs:list,
-             nSweeps: int, nRepetitions: int):
-    data = np.zeros((nCells, nSamples, nRepetitions, nSweeps))
+             nSweeps: int, nRepetitions: int, compact: bool = False):
+    """Read the traces of a protocol for all cells.
+
+    If compact, the raw <i2 samples are kept as int16 (4x less memory than float64),
+    they must be multiplied by I2DScale[recordedWellIDs[cell_id]] to get the current.
+    """
+    if compact:
+        data = np.zeros((nCells, nSamples, nRepetitions, nSweeps), dtype=np.int16)
+        I2DScale = [1] * len(I2DScale)
+    else:
+        data = np.zeros((nCells, nSamples, nRepetitions, nSweeps))
     for sweep_id, cell_id, new_data, new_data_leak in protocol_generator(
             protocol_path=protocol_path,
             dataFileList=dataFileList,
@@ -10,7 +10,12 @@ import math
 import h5py
 import nwb
 
-def convert_to_nwb(path:Path, saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB_PATH")) / "rcell", overwrite=True):
+def convert_to_nwb(
+    path:Path,
+    saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB_PATH")) / "rcell",
+    overwrite=True,
+    compact=False
+):
     """Extract and save rcells from an syncroptach experiment, to save memory it is done in two steps,
     First save metadata and then add data protocol by protocol.
 
@@ -18,6 +23,9 @@ def convert_to_nwb(path:Path, saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB
         path (Path): path of experiment (raw_data/year/exp_name)
         saving_path (Path, optional): where the nwb will be saved. Defaults to Path(os.getenv("SYNCROPATCH_NWB_PATH")).
         overwrite (bool, optional): If replace rcell or not. Defaults to True.
+        compact (bool, optional): Store the int16 samples of the instrument with
+            their scale (nwb.ScaledArray) instead of float64 currents.
+            Defaults to False.
 
     Returns:
         rcell_path_list: list of path to rcells created.
@@ -108,7 +116,8 @@ def convert_to_nwb(path:Path, saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB
             I2DScale=I2DScale,
             recordedWellIDs=recordedWellIDs,
             nSweeps=nSweeps,
-            nRepetitions=nRepetitions
+            nRepetitions=nRepetitions,
+            compact=compact
         )
         #update nb_sweep in rcell stimulus for later validation
         if stim_type == 'Drugs':
@@ -179,10 +188,13 @@ def convert_to_nwb(path:Path, saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB
                         name='n_points',
                         data=n_points
                     )
-                    repetition.create_dataset(
-                        name='data',
-                        data=data[cell_id, :, rep_id, :]
-                    )
+                    rep_data = data[cell_id, :, rep_id, :]
+                    if compact:
+                        rep_data = nwb.ScaledArray(
+                            rep_data,
+                            scale=I2DScale[recordedWellIDs[cell_id]]
+                        )
+                    nwb.create_dataset(repetition, 'data', rep_data)
                     amp = repetition.create_group("amp")
                 compList = compound_info[cell_id][stim_type]['compList']
                 pharma_prot.create_dataset(name='compList', data=np.array(compList, dtype='object'))
@@ -227,8 +239,8 @@ def convert_to_nwb(path:Path, saving_path:Path = Path(os.getenv("SYNCROPATCH_NWB
     print(f"Starting nwb validation")
     for rcell_path in rcell_path_list:
         print(rcell_path)
-        rcell = nwb.load(rcell_path)
-        nwb.save(rcell_path, rcell, overwrite=True, validate=True)
+        # In place: only the metadata is read, missing defaults are written
+        nwb.validate_file(rcell_path)
     return rcell_path_list
 
 
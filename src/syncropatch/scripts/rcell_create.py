@@ -18,7 +18,7 @@ def main():
     year = "20" + exp_name[:2]
     path_exp = Path(os.getenv("SYNCROPATCH_RAW_DATA_PATH")) / year / exp_name
     print(f"inputs are [{path_exp}] and [{args.overwrite}]")
-    convert_to_nwb(path_exp, overwrite=args.overwrite)
+    convert_to_nwb(path_exp, overwrite=args.overwrite, compact=args.compact)
     return
 
 def parse_args():
@@ -32,6 +32,12 @@ def parse_args():
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "--compact",
+        help="Store int16 samples with a scale factor instead of float64 currents",
+        default=False,
+        action="store_true",
+    )
     parser.add_argument(
         "exp_name",
         type=str,
@@ -0,0 +1,113 @@
+"""Fixtures of the nwb tests: a stimulus folder, CellDB roots and rCells.
+
+The module reads its folders from environment variables when imported
+(see stimulus.py and db.py), so they point to a temporary folder that is
+set up before nwb is imported.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(tempfile.mkdtemp(prefix="nwb-tests-"))
+
+STIMULUS_CSV = """\
+ID,Name,Type,SweepInterVal,SweepCount,Command
+1,Activation,Pulse,1000,9,-80:0:-80:100;-80:10:0:50;-80:0:-80:100;
+2,VRest,Other,0,1,vrest
+3,AP,Other,0,1,ap1
+4,Ramp,Pulse,0,3,-80:0:-80:10;-80:0:40:20;-80:0:-80:10;
+"""
+
+(ROOT / "stimulus").mkdir()
+(ROOT / "stimulus" / "stimulus.csv").write_text(STIMULUS_CSV)
+(ROOT / "stimulus" / "ap1.dat").write_text(
+    "".join(f"{t / 10:.4f}  {v:.4f}\n" for t, v in enumerate(np.linspace(-80, 40, 50)))
+)
+
+os.environ["STIMULUS_PATH"] = str(ROOT / "stimulus")
+for machine in ["qpc", "igor", "syncropatch"]:
+    (ROOT / machine).mkdir()
+    os.environ[f"{machine.upper()}_NWB_PATH"] = str(ROOT / machine)
+os.environ.pop("CELLDB_CATALOG_DIR", None)
+
+import nwb  # noqa: E402
+from nwb.src.stimulus import StimCsv  # noqa: E402
+
+
+def repetition(n_sweeps: int, n_points: int, seed: int) -> dict:
+    """Create a repetition dictionary with random data."""
+    rng = np.random.default_rng(seed)
+    return {
+        "data": rng.normal(size=(n_points, n_sweeps)),
+        "head_temp": 21.5,
+        "n_points": np.full(n_sweeps, n_points, dtype=int),
+        "time": np.arange(0, n_points * 100, 100, dtype=np.uint32),
+        "x_interval": 100,
+        "v_offset": 1.0,
+        "capacitance_slow": rng.normal(size=n_sweeps),
+    }
+
+
+def cell(seed: int = 0) -> dict:
+    """Create a valid rCell dictionary, with the Activation and Ramp protocols."""
+    reps = {f"repetition{i}": repetition(9, 2500, seed + i) for i in (1, 2)}
+    return {
+        "data_release": "2024.01",
+        "file_create_date": "01-Jan-2024 10:00:00",
+        "acquisition": {
+            "timeseries": {
+                "Activation": {"repetitions": reps},
+                "Ramp": {"repetitions": {"repetition1": repetition(3, 400, seed)}},
+            }
+        },
+        "general": {
+            "cell_info": {"species": "human"},
+            "channel_info": {"ion_channel": "Nav1.5" if seed % 2 else "Kv1.1"},
+            "drn": "2024.01.01",
+            "experimenter": {},
+            "experiment": {"date": "2024.01.01", "time": "10:00:00"},
+        },
+        "stimulus": {"presentation": StimCsv().info([1, 4])},
+    }
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cleanup():
+    """Remove the temporary folder at the end of the session."""
+    yield
+    shutil.rmtree(ROOT, ignore_errors=True)
+
+
+@pytest.fixture
+def make_cell():
+    """Get the function creating rCell dictionaries (see cell)."""
+    return cell
+
+
+@pytest.fixture
+def qpc_root() -> Path:
+    """Get the QPC root of the CellDB, emptied after the test."""
+    yield ROOT / "qpc"
+    for path in (ROOT / "qpc").iterdir():
+        path.unlink()
+
+
+@pytest.fixture
+def rcell_paths(tmp_path) -> dict[str, Path]:
+    """Save three rCells in a temporary folder.
+
+    Returns:
+        dict[str, Path]: The path of each rCell ID.
+
+    """
+    paths = {}
+    for i in range(3):
+        id = f"qpc_{i:06d}_1"
+        paths[id] = tmp_path / f"{id}.nwb"
+        nwb.save(paths[id], cell(i), validate=True)
+    return paths
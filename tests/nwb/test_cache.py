@@ -0,0 +1,79 @@
+"""The process-wide LRU cache of decoded arrays."""
+
+import numpy as np
+import pytest
+
+import nwb
+from nwb.src.cache import ArrayCache
+
+
+@pytest.fixture
+def cache() -> ArrayCache:
+    """Get the emptied ArrayCache, restored to its budget after the test."""
+    cache = ArrayCache()
+    max_bytes = cache.max_bytes
+    cache.clear()
+    yield cache
+    cache.resize(max_bytes)
+    cache.clear()
+
+
+def array(value: float) -> np.ndarray:
+    """Create an array of 100 float64 (800 bytes)."""
+    return np.full(100, value)
+
+
+def test_least_recently_used_arrays_are_evicted(cache):
+    cache.resize(3 * 800)
+    for key in "abc":
+        cache.get(key, lambda key=key: array(ord(key)))
+    # "a" used again, "b" is now the least recently used
+    assert cache.get("a", lambda: array(0))[0] == ord("a")
+
+    cache.get("d", lambda: array(ord("d")))
+
+    assert [key in cache for key in "abcd"] == [True, False, True, True]
+    assert cache.info() == {
+        "hits": 1,
+        "misses": 4,
+        "items": 3,
+        "nbytes": 3 * 800,
+        "max_bytes": 3 * 800,
+    }
+
+    cache.resize(800)
+    assert len(cache) == 1
+    assert "d" in cache
+
+
+def test_cached_arrays_are_read_only(cache):
+    cached = cache.get("a", lambda: array(1))
+
+    assert not cached.flags.writeable
+    assert cache.get("a", lambda: array(2)) is cached
+
+
+def test_large_and_mapped_arrays_are_not_cached(cache, tmp_path):
+    cache.resize(800)
+    large = cache.get("large", lambda: np.zeros(101))
+
+    np.save(tmp_path / "mapped.npy", array(1))
+    mapped = cache.get(
+        "mapped", lambda: np.load(tmp_path / "mapped.npy", mmap_mode="r")
+    )
+
+    assert isinstance(mapped, np.memmap)
+    assert large.flags.writeable
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_repetitions_share_cached_data_across_rcells(cache, tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True, chunks="sweep")
+
+    first = nwb.RCell(path).protocol("Ramp").repetition(1).view
+    second = nwb.RCell(path).protocol("Ramp").repetition(1).view
+
+    assert np.shares_memory(first.to_numpy(), second.to_numpy())
+    assert cache.info()["hits"] == 1
@@ -0,0 +1,91 @@
+"""Incremental refresh of the rCell catalog and its use by CellDB."""
+
+import shutil
+
+import pandas as pd
+import pytest
+
+import nwb
+from nwb.src.catalog import Catalog
+
+
+@pytest.fixture
+def catalog(tmp_path, rcell_paths) -> Catalog:
+    """Get an empty catalog of the rCells of rcell_paths."""
+    return Catalog(tmp_path / "catalog" / "qpc.sqlite", tmp_path, "qpc")
+
+
+def counts(read=0, failed=0, removed=0, total=3) -> dict[str, int]:
+    """Get the counts returned by Catalog.refresh."""
+    return {"read": read, "failed": failed, "removed": removed, "total": total}
+
+
+def test_refresh_reads_only_changed_files(catalog, rcell_paths, make_cell):
+    assert not catalog.exists()
+    assert catalog.refresh(workers=1) == counts(read=3)
+    assert catalog.exists()
+    assert catalog.ids() == list(rcell_paths)
+
+    # Nothing changed
+    assert catalog.refresh(workers=1) == counts()
+
+    # Modified (Kv1.1 to Nav1.5), removed and new files
+    id, gone, new = "qpc_000000_1", "qpc_000001_1", "qpc_000003_1"
+    nwb.save(rcell_paths[id], make_cell(1), validate=True, overwrite=True)
+    rcell_paths[gone].unlink()
+    shutil.copy(rcell_paths["qpc_000002_1"], catalog.root / f"{new}.nwb")
+
+    assert catalog.refresh(workers=1) == counts(read=2, removed=1)
+    assert catalog.ids() == [id, "qpc_000002_1", new]
+    assert catalog.get_path(gone) is None
+    assert catalog.get_path(new) == catalog.root / f"{new}.nwb"
+
+    columns = catalog.meta_columns()
+    assert columns[("channel_info", "ion_channel")] == ["Nav1.5", "Kv1.1", "Kv1.1"]
+    assert columns[("id", "")] == catalog.ids()
+
+
+def test_refresh_in_parallel_matches_serial(tmp_path, catalog):
+    parallel = Catalog(tmp_path / "catalog" / "parallel.sqlite", tmp_path, "qpc")
+
+    assert parallel.refresh(workers=2, chunksize=1) == catalog.refresh(workers=1)
+    assert parallel.meta_columns() == catalog.meta_columns()
+    # The protocols are in the order the files were read
+    protocols = [
+        c.protocols().sort_values(["id", "protocol"], ignore_index=True)
+        for c in (parallel, catalog)
+    ]
+    pd.testing.assert_frame_equal(*protocols)
+
+
+def test_refresh_reports_unreadable_files(catalog):
+    (catalog.root / "qpc_000009_1.nwb").write_bytes(b"not an HDF5 file")
+
+    with pytest.warns(UserWarning, match="Could not read 1 qpc rCells"):
+        assert catalog.refresh(workers=1) == counts(read=3, failed=1, total=4)
+
+    assert "qpc_000009_1" not in catalog.ids()
+    assert list(catalog.failures) == [str(catalog.root / "qpc_000009_1.nwb")]
+
+
+def test_celldb_refreshes_once_per_process(qpc_root, rcell_paths):
+    db = nwb.CellDB()
+    for id, path in rcell_paths.items():
+        shutil.copy(path, qpc_root / f"{id}.nwb")
+    db._refreshed.clear()
+
+    assert db.list("qpc") == list(rcell_paths)
+
+    # A file added by another process is listed by the next process only
+    new = "qpc_000003_1"
+    shutil.copy(rcell_paths["qpc_000000_1"], qpc_root / f"{new}.nwb")
+    assert new not in db.list("qpc")
+    db._refreshed.clear()
+    assert new in db.list("qpc")
+    assert db.meta_df("qpc").index.tolist() == [*rcell_paths, new]
+
+    # A deleted file falls back to the naming rules
+    (qpc_root / f"{new}.nwb").unlink()
+    assert db.get_path(new) == db.qpc_path(new)
+    db._refreshed.clear()
+    assert new not in db.list("qpc")
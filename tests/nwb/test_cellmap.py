@@ -0,0 +1,109 @@
+"""Runs of CellMap, stopped and resumed from their checkpoint."""
+
+import json
+from functools import partial
+
+import pandas as pd
+import pytest
+
+import nwb
+from nwb.src import cellmap
+from nwb.src.cellmap import CellMap, read_checkpoint
+
+FAILING = "qpc_000001_1"
+
+
+def n_points(rcell) -> dict:
+    """Get the number of points of the first Ramp repetition."""
+    if rcell.id == FAILING:
+        raise ValueError("Bad rCell")
+    rep = rcell.protocol("Ramp").repetition(1)
+    return {"n_points": len(rep.view)}
+
+
+def n_points_of(rcell, protocol: str) -> int:
+    """Get the number of points of the first repetition of a protocol."""
+    return len(rcell.protocol(protocol).repetition(1).view)
+
+
+def journal(path) -> list[dict]:
+    """Read the records of a checkpoint file."""
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.parametrize("backend", ["process", "thread"])
+def test_run_records_results_and_failures(tmp_path, rcell_paths, backend):
+    run = CellMap(
+        n_points,
+        rcell_paths,
+        workers=2,
+        backend=backend,
+        checkpoint=tmp_path / "run.jsonl",
+        parquet=tmp_path / "results",
+        progress=False,
+    )
+
+    results = run.run()
+
+    assert results == {id: {"n_points": 400} for id in rcell_paths if id != FAILING}
+    assert list(run.failures) == [FAILING]
+    assert "ValueError: Bad rCell" in run.failures[FAILING]
+    assert read_checkpoint(tmp_path / "run.jsonl") == set(results)
+
+    df = pd.read_parquet(tmp_path / "results")
+    assert sorted(df["id"]) == sorted(results)
+    assert (df["n_points"] == 400).all()
+
+    with pytest.raises(RuntimeError):
+        run.run()
+
+
+def test_stopped_run_resumes(tmp_path, rcell_paths, monkeypatch, make_cell):
+    for i in range(3, 8):
+        rcell_paths[f"qpc_{i:06d}_1"] = tmp_path / f"qpc_{i:06d}_1.nwb"
+        nwb.save(rcell_paths[f"qpc_{i:06d}_1"], make_cell(i), validate=True)
+    monkeypatch.setattr(cellmap, "PARQUET_BATCH", 2)
+    checkpoint, parquet = tmp_path / "run.jsonl", tmp_path / "results"
+
+    def start() -> CellMap:
+        return CellMap(
+            n_points,
+            rcell_paths,
+            workers=1,
+            backend="thread",
+            checkpoint=checkpoint,
+            parquet=parquet,
+            progress=False,
+        )
+
+    first = start()
+    stream = iter(first)
+    for _ in range(3):
+        next(stream)
+        # An rCell in the checkpoint always has its results on disk
+        written = set(pd.read_parquet(parquet)["id"]) if parquet.exists() else set()
+        done = {rec["id"] for rec in journal(checkpoint) if "error" not in rec}
+        assert done <= written
+    stream.close()
+
+    # Stopping writes the batch in progress
+    assert read_checkpoint(checkpoint) == set(first.results)
+    assert set(pd.read_parquet(parquet)["id"]) == set(first.results)
+
+    second = start()
+    assert second.skipped == [id for id in rcell_paths if id in first.results]
+    assert FAILING in second.ids
+    second.run()
+
+    assert list(second.failures) == [FAILING]
+    ids = pd.read_parquet(parquet)["id"]
+    assert ids.is_unique
+    assert set(ids) == set(rcell_paths) - {FAILING}
+
+
+def test_run_maps_a_partial(rcell_paths):
+    run = CellMap(partial(n_points_of, protocol="Activation"), rcell_paths, workers=2)
+
+    assert "n_points_of" in repr(run)
+    assert run.run() == dict.fromkeys(rcell_paths, 2500)
+    assert not run.failures
@@ -0,0 +1,87 @@
+"""Vectorized window statistics and segment features against pandas and NumPy."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import nwb
+from nwb.src.features import FEATURES, STATS, window_stats
+
+
+def pandas_stats(data: np.ndarray, sweep: int, first: int, stop: int) -> list:
+    """Compute the statistics of a window with pandas."""
+    window = pd.Series(data[first:stop, sweep])
+    return [getattr(window, stat)() for stat in STATS]
+
+
+@pytest.mark.parametrize("offset", [0.0, 1e6])
+def test_window_stats_match_pandas(offset):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(500, 4)) + offset
+    sweeps = rng.integers(0, 4, size=(20, 3))
+    first = rng.integers(0, 500, size=(20, 3))
+    stop = np.minimum(first + rng.integers(0, 100, size=(20, 3)), 500)
+    # Empty and single point windows
+    stop[0] = first[0]
+    stop[1] = first[1] + 1
+
+    stats = window_stats(data, sweeps, first, stop)
+
+    assert stats.shape == (20, 3, len(STATS))
+    expected = [
+        pandas_stats(data, *args)
+        for args in zip(sweeps.flat, first.flat, stop.flat, strict=True)
+    ]
+    np.testing.assert_allclose(
+        stats.reshape(-1, len(STATS)), expected, rtol=1e-9, atol=1e-9
+    )
+    assert np.isnan(stats[0]).all()
+    assert np.isnan(stats[1, :, STATS.index("std")]).all()
+
+
+def test_window_stats_rejects_unknown_stats():
+    with pytest.raises(ValueError, match="Unknown statistics"):
+        window_stats(np.zeros((10, 1)), 0, 0, 5, stats=("median",))
+
+
+def test_repetition_window_stats_match_subsegments(tmp_path, make_cell):
+    nest = make_cell()
+    reps = nest["acquisition"]["timeseries"]["Activation"]["repetitions"]
+    reps["repetition1"]["data"] += 1e4
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, nest, validate=True)
+    rep = nwb.RCell(path).protocol("Activation").repetition(1)
+    pcts = ["+10%", "-10%", "+50%"]
+
+    stats = rep.window_stats(pcts)
+
+    for sweep in rep.iter():
+        for seg in sweep.iter():
+            for k, pct in enumerate(pcts):
+                window = seg.subsegment(pct).data
+                expected = [getattr(window, stat)() for stat in STATS]
+                np.testing.assert_allclose(
+                    stats[sweep.id, seg.id, k], expected, rtol=1e-9
+                )
+
+
+def test_segment_features_match_a_loop(tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    rep = nwb.RCell(path).protocol("Activation").repetition(2)
+
+    features = rep.segment_features()
+
+    assert features.shape == (9, 3, len(FEATURES))
+    for sweep in rep.iter():
+        for seg in sweep.iter():
+            data = seg.data
+            vals, times = data.to_numpy(), data.index.to_numpy(dtype=float)
+            peak = np.argmax(np.abs(vals))
+            expected = [vals[peak], vals.mean(), times[peak], np.trapezoid(vals, times)]
+            np.testing.assert_allclose(features[sweep.id, seg.id], expected)
+
+    frame = rep.segment_features(sweeps=[2, 5], segments=[1], as_frame=True)
+    assert frame.index.tolist() == [(2, 1), (5, 1)]
+    assert frame.columns.tolist() == list(FEATURES)
+    np.testing.assert_array_equal(frame.to_numpy(), features[[2, 5], 1])
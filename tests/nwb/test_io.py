@@ -0,0 +1,203 @@
+"""Round trips of rCells through the nwb module."""
+
+import h5py
+import numpy as np
+import pytest
+
+import nwb
+from nwb.src.codec import CODECS
+from nwb.src.io import compile_globs, match_glob, same
+from nwb.src.layout import LAYOUTS
+from nwb.src.validation import ValidationError
+
+
+@pytest.fixture
+def reference(tmp_path, make_cell):
+    """Save an rCell with the default layout and load it back."""
+    path = tmp_path / "reference.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    return nwb.load(path)
+
+
+@pytest.mark.parametrize("chunks", LAYOUTS)
+@pytest.mark.parametrize("scalar_attrs", [False, True])
+def test_layouts_load_identically(tmp_path, make_cell, reference, chunks, scalar_attrs):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True, chunks=chunks, scalar_attrs=scalar_attrs)
+
+    assert same(nwb.load(path), reference)
+
+
+@pytest.mark.parametrize("codec", list(CODECS))
+def test_codecs_load_identically(tmp_path, make_cell, reference, codec):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True, codecs={"data": codec, "array": codec})
+
+    assert same(nwb.load(path), reference)
+
+
+def test_scaled_array_round_trip(tmp_path, make_cell):
+    nest = make_cell()
+    rep = nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+    samples = np.arange(1200, dtype=np.int16).reshape(400, 3)
+    rep["data"] = nwb.ScaledArray(samples, scale=0.5, offset=1.0)
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, nest, validate=True)
+
+    key = "acquisition/timeseries/Ramp/repetitions/repetition1/data"
+    with h5py.File(path) as h5file:
+        assert h5file[key].dtype == np.int16
+        assert np.array_equal(nwb.load_dataset(h5file[key]), samples * 0.5 + 1.0)
+
+
+@pytest.mark.parametrize(
+    ("chunks", "mapped"), [("contiguous", True), ("sweep", False), ("tile", False)]
+)
+def test_only_contiguous_data_is_memory_mapped(tmp_path, make_cell, chunks, mapped):
+    path = tmp_path / "cell.nwb"
+    nest = make_cell()
+    nwb.save(path, nest, validate=True, chunks=chunks)
+    rep = nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+
+    key = "acquisition/timeseries/Ramp/repetitions/repetition1/data"
+    with h5py.File(path) as h5file:
+        data = nwb.load_dataset(h5file[key], mmap=True)
+        assert isinstance(data, np.memmap) is mapped
+        assert not isinstance(nwb.load_dataset(h5file[key]), np.memmap)
+        assert np.array_equal(data, rep["data"])
+    if mapped:
+        assert not data.flags.writeable
+
+
+def test_writer_matches_save(tmp_path, make_cell, reference):
+    nest = make_cell()
+    path = tmp_path / "cell.nwb"
+
+    with nwb.Writer(path) as writer:
+        writer.write_general(nest["general"])
+        writer.write({k: nest[k] for k in ["data_release", "file_create_date"]})
+        for protocol, dic in nest["acquisition"]["timeseries"].items():
+            stim_id = nest["stimulus"]["presentation"][protocol]["stim_id"]
+            for rep in dic["repetitions"].values():
+                writer.append_repetition(protocol, rep, stim_id=stim_id)
+
+    assert same(nwb.load(path), reference)
+
+
+def test_writer_leaves_nothing_on_error(tmp_path):
+    path = tmp_path / "cell.nwb"
+
+    with pytest.raises(ValidationError), nwb.Writer(path) as writer:
+        writer.write_general({})
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_update_writes_only_changes(tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nest = make_cell()
+    nwb.save(path, nest, validate=True)
+    loaded = nwb.load(path)
+
+    assert nwb.update(path, loaded) == []
+
+    written = nwb.update(path, {"general": {"data_quality_notes": "noisy"}})
+    assert written == ["/general/data_quality_notes"]
+
+    loaded["general"]["data_quality_notes"] = "noisy"
+    assert same(nwb.load(path), loaded)
+
+
+def test_update_rejects_invalid_changes(tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    before = nwb.load(path)
+    rep = before["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+
+    # Repetitions must be numbered without gaps
+    bad = {
+        "acquisition": {"timeseries": {"Ramp": {"repetitions": {"repetition5": rep}}}}
+    }
+    with pytest.raises(ValidationError):
+        nwb.update(path, bad)
+
+    assert same(nwb.load(path), before)
+
+
+def test_validate_file_matches_save(tmp_path, make_cell, reference):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=False)
+
+    nwb.validate_file(path, write=False)
+    nwb.validate_file(path)
+
+    assert same(nwb.load(path), reference)
+
+
+def test_validate_file_reports_the_invalid_key(tmp_path, make_cell):
+    nest = make_cell()
+    del nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]["data"]
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, nest, validate=False)
+
+    with pytest.raises(ValidationError) as err:
+        nwb.validate_file(path, write=False)
+
+    assert "Ramp" in err.value.path
+
+
+@pytest.mark.parametrize(
+    ("pattern", "path", "matches"),
+    [
+        ("general/*", "general/drn", True),
+        ("general/*", "general/channel_info/species", False),
+        ("general/**", "general/channel_info/species", True),
+        ("**/x_interval", "acquisition/timeseries/Ramp/x_interval", True),
+        ("**/x_interval", "x_interval", True),
+        ("*/x_interval", "acquisition/timeseries/x_interval", False),
+        ("general/*_info", "general/cell_info", True),
+    ],
+)
+def test_globs_match_levels(pattern, path, matches):
+    (compiled,) = compile_globs([pattern])
+
+    assert match_glob(compiled, tuple(path.split("/"))) is matches
+
+
+@pytest.mark.parametrize("scalar_attrs", [False, True])
+def test_full_projection_loads_everything(tmp_path, make_cell, scalar_attrs):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True, scalar_attrs=scalar_attrs)
+
+    assert same(nwb.load(path, include=["**"]), nwb.load(path))
+    assert same(nwb.load(path, exclude=[]), nwb.load(path))
+
+
+def test_include_prunes_groups(tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    full = nwb.load(path)
+
+    channel_info = nwb.load(path, include=["general/channel_info/*"])
+    assert same(
+        channel_info, {"general": {"channel_info": full["general"]["channel_info"]}}
+    )
+
+    x_intervals = nwb.load(path, include=["**/x_interval"])
+    reps = x_intervals["acquisition"]["timeseries"]["Activation"]["repetitions"]
+    assert list(x_intervals) == ["acquisition"]
+    assert reps == {
+        "repetition1": {"x_interval": 100},
+        "repetition2": {"x_interval": 100},
+    }
+
+
+def test_exclude_takes_precedence(tmp_path, make_cell):
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    general = nwb.load(path)["general"]
+    del general["channel_info"]
+
+    loaded = nwb.load(path, include=["general/**"], exclude=["general/channel_info"])
+
+    assert same(loaded, {"general": general})
@@ -0,0 +1,122 @@
+"""RCell file sessions and the acquisition hierarchy."""
+
+import gc
+import multiprocessing
+import pickle
+import weakref
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+import nwb
+
+DATA = "/acquisition/timeseries/Ramp/repetitions/repetition1/data"
+
+
+@pytest.fixture
+def rcell(tmp_path, make_cell) -> nwb.RCell:
+    """Save an rCell and get its RCell."""
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, make_cell(), validate=True)
+    return nwb.RCell(path)
+
+
+def test_session_reuses_one_handle(rcell):
+    assert rcell._source() == rcell.path
+
+    with rcell.session():
+        h5file = rcell._source()
+        assert isinstance(h5file, h5py.File)
+        assert rcell.is_open
+
+        first = rcell.get(DATA)
+        # Nested sessions and the whole tree share the handle
+        with rcell.session():
+            assert rcell.protocol("Ramp").repetition(1).view.shape == (400, 3)
+            assert rcell._source() is h5file
+        assert rcell._source() is h5file
+        assert np.array_equal(rcell.get(DATA), first)
+
+    assert not rcell.is_open
+    assert not h5file.id.valid
+    assert rcell._source() == rcell.path
+
+
+def test_pickled_rcell_opens_its_own_handle(rcell):
+    with rcell.session():
+        h5file = rcell._source()
+        copy = pickle.loads(pickle.dumps(rcell))  # noqa: S301 - our own object
+
+        assert not copy.is_open
+        assert copy._source() == copy.path
+        with copy.session():
+            assert copy._source() is not h5file
+            assert np.array_equal(copy.get(DATA), rcell.get(DATA))
+        assert h5file.id.valid
+
+
+def read_in_child(rcell: nwb.RCell, parent_id: int):
+    """Read the rCell in a forked process, exiting with 1 unless it reopened it."""
+    h5file = rcell._source()
+    reopened = isinstance(h5file, h5py.File) and id(h5file) != parent_id
+    rcell.get(DATA)
+    raise SystemExit(0 if reopened and rcell.is_open else 1)
+
+
+def test_forked_rcell_reopens_the_file(rcell):
+    with rcell.session():
+        h5file = rcell._source()
+        # Inherited, not pickled, by the forked process
+        process = multiprocessing.get_context("fork").Process(
+            target=read_in_child, args=(rcell, id(h5file))
+        )
+        process.start()
+        process.join()
+
+        assert process.exitcode == 0
+        # The handle of this process is still usable
+        assert rcell._source() is h5file
+        rcell.get(DATA)
+
+
+@pytest.mark.parametrize("uniform", [True, False])
+def test_time_index_is_a_range_only_when_uniform(tmp_path, make_cell, uniform):
+    nest = make_cell()
+    rep = nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+    if not uniform:
+        # A sampling gap in the middle of the sweeps
+        rep["time"][200:] += 50
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, nest, validate=True)
+
+    index = nwb.RCell(path).protocol("Ramp").repetition(1).view.index
+
+    assert isinstance(index, pd.RangeIndex) is uniform
+    assert np.array_equal(index, rep["time"])
+    assert index.name == "Time (us)"
+
+
+def test_parts_are_canonical_while_in_use(rcell):
+    protocol = rcell.protocol("Activation")
+    rep = protocol.repetition(1)
+
+    assert rcell.protocol("Activation") is protocol
+    assert protocol.repetition(1) is rep
+    assert protocol.repetition(2) is not rep
+    assert rep.sweep(3) is rep.sweep(3)
+    assert rep.sweep(3).segment(1) is rep.sweep(3).segment(1)
+
+    # Cached attributes are kept on the canonical object
+    view = rep.view
+    assert protocol.repetition(1).view is view
+    del protocol.repetition(1).view
+    assert rep.view is not view
+
+    # Unused parts are freed
+    ref = weakref.ref(rep)
+    del rep, view
+    gc.collect()
+    assert ref() is None
+    assert protocol.repetition(1).id == 1
@@ -0,0 +1,94 @@
+"""Repacking rCells with a new layout, resumed from the journal."""
+
+import json
+import sys
+
+import h5py
+import pytest
+
+import nwb
+from nwb.scripts import repack
+from nwb.src.io import same
+
+DATA = "acquisition/timeseries/Ramp/repetitions/repetition1/data"
+
+
+def run(monkeypatch, capsys, *args: str) -> str:
+    """Run the repack command and get what it printed."""
+    monkeypatch.setattr(sys, "argv", ["repack", *args, "--workers", "1"])
+    repack.main()
+    return capsys.readouterr().out
+
+
+def test_repack_replaces_the_verified_file(rcell_paths):
+    path = rcell_paths["qpc_000000_1"]
+    before = nwb.load(path)
+
+    record = repack.repack(path, "qpc", "contiguous", {})
+
+    assert "error" not in record
+    assert record["bytes_before"] > 0 and record["bytes_after"] > 0
+    assert same(nwb.load(path), before)
+    with h5py.File(path) as h5file:
+        assert h5file[DATA].chunks is None
+    assert sorted(p.name for p in path.parent.iterdir()) == sorted(
+        p.name for p in rcell_paths.values()
+    )
+
+
+def test_repack_keeps_the_file_if_it_differs(rcell_paths, monkeypatch):
+    path = rcell_paths["qpc_000000_1"]
+    content = path.read_bytes()
+    monkeypatch.setattr(repack, "same", lambda a, b: False)
+
+    record = repack.repack(path, "qpc", "contiguous", {})
+
+    assert "does not load identically" in record["error"]
+    assert path.read_bytes() == content
+    assert not path.with_name(f"{path.name}.repack.tmp").exists()
+
+
+def test_runs_resume_with_the_same_settings(tmp_path, rcell_paths, monkeypatch, capsys):
+    journal = tmp_path / "repack.jsonl"
+    args = [str(tmp_path), "--journal", str(journal)]
+
+    out = run(monkeypatch, capsys, *args, "--chunks", "contiguous")
+    assert "0 rCells already repacked, 3 to go." in out
+    assert "other: 3 rCells" in out
+
+    # An interrupted run leaves a line cut short
+    with open(journal, "a") as fp:
+        fp.write('\n{"path": "')
+    settings = {"chunks": "contiguous", "codecs": {}, "scalar_attrs": False}
+    done = {str(path.resolve()) for path in rcell_paths.values()}
+    assert repack.read_journal(journal, settings) == done
+
+    out = run(monkeypatch, capsys, *args, "--chunks", "contiguous")
+    assert "3 rCells already repacked, 0 to go." in out
+    assert "other: 3 rCells" in out
+
+    # Other settings repack the files again, recorded after the cut line
+    out = run(monkeypatch, capsys, *args, "--chunks", "sweep")
+    assert "0 rCells already repacked, 3 to go." in out
+    assert repack.read_journal(journal, settings) == set()
+    with h5py.File(rcell_paths["qpc_000001_1"]) as h5file:
+        assert h5file[DATA].chunks is not None
+
+
+@pytest.mark.parametrize("line", ["", "\n", '{"path": "x.nwb", "mach'])
+def test_report_skips_broken_lines(tmp_path, capsys, line):
+    journal = tmp_path / "repack.jsonl"
+    record = {
+        "path": "a.nwb",
+        "machine": "qpc",
+        "bytes_before": 200,
+        "bytes_after": 100,
+        "read_before": 2.0,
+        "read_after": 1.0,
+        "settings": {},
+    }
+    journal.write_text(json.dumps(record) + "\n" + line)
+
+    repack.report(journal, {})
+
+    assert "qpc: 1 rCells, 0.0 MB saved (50.0%)" in capsys.readouterr().out
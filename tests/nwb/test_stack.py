@@ -0,0 +1,52 @@
+"""Stacks of one protocol repetition of rCells of different lengths."""
+
+import numpy as np
+import pytest
+
+import nwb
+from nwb.src import stack
+
+
+@pytest.fixture
+def paths(tmp_path, make_cell) -> dict:
+    """Save two rCells whose Ramp data has 450 and 400 points, then a missing one."""
+    paths = {}
+    for i, n_points in enumerate([450, 400]):
+        nest = make_cell(i)
+        rep = nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+        rep["data"] = np.random.default_rng(i).normal(size=(n_points, 3))
+        rep["n_points"][:] = n_points
+        rep["time"] = np.arange(0, n_points * 100, 100, dtype=np.uint32)
+        paths[f"qpc_00000{i}_1"] = tmp_path / f"qpc_00000{i}_1.nwb"
+        nwb.save(paths[f"qpc_00000{i}_1"], nest, validate=True)
+    paths["qpc_000009_1"] = tmp_path / "missing.nwb"
+    return paths
+
+
+@pytest.mark.parametrize("fork", [True, False])
+def test_stack_pads_cells_in_order(paths, monkeypatch, fork):
+    if not fork:
+        # Workers return their data instead of filling the shared array
+        monkeypatch.setattr(
+            stack.multiprocessing, "get_all_start_methods", lambda: ["spawn"]
+        )
+
+    result = stack.stack(paths, "Ramp", 1, workers=2)
+
+    assert result.ids.tolist() == ["qpc_000000_1", "qpc_000001_1"]
+    assert list(result.failures) == ["qpc_000009_1"]
+    assert result.data.shape == (2, 450, 3)
+    assert result.n_points.tolist() == [450, 400]
+    assert result.n_sweeps.tolist() == [3, 3]
+    assert result.x_interval.tolist() == [100, 100]
+
+    for i, (id, n_points) in enumerate([("qpc_000000_1", 450), ("qpc_000001_1", 400)]):
+        view = nwb.RCell(paths[id]).protocol("Ramp").repetition(1).view
+        assert np.array_equal(result.data[i, :n_points], view.to_numpy())
+        assert np.isnan(result.data[i, n_points:]).all()
+
+    mask = result.mask()
+    assert mask.shape == result.data.shape
+    assert mask[0].all()
+    assert mask[1, :400].all() and not mask[1, 400:].any()
+    assert np.array_equal(np.isnan(result.data), ~mask)
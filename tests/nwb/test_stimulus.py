@@ -0,0 +1,126 @@
+"""Stimuli: the compiled library, AP waveform files and sampled commands."""
+
+import os
+
+import numpy as np
+import pytest
+
+import nwb
+from nwb.src import stimulus
+from nwb.src.stimulus import StimCsv, read_dat
+
+
+@pytest.fixture
+def stim_csv(tmp_path) -> StimCsv:
+    """Get a StimCsv of a copy of the stimulus CSV, not the singleton."""
+    path = tmp_path / "stimulus.csv"
+    path.write_text(StimCsv().path.read_text())
+    return type(StimCsv())(path)
+
+
+def libraries(stim_csv: StimCsv) -> list:
+    """List the compiled libraries next to the CSV."""
+    return list(stim_csv.path.parent.glob(".stimulus-*.npz"))
+
+
+def test_library_is_compiled_once_per_version(stim_csv, monkeypatch):
+    library = stim_csv.library
+    assert libraries(stim_csv) == [stim_csv.library_path]
+
+    # Read from the file by the next process
+    again = type(stim_csv)(stim_csv.path)
+    with monkeypatch.context() as patch:
+        patch.setattr(type(stim_csv), "compile", lambda self: pytest.fail("compiled"))
+        assert again.digest == stim_csv.digest
+        assert again.library.keys() == library.keys()
+
+    # A new CSV compiles a new library and removes the old one
+    stim_csv.path.write_text(
+        stim_csv.path.read_text().replace("-80:0:40:20", "-80:0:20:20")
+    )
+    changed = type(stim_csv)(stim_csv.path)
+    assert changed.digest != stim_csv.digest
+    assert changed.library["4/v_pairs"][0, 1].tolist() == [-80, 20]
+    assert libraries(stim_csv) == [changed.library_path]
+
+    # So does a new LIBRARY_VERSION
+    monkeypatch.setattr(stimulus, "LIBRARY_VERSION", stimulus.LIBRARY_VERSION + 1)
+    bumped = type(stim_csv)(stim_csv.path)
+    assert bumped.digest != changed.digest
+    assert bumped.library.keys() == changed.library.keys()
+    assert libraries(stim_csv) == [bumped.library_path]
+
+
+@pytest.mark.parametrize("stim_id", [1, 3, 4])
+@pytest.mark.parametrize("x_interval", [100, 37])
+def test_compiled_stimuli_sample_like_parsed_ones(stim_csv, stim_id, x_interval):
+    compiled = stim_csv.get(stim_id)
+    parsed = stim_csv._create(stim_id)
+
+    # The compiled arrays are set without parsing the command
+    assert set(compiled.COMPILED) <= compiled.__dict__.keys()
+    assert not set(parsed.COMPILED) & parsed.__dict__.keys()
+    assert compiled.duration == parsed.duration
+    assert np.array_equal(compiled.sample(x_interval), parsed.sample(x_interval))
+
+
+@pytest.fixture
+def rcell(tmp_path, make_cell) -> nwb.RCell:
+    """Save an rCell whose Ramp data lasts 5 ms longer than its stimulus."""
+    nest = make_cell()
+    ramp = nest["acquisition"]["timeseries"]["Ramp"]["repetitions"]["repetition1"]
+    ramp["data"] = np.vstack([ramp["data"], np.zeros((50, 3))])
+    ramp["n_points"][:] = 450
+    ramp["time"] = np.arange(0, 45000, 100, dtype=np.uint32)
+    path = tmp_path / "cell.nwb"
+    nwb.save(path, nest, validate=True)
+    return nwb.RCell(path)
+
+
+def test_dat_cache_is_invalidated_by_the_text_file(tmp_path):
+    dat = tmp_path / "ap.dat"
+    dat.write_text("0.0 -80.0\n0.1 -70.5\n0.2 -60.25\n")
+    cache = dat.with_suffix(".npy")
+
+    columns = read_dat(dat)
+    assert columns.tolist() == [[0.0, -80.0], [0.1, -70.5], [0.2, -60.25]]
+    assert cache.stat().st_mtime_ns == dat.stat().st_mtime_ns
+
+    # The cache is read while its modification time matches
+    mtime_ns = dat.stat().st_mtime_ns
+    np.save(cache, np.zeros((1, 2)))
+    os.utime(cache, ns=(mtime_ns, mtime_ns))
+    assert read_dat(dat).tolist() == [[0.0, 0.0]]
+
+    # Touching the text file parses it again
+    os.utime(dat, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    assert np.array_equal(read_dat(dat), columns)
+    assert np.array_equal(np.load(cache), columns)
+    assert cache.stat().st_mtime_ns == mtime_ns + 10**9
+
+
+def test_command_lines_up_with_the_data(rcell):
+    protocol = rcell.protocol("Activation")
+    stim = protocol.stimulus
+
+    for sweep in protocol.repetition(1).iter():
+        command = sweep.command
+
+        assert command.index.equals(sweep.data.index)
+        assert not (sweep.data - command).isna().any()
+        # Each plateau at its voltage, from the middle of the segments
+        middles = stim.t_pairs[sweep.id].mean(axis=1)
+        assert np.array_equal(
+            command.loc[middles].to_numpy(), stim.v_pairs[sweep.id, :, 0]
+        )
+
+
+def test_command_after_the_stimulus_is_nan(rcell):
+    sweep = rcell.protocol("Ramp").repetition(1).sweep(1)
+    command = sweep.command
+
+    assert command.index.equals(sweep.data.index)
+    assert command.isna().sum() == 50
+    assert command.iloc[:400].notna().all()
+    # The ramp from -80 to 40 mV between 10 and 30 ms is interpolated
+    np.testing.assert_allclose(command.loc[[10000, 20000, 25000]], [-80, -20, 10])